@@ -0,0 +1,110 @@
+"""
+Вспомогательные функции JSON API только для чтения (/api/v1/...).
+
+Ответы API кешируются клиентом и перепроверяются условным запросом:
+ETag строится из updated_at ресурса и номеров версий таблиц из
+data_versions (они меняются при каждой записи, в том числе дважды за
+одну секунду, которую различает updated_at). Если If-None-Match совпадает,
+ответ 304 отдается без загрузки и сериализации данных.
+
+ETag слабый: сжатие меняет байты ответа, но не его смысл (см. compression.py),
+поэтому If-None-Match сравнивается слабым сравнением и принимает W/"...".
+
+Параметр fields (через запятую) ограничивает поля объектов в ответе.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from flask import Response, jsonify, request
+
+
+# Префикс адресов API; при несовместимых изменениях появится /api/v2
+PREFIX = '/api/v1'
+
+# Поля объектов, которые отдает API
+WORKOUT_SET_FIELDS = ('code', 'name', 'description', 'created_at', 'updated_at',
+                      'exercise_count', 'total_rounds', 'total_rest_seconds')
+EXERCISE_FIELDS = ('code', 'workoutset_code', 'name', 'description', 'video_url',
+                   'repeat_count', 'round_count', 'rest_seconds', 'images',
+                   'created_at', 'updated_at')
+PREFS_FIELDS = ('default_repeat_count', 'default_round_count', 'default_rest_seconds',
+                'default_warmup_rest_seconds', 'timer_sound', 'notifications_enabled')
+LOG_FIELDS = ('code', 'date', 'date_epoch', 'local_date', 'workoutset_code', 'workoutset_name',
+              'duration_seconds', 'completed_exercises')
+
+
+def error(message: str, status: int) -> Response:
+    """Ответ об ошибке в формате приложения."""
+    response = jsonify({'success': False, 'error': message})
+    response.status_code = status
+    return response
+
+
+def parse_fields(allowed: Sequence[str]) -> List[str]:
+    """
+    Разбирает параметр fields запроса.
+
+    Returns:
+        list: Запрошенные поля в порядке allowed (все, если параметра нет)
+
+    Raises:
+        ValueError: Если запрошено неизвестное поле
+    """
+    requested = request.args.get('fields')
+    if not requested:
+        return list(allowed)
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names - set(allowed)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}. "
+                         f"Доступные: {', '.join(allowed)}")
+    return [name for name in allowed if name in names]
+
+
+def select_fields(item: Dict[str, Any], fields: Sequence[str]) -> Dict[str, Any]:
+    """Оставляет в объекте только поля fields."""
+    return {name: item.get(name) for name in fields}
+
+
+def make_etag(*parts: Any) -> str:
+    """ETag из значений, которые меняются вместе с ресурсом."""
+    source = json.dumps(parts, default=str, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(source, digest_size=16).hexdigest()
+
+
+def conditional_json(validators: Sequence[Any], build: Callable[[List[str]], Dict[str, Any]],
+                     allowed_fields: Sequence[str]) -> Response:
+    """
+    Отдает JSON-ответ с ETag или 304, если у клиента актуальная версия.
+
+    Args:
+        validators: Значения, из которых строится ETag (updated_at, версии
+            таблиц); должны быть прочитаны до данных ответа
+        build: Строит тело ответа по списку запрошенных полей
+        allowed_fields: Поля, которые можно запросить параметром fields
+    """
+    try:
+        fields = parse_fields(allowed_fields)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    etag = make_etag(request.path, *validators, fields)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({'success': True, **build(fields)})
+    response.set_etag(etag, weak=True)
+    # Кешировать можно, но перед использованием - перепроверять
+    response.cache_control.no_cache = True
+    return response
+
+
+def parse_limit(default: int, maximum: int = 500) -> Optional[int]:
+    """Параметр limit запроса (None, если он некорректен)."""
+    try:
+        limit = min(int(request.args.get('limit', default)), maximum)
+    except ValueError:
+        return None
+    return limit if limit >= 1 else None
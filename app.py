@@ -1,14 +1,60 @@
 #! /usr/bin/env python3
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from werkzeug.utils import secure_filename
+from flask import (Flask, Response, render_template, stream_template, request, redirect, url_for,
+                   flash, get_flashed_messages, jsonify, send_file)
+from markupsafe import Markup
 import os
 import json
-from models import WorkoutSetModel, ExerciseModel, UserPrefsModel, WorkoutLogModel, DatabaseManager
+from models import (WorkoutSetModel, ExerciseModel, UserPrefsModel, WorkoutLogModel, DatabaseManager, JobModel,
+                    get_data_versions, decode_log_cursor)
+from workout_stats import WorkoutStatistics
+import db_pool
+import db_storage
+import static_assets
+import compression
+import page_cache
+import backups
+import api
+import image_pipeline  # регистрирует фоновые задачи обработки изображений
+import image_store
+import image_gc
+import jobs
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
 app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'images', 'exercises')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['STATIC_IMMUTABLE_MAX_AGE'] = 365 * 24 * 3600  # кеш статики с отпечатком в имени, сек
+app.config['COMPRESS_RESPONSES'] = True  # сжимать HTML и JSON (gzip/brotli)
+app.config['COMPRESS_MIN_SIZE'] = 500  # ответы меньше, байт, не сжимаются
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))  # простаивающих соединений в пуле
+app.config['DB_POOL_HEALTH_CHECK_INTERVAL'] = 30  # секунд простоя до проверки соединения
+app.config['DB_JOURNAL_MODE'] = 'WAL'  # читатели не блокируются писателями
+app.config['DB_SYNCHRONOUS'] = 'NORMAL'  # fsync при checkpoint, а не при каждом commit
+app.config['DB_BUSY_TIMEOUT_MS'] = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))  # ожидание блокировки записи
+app.config['DB_CACHE_SIZE_KB'] = 16 * 1024  # кеш страниц на соединение, КиБ
+app.config['DB_MMAP_SIZE'] = 64 * 1024 * 1024  # чтение через mmap, байт (0 - выключено)
+app.config['DB_CHECKPOINT_INTERVAL_SECONDS'] = 300  # как часто переносить WAL в файл БД (0 - только автоматически)
+app.config['DB_CHECKPOINT_MODE'] = 'PASSIVE'  # режим периодического checkpoint (PASSIVE/TRUNCATE)
+app.config['STATISTICS_PAGE_SIZE'] = 50  # записей журнала на странице статистики
+app.config['BACKUP_PAGES_PER_STEP'] = 256  # страниц БД за один шаг онлайн-бэкапа
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # потоков фоновых задач
+app.config['JOB_MAX_ATTEMPTS'] = 3  # попыток выполнить фоновую задачу
+app.config['JOB_RETRY_DELAY'] = 10  # секунд до повтора (умножается на номер попытки)
+app.config['JOB_RETENTION_DAYS'] = 7  # сколько дней хранить строки завершенных задач
+app.config['JOB_LEASE_SECONDS'] = 60  # через сколько секунд без продления аренды задача считается прерванной
+app.config['IMAGE_GC_GRACE_SECONDS'] = 300  # сколько хранить изображение, на которое не осталось ссылок
+app.config['IMAGE_GC_INTERVAL_HOURS'] = 24  # как часто искать файлы изображений без записи в БД
+app.config['IMAGE_GC_MIN_AGE_SECONDS'] = 3600  # файлы моложе не удаляются сборщиком
+app.config['WORKOUT_PAGE_CACHE_SIZE'] = 64  # страниц тренировки в кеше (0 - без кеша)
+
+db_pool.init_app(app)
+db_storage.init_app(app)
+static_assets.init_app(app)
+compression.init_app(app)
+page_cache.init_app(app)
+jobs.init_app(app)
+jobs.get_queue().every('image_gc', app.config['IMAGE_GC_INTERVAL_HOURS'] * 3600,
+                       {'min_age_seconds': app.config['IMAGE_GC_MIN_AGE_SECONDS']})
 
 # Разрешенные расширения для изображений
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
@@ -22,6 +68,24 @@ def ensure_upload_folder():
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
 
+def save_exercise_image(image_file):
+    """
+    Сохраняет загруженное изображение в хранилище с адресацией по содержимому.
+
+    Для нового файла в очередь ставится создание уменьшенных копий; у
+    повторно загруженного они уже есть.
+
+    Returns:
+        tuple: (путь к изображению относительно static/, код фоновой задачи или None)
+    """
+    image_path, created = image_store.store_upload(image_file, app.static_folder)
+    job_code = jobs.enqueue('image_variants', {'path': image_path}) if created else None
+    return image_path, job_code
+
+def schedule_image_gc():
+    """Планирует удаление изображений, на которые не осталось ссылок."""
+    image_store.schedule_collect(app.config['IMAGE_GC_GRACE_SECONDS'])
+
 
 @app.route('/')
 def index():
@@ -32,48 +96,23 @@ def index():
 @app.route('/workout-sets')
 def workout_sets_list():
     """Страница со списком всех комплексов упражнений"""
-    workout_sets = WorkoutSetModel.get_all()
-    for workout_set in workout_sets:
-        exercises = ExerciseModel.get_by_workoutset(workout_set['code'])
-        workout_set['exercise_count'] = len(exercises)
-
-        # Подсчитываем общее количество подходов и примерную длительность
-        total_rounds = sum(ex['round_count'] for ex in exercises)
-        total_rest_time = sum(ex['rest_seconds'] * (ex['round_count'] - 1) for ex in exercises)
-        estimated_duration = round((total_rest_time + total_rounds * 30) / 60)  # примерно 30 сек на подход
-
-        workout_set['total_rounds'] = total_rounds
-        workout_set['estimated_duration'] = estimated_duration
-
-        # Получаем информацию о последней тренировке
-        last_workout = WorkoutLogModel.get_last_workout_for_set(workout_set['code'])
-        if last_workout:
-            from datetime import datetime, timezone, date
-
-            # Парсим дату последней тренировки
-            try:
-                last_date = datetime.fromisoformat(last_workout['date'].replace('Z', '+00:00'))
-
-                # Конвертируем в локальное время для корректного сравнения дней
-                if last_date.tzinfo is not None:
-                    last_date = last_date.astimezone()
-
-                # Получаем только дату (без времени) для корректного сравнения
-                last_date_only = last_date.date()
-                today = date.today()
+    from datetime import date
 
-                # Вычисляем разность в днях
-                days_ago = (today - last_date_only).days
+    workout_sets = WorkoutSetModel.get_all_with_summary()
+    today = date.today()
 
-                workout_set['last_workout_days_ago'] = days_ago
-                workout_set['last_workout_date'] = last_workout['date']
-            except Exception as e:
-                print(f"Ошибка при обработке даты тренировки: {e}")
-                workout_set['last_workout_days_ago'] = None
-                workout_set['last_workout_date'] = None
-        else:
-            workout_set['last_workout_days_ago'] = None
-            workout_set['last_workout_date'] = None
+    for workout_set in workout_sets:
+        # Примерная длительность: отдых между подходами + ~30 сек на подход
+        total_rounds = workout_set['total_rounds']
+        total_rest_time = workout_set['total_rest_seconds']
+        workout_set['estimated_duration'] = round((total_rest_time + total_rounds * 30) / 60)
+
+        # Информация о последней тренировке
+        last_workout_local_date = workout_set['last_workout_local_date']
+        workout_set['last_workout_days_ago'] = None
+        if last_workout_local_date:
+            # День хранится уже по местному времени
+            workout_set['last_workout_days_ago'] = (today - date.fromisoformat(last_workout_local_date)).days
 
     return render_template('workout_sets/list.html', workout_sets=workout_sets)
 
@@ -150,87 +189,66 @@ def workout_sets_update(code):
         return redirect(url_for('workout_sets_edit', code=code))
 
     try:
-        # Обновляем основную информацию комплекса
-        success = WorkoutSetModel.update(code, name, description)
-        if not success:
-            flash('Комплекс не найден', 'error')
-            return redirect(url_for('workout_sets_list'))
-
         # Проверяем, есть ли данные упражнений для обработки
         exercises_data_raw = request.form.get('exercises_data', '').strip()
+        exercises = None
 
         # Обрабатываем упражнения ТОЛЬКО если есть данные упражнений
         # Это предотвращает удаление упражнений при простом редактировании названия/описания
         if exercises_data_raw and exercises_data_raw != '[]':
             try:
                 exercises_data = json.loads(exercises_data_raw)
-
-                # Дополнительная проверка: обрабатываем только если есть упражнения
-                if exercises_data:
-                    # Получаем существующие упражнения
-                    existing_exercises = {ex['code']: ex for ex in ExerciseModel.get_by_workoutset(code)}
-                    processed_codes = set()
-
-                    ensure_upload_folder()
-
-                    for exercise_index, exercise_data in enumerate(exercises_data):
-                        if not exercise_data.get('name', '').strip():
-                            continue
-
-                        exercise_code = exercise_data.get('code')
-                        images = exercise_data.get('existing_images', [])
-
-                        # Обрабатываем новые изображения для данного упражнения
-                        image_pattern = f'exercise_{exercise_index}_image_'
-                        for field_name in request.files:
-                            if field_name.startswith(image_pattern):
-                                image_file = request.files[field_name]
-                                if (image_file and image_file.filename != '' and
-                                    allowed_file(image_file.filename)):
-
-                                    filename = secure_filename(image_file.filename)
-                                    filename = f"{code}_{exercise_index}_{len(images)}_{filename}"
-                                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                                    image_file.save(filepath)
-                                    images.append(f"images/exercises/{filename}")
-
-                        if exercise_code and exercise_code in existing_exercises:
-                            # Обновляем существующее упражнение
-                            ExerciseModel.update(
-                                code=exercise_code,
-                                name=exercise_data['name'],
-                                description=exercise_data.get('description', ''),
-                                images=images,
-                                video_url=exercise_data.get('video_url', ''),
-                                repeat_count=int(exercise_data.get('repeat_count', 10)),
-                                round_count=int(exercise_data.get('round_count', 3)),
-                                rest_seconds=int(exercise_data.get('rest_seconds', 60))
-                            )
-                            processed_codes.add(exercise_code)
-                        else:
-                            # Создаем новое упражнение
-                            new_code = ExerciseModel.create(
-                                workoutset_code=code,
-                                name=exercise_data['name'],
-                                description=exercise_data.get('description', ''),
-                                images=images,
-                                video_url=exercise_data.get('video_url', ''),
-                                repeat_count=int(exercise_data.get('repeat_count', 10)),
-                                round_count=int(exercise_data.get('round_count', 3)),
-                                rest_seconds=int(exercise_data.get('rest_seconds', 60))
-                            )
-                            processed_codes.add(new_code)
-
-                    # Удаляем упражнения, которые не были обработаны
-                    # Это происходит ТОЛЬКО при обработке данных упражнений
-                    for exercise_code in existing_exercises:
-                        if exercise_code not in processed_codes:
-                            ExerciseModel.delete(exercise_code)
-
             except json.JSONDecodeError:
                 flash('Ошибка при обработке данных упражнений', 'error')
                 return redirect(url_for('workout_sets_edit', code=code))
 
+            # Дополнительная проверка: обрабатываем только если есть упражнения
+            if exercises_data:
+                ensure_upload_folder()
+
+                exercises = []
+                for exercise_index, exercise_data in enumerate(exercises_data):
+                    if not exercise_data.get('name', '').strip():
+                        continue
+
+                    images = exercise_data.get('existing_images', [])
+
+                    # Обрабатываем новые изображения для данного упражнения
+                    image_pattern = f'exercise_{exercise_index}_image_'
+                    for field_name in request.files:
+                        if field_name.startswith(image_pattern):
+                            image_file = request.files[field_name]
+                            if (image_file and image_file.filename != '' and
+                                allowed_file(image_file.filename)):
+
+                                image_path, _ = save_exercise_image(image_file)
+                                images.append(image_path)
+
+                    exercises.append({
+                        'code': exercise_data.get('code'),
+                        'name': exercise_data['name'],
+                        'description': exercise_data.get('description', ''),
+                        'images': images,
+                        'video_url': exercise_data.get('video_url', ''),
+                        'repeat_count': int(exercise_data.get('repeat_count', 10)),
+                        'round_count': int(exercise_data.get('round_count', 3)),
+                        'rest_seconds': int(exercise_data.get('rest_seconds', 60))
+                    })
+
+        if exercises is None:
+            # Обновляем только основную информацию комплекса
+            success = WorkoutSetModel.update(code, name, description)
+        else:
+            # Комплекс и его упражнения (обновление, создание и удаление) - одной транзакцией.
+            # Упражнения, которых нет в списке, удаляются ТОЛЬКО при обработке данных упражнений
+            success = ExerciseModel.save_for_workoutset(code, exercises, name=name,
+                                                        description=description) is not None
+            schedule_image_gc()
+
+        if not success:
+            flash('Комплекс не найден', 'error')
+            return redirect(url_for('workout_sets_list'))
+
         flash('Информация о комплексе успешно сохранена', 'success')
         return redirect(url_for('workout_sets_edit', code=code))
 
@@ -251,6 +269,7 @@ def workout_sets_delete(code):
 
         # И наконец удаляем сам комплекс
         success = WorkoutSetModel.delete(code)
+        schedule_image_gc()
         if success:
             flash('Комплекс успешно удален', 'success')
         else:
@@ -264,23 +283,47 @@ def workout_sets_delete(code):
 @app.route('/workout-sets/<code>/start')
 def workout_start(code):
     """Страница тренировки - выполнение комплекса упражнений"""
+    # Версии - до данных страницы: запись между чтениями даст новый ключ, а не устаревшую страницу
+    versions = get_data_versions(*page_cache.WORKOUT_PAGE_TABLES)
     workout_set = WorkoutSetModel.get_by_code(code)
     if not workout_set:
         flash('Комплекс не найден', 'error')
         return redirect(url_for('workout_sets_list'))
 
-    exercises = ExerciseModel.get_by_workoutset(code)
-    if not exercises:
-        flash('В комплексе нет упражнений. Добавьте упражнения перед тренировкой.', 'warning')
-        return redirect(url_for('workout_sets_edit', code=code))
-
     # Получаем настройки пользователя для времени отдыха после разминки
     user_prefs = UserPrefsModel.get_defaults()
 
+    # Разметка страницы меняется только при записи в комплекс, упражнения,
+    # изображения или настройки; версии таблиц видны всем процессам
+    cache_key = (code, workout_set['updated_at'], user_prefs['default_warmup_rest_seconds'],
+                 *(versions[table] for table in page_cache.WORKOUT_PAGE_TABLES))
+    page = page_cache.workout_pages.get(cache_key)
+    if page is None:
+        generation = page_cache.workout_pages.generation
+        exercises = ExerciseModel.get_by_workoutset(code)
+        if not exercises:
+            flash('В комплексе нет упражнений. Добавьте упражнения перед тренировкой.', 'warning')
+            return redirect(url_for('workout_sets_edit', code=code))
+
+        page = {
+            'content': Markup(render_template('workout_sets/_workout_content.html',
+                                              workout_set=workout_set,
+                                              exercises=exercises)),
+            # Данные для static/js/workout-session.js: только то, что нужно скрипту
+            'workout_data': {
+                'workoutSetCode': workout_set['code'],
+                'workoutSetName': workout_set['name'],
+                'warmupRestSeconds': user_prefs['default_warmup_rest_seconds'],
+                'completeUrl': url_for('workout_complete', code=code),
+                'exercises': [{'code': exercise['code'], 'round_count': exercise['round_count']}
+                              for exercise in exercises],
+            },
+        }
+        page_cache.workout_pages.set(cache_key, page, generation)
+
     return render_template('workout_sets/workout.html',
                          workout_set=workout_set,
-                         exercises=exercises,
-                         user_prefs=user_prefs)
+                         **page)
 
 
 @app.route('/workout-sets/<code>/complete', methods=['POST'])
@@ -313,8 +356,57 @@ def settings():
     """Страница настроек приложения"""
     prefs = UserPrefsModel.get_first()
     db_info = DatabaseManager.get_database_info()
-    backups = DatabaseManager.list_backups()
-    return render_template('settings.html', prefs=prefs, db_info=db_info, backups=backups)
+    backup_list = DatabaseManager.list_backups()
+    snapshots = DatabaseManager.list_incremental_backups()
+    backup_progress = DatabaseManager.get_backup_progress()
+    return render_template('settings.html', prefs=prefs, db_info=db_info, backups=backup_list,
+                           snapshots=snapshots, backup_progress=backup_progress)
+
+
+@app.route('/settings/db/pool-stats')
+def db_pool_stats():
+    """Счетчики пула соединений с БД"""
+    return jsonify(db_pool.get_pool().stats())
+
+
+@app.route('/settings/jobs/stats')
+def jobs_stats():
+    """Количество фоновых задач по статусам"""
+    return jsonify(jobs.get_queue().stats())
+
+
+@app.route('/settings/db/storage-stats')
+def db_storage_stats():
+    """Режим журнала, размер WAL и параметры соединений с БД"""
+    return jsonify(db_storage.stats())
+
+
+@app.route('/settings/db/counters-report')
+def db_counters_report():
+    """Комплексы, счетчики упражнений которых расходятся с таблицей упражнений"""
+    return jsonify({'mismatches': WorkoutSetModel.verify_counters()})
+
+
+@app.route('/settings/cache/stats')
+def page_cache_stats():
+    """Заполненность и попадания кеша страниц тренировки"""
+    return jsonify(page_cache.workout_pages.stats())
+
+
+@app.route('/settings/images/gc-report')
+def image_gc_report():
+    """Отчет о файлах изображений без записи в БД (без удаления)"""
+    report = image_gc.find_orphans(app.static_folder, app.config['IMAGE_GC_MIN_AGE_SECONDS'])
+    return jsonify(report)
+
+
+@app.route('/jobs/<code>')
+def job_status(code):
+    """Статус фоновой задачи (обработка или удаление изображения)"""
+    job = JobModel.get_by_code(code)
+    if not job:
+        return jsonify({'success': False, 'message': 'Задача не найдена'}), 404
+    return jsonify({'success': True, 'job': job})
 
 
 @app.route('/exercises/<code>/delete', methods=['POST'])
@@ -323,6 +415,7 @@ def exercise_delete(code):
     try:
         success = ExerciseModel.delete(code)
         if success:
+            schedule_image_gc()
             return jsonify({'success': True, 'message': 'Упражнение удалено'})
         else:
             return jsonify({'success': False, 'message': 'Упражнение не найдено'}), 404
@@ -347,6 +440,7 @@ def exercise_create():
 
         # Обрабатываем изображения
         images = []
+        job_codes = []
         ensure_upload_folder()
 
         for field_name in request.files:
@@ -355,11 +449,10 @@ def exercise_create():
                 if (image_file and image_file.filename != '' and
                     allowed_file(image_file.filename)):
 
-                    filename = secure_filename(image_file.filename)
-                    filename = f"{workoutset_code}_{len(images)}_{filename}"
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    image_file.save(filepath)
-                    images.append(f"images/exercises/{filename}")
+                    image_path, job_code = save_exercise_image(image_file)
+                    images.append(image_path)
+                    if job_code:
+                        job_codes.append(job_code)
 
         # Создаем упражнение
         exercise_code = ExerciseModel.create(
@@ -379,7 +472,8 @@ def exercise_create():
         return jsonify({
             'success': True,
             'message': 'Упражнение создано',
-            'exercise': exercise
+            'exercise': exercise,
+            'jobs': job_codes
         })
 
     except Exception as e:
@@ -402,23 +496,16 @@ def exercise_update(code):
 
         # Обрабатываем изображения - начинаем с существующих
         images = existing_exercise.get('images', []).copy()
+        job_codes = []
 
         # Удаляем изображения, помеченные для удаления
         deleted_images_str = request.form.get('deleted_images', '')
         if deleted_images_str:
             deleted_images = [img.strip() for img in deleted_images_str.split(',') if img.strip()]
-            # Удаляем из списка изображений
+            # Удаляем из списка изображений; файл удалит сборщик, когда на него
+            # не останется ссылок из других упражнений
             images = [img for img in images if img not in deleted_images]
 
-            # Удаляем физические файлы
-            for deleted_image in deleted_images:
-                try:
-                    file_path = os.path.join(app.static_folder, deleted_image)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                except Exception as e:
-                    print(f"Ошибка при удалении файла {deleted_image}: {e}")
-
         # Добавляем новые изображения
         ensure_upload_folder()
 
@@ -428,11 +515,10 @@ def exercise_update(code):
                 if (image_file and image_file.filename != '' and
                     allowed_file(image_file.filename)):
 
-                    filename = secure_filename(image_file.filename)
-                    filename = f"{existing_exercise['workoutset_code']}_{len(images)}_{filename}"
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    image_file.save(filepath)
-                    images.append(f"images/exercises/{filename}")
+                    image_path, job_code = save_exercise_image(image_file)
+                    images.append(image_path)
+                    if job_code:
+                        job_codes.append(job_code)
 
         # Обновляем упражнение
         success = ExerciseModel.update(
@@ -447,12 +533,15 @@ def exercise_update(code):
         )
 
         if success:
+            schedule_image_gc()
+
             # Получаем обновленное упражнение для ответа
             exercise = ExerciseModel.get_by_code(code)
             return jsonify({
                 'success': True,
                 'message': 'Упражнение обновлено',
-                'exercise': exercise
+                'exercise': exercise,
+                'jobs': job_codes
             })
         else:
             return jsonify({'success': False, 'message': 'Ошибка обновления'}), 500
@@ -522,9 +611,12 @@ def settings_save():
 def backup_create():
     """Создание бэкапа базы данных"""
     try:
-        backup_path = DatabaseManager.create_backup()
+        backup_path = DatabaseManager.create_backup(pages_per_step=app.config['BACKUP_PAGES_PER_STEP'])
         backup_filename = os.path.basename(backup_path)
-        flash(f'Бэкап успешно создан: {backup_filename}', 'success')
+        stats = DatabaseManager.get_backup_progress()
+        flash(f'Бэкап успешно создан: {backup_filename} '
+              f'({stats["copied_pages"]} стр. за {stats["elapsed_seconds"]:.2f} с, '
+              f'{stats["pages_per_second"]:.0f} стр./с)', 'success')
     except FileNotFoundError:
         flash('База данных не найдена', 'error')
     except Exception as e:
@@ -533,10 +625,57 @@ def backup_create():
     return redirect(url_for('settings'))
 
 
+@app.route('/settings/backup/incremental/create', methods=['POST'])
+def backup_incremental_create():
+    """Создание инкрементального снимка базы данных"""
+    try:
+        snapshot = DatabaseManager.create_incremental_backup()
+        flash(f'Инкрементальный снимок создан: {snapshot["name"]} '
+              f'(новых страниц: {snapshot["new_chunks"]} из {snapshot["page_count"]}, '
+              f'записано {snapshot["new_bytes"] // 1024} КБ)', 'success')
+    except FileNotFoundError:
+        flash('База данных не найдена', 'error')
+    except Exception as e:
+        flash(f'Ошибка при создании снимка: {str(e)}', 'error')
+
+    return redirect(url_for('settings'))
+
+
+@app.route('/settings/backup/incremental/restore/<name>', methods=['POST'])
+def backup_incremental_restore(name):
+    """Восстановление базы данных из инкрементального снимка"""
+    try:
+        DatabaseManager.restore_from_incremental_backup(name)
+        flash(f'База данных восстановлена на момент снимка: {name}', 'success')
+    except FileNotFoundError as e:
+        flash(str(e), 'error')
+    except Exception as e:
+        flash(f'Ошибка при восстановлении из снимка: {str(e)}', 'error')
+
+    return redirect(url_for('settings'))
+
+
+@app.route('/settings/backup/incremental/delete/<name>', methods=['POST'])
+def backup_incremental_delete(name):
+    """Удаление инкрементального снимка"""
+    if DatabaseManager.delete_incremental_backup(name):
+        flash('Снимок успешно удален', 'success')
+    else:
+        flash('Ошибка при удалении снимка', 'error')
+
+    return redirect(url_for('settings'))
+
+
+@app.route('/settings/backup/status')
+def backup_status():
+    """Ход текущего или итоги последнего бэкапа"""
+    return jsonify(DatabaseManager.get_backup_progress())
+
+
 @app.route('/settings/backup/download/<filename>')
 def backup_download(filename):
-    """Скачивание файла бэкапа"""
-    if not filename.startswith('workout_backup_') or not filename.endswith('.db'):
+    """Скачивание файла бэкапа (?raw=1 - распакованный .db для сжатых архивов)"""
+    if not DatabaseManager.is_backup_filename(filename):
         flash('Неверное имя файла бэкапа', 'error')
         return redirect(url_for('settings'))
 
@@ -547,8 +686,16 @@ def backup_download(filename):
         flash('Файл бэкапа не найден', 'error')
         return redirect(url_for('settings'))
 
-    from flask import send_file
-    return send_file(backup_path, as_attachment=True, download_name=filename)
+    if request.args.get('raw') and filename.endswith(backups.COMPRESSED_SUFFIX):
+        # Распаковываем на лету порциями, не загружая архив в память
+        raw_filename = filename[:-len(backups.COMPRESSED_SUFFIX)]
+        return Response(backups.iter_decompressed(backup_path),
+                        mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename={raw_filename}'})
+
+    # send_file отдает файл с диска потоком
+    mimetype = 'application/gzip' if filename.endswith(backups.COMPRESSED_SUFFIX) else 'application/octet-stream'
+    return send_file(backup_path, as_attachment=True, download_name=filename, mimetype=mimetype)
 
 
 @app.route('/settings/backup/restore', methods=['POST'])
@@ -564,14 +711,16 @@ def backup_restore():
         return redirect(url_for('settings'))
 
     # Проверяем расширение файла
-    if not backup_file.filename.endswith('.db'):
-        flash('Файл должен иметь расширение .db', 'error')
+    compressed = backup_file.filename.endswith('.db' + backups.COMPRESSED_SUFFIX)
+    if not backup_file.filename.endswith('.db') and not compressed:
+        flash('Файл должен иметь расширение .db или .db.gz', 'error')
         return redirect(url_for('settings'))
 
     try:
         # Сохраняем временный файл
         import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as temp_file:
+        suffix = '.db' + backups.COMPRESSED_SUFFIX if compressed else '.db'
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
             backup_file.save(temp_file.name)
             temp_path = temp_file.name
 
@@ -611,7 +760,7 @@ def backup_delete(filename):
 @app.route('/settings/backup/restore-from/<filename>', methods=['POST'])
 def backup_restore_from_existing(filename):
     """Восстановление базы данных из существующего бэкапа"""
-    if not filename.startswith('workout_backup_') or not filename.endswith('.db'):
+    if not DatabaseManager.is_backup_filename(filename):
         flash('Неверное имя файла бэкапа', 'error')
         return redirect(url_for('settings'))
 
@@ -636,61 +785,45 @@ def backup_restore_from_existing(filename):
 @app.route('/statistics')
 def statistics():
     """Страница статистики тренировок"""
-    workout_logs = WorkoutLogModel.get_all()
+    cursor = request.args.get('cursor') or None
+    try:
+        page = WorkoutStatistics.get_logs_page(limit=app.config['STATISTICS_PAGE_SIZE'], cursor=cursor)
+    except ValueError:
+        flash('Некорректная ссылка на страницу журнала', 'error')
+        return redirect(url_for('statistics'))
 
-    # Фильтруем записи за последние 30 дней для карточек статистики
-    from datetime import datetime, timedelta
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    recent_logs = []
+    summary = WorkoutStatistics.get_summary(days=30)
 
-    for log in workout_logs:
-        try:
-            log_date = datetime.fromisoformat(log['date'].replace('Z', ''))
-            if log_date >= thirty_days_ago:
-                recent_logs.append(log)
-        except:
-            continue
-
-    # Форматируем данные для отображения
-    for log in workout_logs:
-        # Форматируем дату
-        try:
-            from datetime import datetime
-            date_obj = datetime.fromisoformat(log['date'].replace('Z', ''))
-            log['formatted_date'] = date_obj.strftime('%d.%m.%Y')
-            log['formatted_time'] = date_obj.strftime('%H:%M')
-            weekdays = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
-            log['weekday'] = weekdays[date_obj.weekday()]
-        except:
-            log['formatted_date'] = log['date']
-            log['formatted_time'] = ''
-            log['weekday'] = ''
-
-        # Форматируем длительность
-        duration = log['duration_seconds']
-        hours = duration // 3600
-        minutes = (duration % 3600) // 60
-        seconds = duration % 60
-
-        if hours > 0:
-            log['formatted_duration'] = f"{hours}:{minutes:02d}:{seconds:02d}"
-        else:
-            log['formatted_duration'] = f"{minutes}:{seconds:02d}"
+    # Страница отдается потоком по мере рендеринга шаблона. Сообщения забираются
+    # из сессии до отправки заголовков, иначе cookie сессии их не удалит
+    return stream_template('statistics.html',
+                           flashed_messages=get_flashed_messages(with_categories=True),
+                           workout_logs=page['logs'],
+                           next_cursor=page['next_cursor'],
+                           cursor=cursor,
+                           summary=summary)
 
-        # Рассчитываем процент завершения
-        if log['workoutset_code'] and log['completed_exercises']:
-            completion_percentage = WorkoutLogModel.calculate_completion_percentage(
-                log['workoutset_code'],
-                log['completed_exercises']
-            )
-            log['completion_percentage'] = completion_percentage
-        else:
-            # Для старых записей без информации о завершенных упражнениях
-            log['completion_percentage'] = None
 
-    return render_template('statistics.html',
-                         workout_logs=workout_logs,
-                         recent_logs=recent_logs)
+@app.route('/statistics/logs')
+def statistics_logs():
+    """Страница журнала тренировок в формате JSON (пагинация по курсору)"""
+    try:
+        limit = min(int(request.args.get('limit', app.config['STATISTICS_PAGE_SIZE'])), 500)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Некорректный параметр limit'}), 400
+
+    try:
+        page = WorkoutStatistics.get_logs_page(limit=limit, cursor=request.args.get('cursor') or None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'logs': page['logs'],
+        'next_cursor': page['next_cursor']
+    })
 
 
 @app.route('/statistics/log/<code>/delete', methods=['POST'])
@@ -723,5 +856,94 @@ def statistics_clear_all():
     return redirect(url_for('statistics'))
 
 
+@app.route(f'{api.PREFIX}/workout-sets')
+def api_workout_sets():
+    """Список комплексов (JSON API)"""
+    versions = get_data_versions('workout_sets')
+    return api.conditional_json(
+        [versions],
+        lambda fields: {'workout_sets': [api.select_fields(workout_set, fields)
+                                         for workout_set in WorkoutSetModel.get_all()]},
+        api.WORKOUT_SET_FIELDS)
+
+
+@app.route(f'{api.PREFIX}/workout-sets/<code>')
+def api_workout_set(code):
+    """Комплекс (JSON API)"""
+    versions = get_data_versions('workout_sets')
+    workout_set = WorkoutSetModel.get_by_code(code)
+    if not workout_set:
+        return api.error('Комплекс не найден', 404)
+    return api.conditional_json(
+        [versions, workout_set['updated_at']],
+        lambda fields: {'workout_set': api.select_fields(workout_set, fields)},
+        api.WORKOUT_SET_FIELDS)
+
+
+@app.route(f'{api.PREFIX}/workout-sets/<code>/exercises')
+def api_workout_set_exercises(code):
+    """Упражнения комплекса (JSON API)"""
+    versions = get_data_versions('exercises', 'exercise_images')
+    workout_set = WorkoutSetModel.get_by_code(code)
+    if not workout_set:
+        return api.error('Комплекс не найден', 404)
+
+    def build(fields):
+        exercises = ExerciseModel.get_by_workoutset(code, include_images='images' in fields)
+        for exercise in exercises:
+            exercise['workoutset_code'] = code
+        return {'exercises': [api.select_fields(exercise, fields) for exercise in exercises]}
+
+    return api.conditional_json([versions, workout_set['updated_at']], build, api.EXERCISE_FIELDS)
+
+
+@app.route(f'{api.PREFIX}/exercises/<code>')
+def api_exercise(code):
+    """Упражнение (JSON API)"""
+    versions = get_data_versions('exercises', 'exercise_images')
+    exercise = ExerciseModel.get_by_code(code)
+    if not exercise:
+        return api.error('Упражнение не найдено', 404)
+    return api.conditional_json(
+        [versions, exercise['updated_at']],
+        lambda fields: {'exercise': api.select_fields(exercise, fields)},
+        api.EXERCISE_FIELDS)
+
+
+@app.route(f'{api.PREFIX}/prefs')
+def api_prefs():
+    """Настройки пользователя (JSON API)"""
+    versions = get_data_versions('user_prefs')
+    return api.conditional_json(
+        [versions],
+        lambda fields: {'prefs': api.select_fields(
+            UserPrefsModel.get_first() or UserPrefsModel.get_defaults(), fields)},
+        api.PREFS_FIELDS)
+
+
+@app.route(f'{api.PREFIX}/logs')
+def api_logs():
+    """Журнал тренировок, новые сначала (JSON API, пагинация по курсору)"""
+    limit = api.parse_limit(app.config['STATISTICS_PAGE_SIZE'])
+    if limit is None:
+        return api.error('Некорректный параметр limit', 400)
+    cursor = request.args.get('cursor') or None
+    # Название комплекса в записи журнала меняется вместе с комплексом
+    versions = get_data_versions('workout_logs', 'workout_sets')
+
+    if cursor:
+        try:
+            decode_log_cursor(cursor)
+        except ValueError as e:
+            return api.error(str(e), 400)
+
+    def build(fields):
+        page = WorkoutLogModel.get_page(limit=limit, cursor=cursor)
+        return {'logs': [api.select_fields(log, fields) for log in page['logs']],
+                'next_cursor': page['next_cursor']}
+
+    return api.conditional_json([versions, limit, cursor], build, api.LOG_FIELDS)
+
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
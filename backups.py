@@ -0,0 +1,477 @@
+"""
+Онлайн-бэкап базы данных через SQLite backup API.
+
+Копирование идет порциями страниц: между шагами блокировка чтения
+снимается, поэтому запись в БД во время бэкапа не останавливается, а
+копия всегда получается согласованной.
+
+Кроме полных копий поддерживаются инкрементальные снимки с хранилищем
+страниц, адресуемых по содержимому.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.request import pathname2url
+
+# Количество страниц БД, копируемых за один шаг
+DEFAULT_PAGES_PER_STEP = 256
+# Пауза между шагами (секунды), чтобы дать пройти писателям
+DEFAULT_STEP_SLEEP = 0.005
+
+
+class BackupProgress:
+    """Потокобезопасное состояние текущего (или последнего) бэкапа."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {'status': 'idle'}
+
+    def start(self, filename: str):
+        with self._lock:
+            self._state = {
+                'status': 'running',
+                'filename': filename,
+                'started_at': time.time(),
+                'copied_pages': 0,
+                'total_pages': 0,
+                'percent': 0,
+                'elapsed_seconds': 0.0,
+                'pages_per_second': 0.0,
+                'error': None,
+            }
+            self._started = time.monotonic()
+
+    def update(self, remaining: int, total: int):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            copied = total - remaining
+            self._state.update({
+                'copied_pages': copied,
+                'total_pages': total,
+                'percent': round(copied * 100 / total) if total else 100,
+                'elapsed_seconds': round(elapsed, 3),
+                'pages_per_second': round(copied / elapsed, 1) if elapsed > 0 else 0.0,
+            })
+
+    def finish(self, error: Optional[str] = None):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            copied = self._state.get('copied_pages', 0)
+            self._state.update({
+                'status': 'error' if error else 'done',
+                'error': error,
+                'elapsed_seconds': round(elapsed, 3),
+                'pages_per_second': round(copied / elapsed, 1) if elapsed > 0 else 0.0,
+            })
+            if not error:
+                self._state['percent'] = 100
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Возвращает копию текущего состояния."""
+        with self._lock:
+            return dict(self._state)
+
+
+progress = BackupProgress()
+
+
+def online_backup(source: sqlite3.Connection, dest_path: str,
+                  pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+                  step_sleep: float = DEFAULT_STEP_SLEEP,
+                  name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Копирует БД из открытого соединения в файл dest_path.
+
+    name - имя бэкапа для отображения хода копирования (по умолчанию имя файла).
+
+    Данные пишутся во временный файл, который переименовывается в dest_path
+    только после успешного завершения, поэтому незаконченная копия никогда
+    не попадает в список бэкапов.
+
+    Returns:
+        dict: Итоговое состояние (страницы, скорость, длительность)
+    """
+    temp_path = dest_path + '.part'
+    progress.start(name or os.path.basename(dest_path))
+
+    def on_progress(status, remaining, total):
+        progress.update(remaining, total)
+        if remaining and step_sleep:
+            # Между шагами блокировка снята - даем поработать писателям
+            time.sleep(step_sleep)
+
+    try:
+        dest = sqlite3.connect(temp_path)
+        try:
+            source.backup(dest, pages=pages_per_step, progress=on_progress)
+            _use_rollback_journal(dest)
+        finally:
+            dest.close()
+        os.replace(temp_path, dest_path)
+    except (sqlite3.Error, OSError) as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        progress.finish(error=str(e))
+        raise
+
+    progress.finish()
+    return progress.snapshot()
+
+
+def _use_rollback_journal(conn: sqlite3.Connection):
+    """
+    Переводит копию БД в обычный журнал.
+
+    Копия рабочей БД в режиме WAL наследует этот режим и при открытии
+    обрастает файлами -wal/-shm; копия в обычном журнале - один файл.
+    """
+    conn.execute('PRAGMA journal_mode = DELETE').fetchall()
+
+
+def close_wal(path: str, timeout: float = 2.0):
+    """
+    Переносит WAL в файл БД и переводит БД в обычный журнал.
+
+    SQLite выходит из режима WAL, только если файл БД не открыт другими
+    соединениями, в том числе из других процессов. Поэтому после успешного
+    вызова файл можно подменить: никто не продолжит читать старый файл и
+    писать в его WAL. Соединения пула снова включают WAL при открытии.
+
+    Raises:
+        RuntimeError: Если БД открыта другим процессом
+    """
+    if not os.path.exists(path):
+        return
+    conn = sqlite3.connect(path, timeout=timeout)
+    try:
+        try:
+            mode = conn.execute('PRAGMA journal_mode = DELETE').fetchone()[0]
+        except sqlite3.OperationalError:
+            mode = None
+        if mode is None or mode.lower() != 'delete':
+            raise RuntimeError("База данных открыта другим процессом. Остановите другие "
+                               "экземпляры приложения и скрипты, работающие с БД, и повторите восстановление")
+    finally:
+        conn.close()
+
+
+def _connect_readonly(path: str) -> sqlite3.Connection:
+    """Открывает файл БД только для чтения, не создавая его."""
+    return sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+
+
+def fsync_path(path: str):
+    """Сбрасывает на диск файл или каталог."""
+    flags = os.O_RDONLY
+    if os.path.isdir(path):
+        flags |= getattr(os, 'O_DIRECTORY', 0)
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Некоторые ФС не поддерживают fsync каталогов
+        pass
+    finally:
+        os.close(fd)
+
+
+def copy_database(src_path: str, dest_path: str):
+    """
+    Копирует файл БД через SQLite backup API и сбрасывает копию на диск.
+
+    В отличие от копирования файла, результат всегда согласован, даже если
+    в исходную БД в это время пишут.
+    """
+    src = _connect_readonly(src_path)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            src.backup(dest)
+            _use_rollback_journal(dest)
+        finally:
+            dest.close()
+    finally:
+        src.close()
+    fsync_path(dest_path)
+
+
+def validate_database(path: str, required_tables: List[str], min_tables: int):
+    """
+    Проверяет, что файл - целая БД SQLite с таблицами приложения.
+
+    Raises:
+        sqlite3.DatabaseError: Если файл поврежден или не содержит нужных таблиц
+    """
+    try:
+        conn = _connect_readonly(path)
+        try:
+            result = conn.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"Файл БД поврежден: {result}")
+
+            placeholders = ', '.join('?' for _ in required_tables)
+            tables = conn.execute(f"""
+                SELECT name FROM sqlite_master
+                WHERE type='table' AND name IN ({placeholders})
+            """, required_tables).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        raise sqlite3.DatabaseError(f"Неверный формат файла базы данных: {str(e)}")
+
+    if len(tables) < min_tables:
+        raise sqlite3.DatabaseError("Файл не содержит корректную структуру БД приложения")
+
+
+# --- Сжатые архивы ------------------------------------------------------------
+
+COMPRESSED_SUFFIX = '.gz'
+# Размер порции при потоковом сжатии/распаковке
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def compress_file(src_path: str, dest_path: str, level: int = 6):
+    """Потоково сжимает файл в gzip-архив (через временный .part файл)."""
+    temp_path = dest_path + '.part'
+    try:
+        with open(src_path, 'rb') as src, gzip.open(temp_path, 'wb', compresslevel=level) as dest:
+            shutil.copyfileobj(src, dest, STREAM_CHUNK_SIZE)
+        os.replace(temp_path, dest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def decompress_file(src_path: str, dest_path: str):
+    """Потоково распаковывает gzip-архив в файл."""
+    with gzip.open(src_path, 'rb') as src, open(dest_path, 'wb') as dest:
+        shutil.copyfileobj(src, dest, STREAM_CHUNK_SIZE)
+
+
+def iter_decompressed(path: str) -> Iterator[bytes]:
+    """Отдает содержимое gzip-архива порциями, не загружая его в память."""
+    with gzip.open(path, 'rb') as src:
+        while True:
+            chunk = src.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def compressed_logical_size(path: str) -> int:
+    """
+    Возвращает исходный размер данных gzip-архива.
+
+    Берется из поля ISIZE в конце архива (размер по модулю 2^32), поэтому
+    архив не нужно распаковывать.
+    """
+    with open(path, 'rb') as f:
+        f.seek(-4, os.SEEK_END)
+        return int.from_bytes(f.read(4), 'little')
+
+
+# --- Инкрементальные бэкапы ---------------------------------------------------
+#
+# Снимок БД разбивается на страницы, каждая страница хранится один раз в
+# хранилище фрагментов под именем, равным хешу ее содержимого. Манифест
+# снимка - упорядоченный список хешей страниц. Новый снимок записывает на
+# диск только страницы, которых еще нет в хранилище.
+
+SNAPSHOT_PREFIX = 'workout_snapshot_'
+SNAPSHOT_SUFFIX = '.json'
+
+# Создание и удаление снимков в одном процессе не пересекаются. Между
+# процессами удаление защищено временем изменения фрагментов: снимок
+# обновляет mtime всех своих фрагментов до записи манифеста, а удаление
+# не трогает фрагменты новее самого нового манифеста.
+_snapshots_lock = threading.Lock()
+
+
+def _chunk_path(chunks_dir: str, digest: str) -> str:
+    """Путь к фрагменту в хранилище (с разбиением по первым символам хеша)."""
+    return os.path.join(chunks_dir, digest[:2], digest)
+
+
+def _read_page_size(db_file: str) -> int:
+    """Читает размер страницы из заголовка файла SQLite."""
+    with open(db_file, 'rb') as f:
+        header = f.read(100)
+    page_size = int.from_bytes(header[16:18], 'big')
+    # Значение 1 означает страницу 65536 байт
+    return 65536 if page_size == 1 else page_size
+
+
+def create_incremental_snapshot(source: sqlite3.Connection, snapshots_dir: str,
+                                name: str) -> Dict[str, Any]:
+    """
+    Создает инкрементальный снимок БД.
+
+    Сначала снимается согласованная онлайн-копия во временный файл, затем
+    ее страницы раскладываются по хранилищу фрагментов.
+
+    Returns:
+        dict: Манифест снимка (без списка страниц)
+    """
+    chunks_dir = os.path.join(snapshots_dir, 'chunks')
+    os.makedirs(chunks_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshots_dir, name + SNAPSHOT_SUFFIX)
+
+    with _snapshots_lock:
+        if os.path.exists(manifest_path):
+            raise FileExistsError(f"Снимок уже существует: {name}")
+        return _write_snapshot(source, snapshots_dir, chunks_dir, manifest_path, name)
+
+
+def _write_snapshot(source: sqlite3.Connection, snapshots_dir: str, chunks_dir: str,
+                    manifest_path: str, name: str) -> Dict[str, Any]:
+    """Раскладывает страницы онлайн-копии по хранилищу и записывает манифест."""
+    temp_db = os.path.join(snapshots_dir, f'.{name}.db')
+    online_backup(source, temp_db, name=name)
+
+    try:
+        page_size = _read_page_size(temp_db)
+        pages = []
+        new_chunks = 0
+        new_bytes = 0
+
+        with open(temp_db, 'rb') as f:
+            while True:
+                page = f.read(page_size)
+                if not page:
+                    break
+                digest = hashlib.blake2b(page, digest_size=16).hexdigest()
+                pages.append(digest)
+
+                chunk_path = _chunk_path(chunks_dir, digest)
+                try:
+                    # Свежий mtime: удаление снимка в другом процессе не тронет фрагмент
+                    os.utime(chunk_path)
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+                    temp_chunk = chunk_path + '.part'
+                    with open(temp_chunk, 'wb') as chunk_file:
+                        chunk_file.write(page)
+                    os.replace(temp_chunk, chunk_path)
+                    new_chunks += 1
+                    new_bytes += len(page)
+    finally:
+        os.remove(temp_db)
+
+    manifest = {
+        'version': 1,
+        'name': name,
+        'created_at': datetime.now().isoformat(),
+        'page_size': page_size,
+        'page_count': len(pages),
+        'size': page_size * len(pages),
+        'new_chunks': new_chunks,
+        'new_bytes': new_bytes,
+        'pages': pages,
+    }
+
+    temp_manifest = manifest_path + '.part'
+    with open(temp_manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    try:
+        # link, в отличие от replace, не перезаписывает существующий манифест
+        os.link(temp_manifest, manifest_path)
+    finally:
+        os.remove(temp_manifest)
+
+    return {key: value for key, value in manifest.items() if key != 'pages'}
+
+
+def _load_manifest(snapshots_dir: str, name: str) -> Dict[str, Any]:
+    """Загружает манифест снимка по имени."""
+    if not name.startswith(SNAPSHOT_PREFIX) or os.sep in name or '/' in name:
+        raise FileNotFoundError("Снимок не найден")
+    manifest_path = os.path.join(snapshots_dir, name + SNAPSHOT_SUFFIX)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError("Снимок не найден")
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_incremental_snapshots(snapshots_dir: str) -> List[Dict[str, Any]]:
+    """Возвращает манифесты снимков (без списка страниц), новые сначала."""
+    if not os.path.exists(snapshots_dir):
+        return []
+
+    snapshots = []
+    for filename in os.listdir(snapshots_dir):
+        if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith(SNAPSHOT_SUFFIX):
+            name = filename[:-len(SNAPSHOT_SUFFIX)]
+            try:
+                manifest = _load_manifest(snapshots_dir, name)
+            except (OSError, ValueError):
+                continue
+            manifest.pop('pages', None)
+            manifest['created_at'] = datetime.fromisoformat(manifest['created_at'])
+            snapshots.append(manifest)
+
+    snapshots.sort(key=lambda x: x['created_at'], reverse=True)
+    return snapshots
+
+
+def assemble_snapshot(snapshots_dir: str, name: str, dest_path: str):
+    """
+    Собирает файл БД из страниц снимка.
+
+    Raises:
+        FileNotFoundError: Если снимок или один из его фрагментов отсутствует
+    """
+    manifest = _load_manifest(snapshots_dir, name)
+    chunks_dir = os.path.join(snapshots_dir, 'chunks')
+
+    with open(dest_path, 'wb') as out:
+        for digest in manifest['pages']:
+            chunk_path = _chunk_path(chunks_dir, digest)
+            if not os.path.exists(chunk_path):
+                raise FileNotFoundError(f"Фрагмент снимка отсутствует: {digest}")
+            with open(chunk_path, 'rb') as chunk_file:
+                out.write(chunk_file.read())
+
+
+def delete_incremental_snapshot(snapshots_dir: str, name: str) -> int:
+    """
+    Удаляет снимок и фрагменты, на которые больше не ссылается ни один снимок.
+
+    Returns:
+        int: Количество удаленных фрагментов
+    """
+    with _snapshots_lock:
+        manifest = _load_manifest(snapshots_dir, name)
+        manifest_path = os.path.join(snapshots_dir, name + SNAPSHOT_SUFFIX)
+        newest_manifest = os.path.getmtime(manifest_path)
+        os.remove(manifest_path)
+
+        still_used = set()
+        for filename in os.listdir(snapshots_dir):
+            if filename.startswith(SNAPSHOT_PREFIX) and filename.endswith(SNAPSHOT_SUFFIX):
+                other = _load_manifest(snapshots_dir, filename[:-len(SNAPSHOT_SUFFIX)])
+                still_used.update(other['pages'])
+                newest_manifest = max(newest_manifest,
+                                      os.path.getmtime(os.path.join(snapshots_dir, filename)))
+
+        chunks_dir = os.path.join(snapshots_dir, 'chunks')
+        removed = 0
+        for digest in set(manifest['pages']) - still_used:
+            chunk_path = _chunk_path(chunks_dir, digest)
+            try:
+                # Фрагмент новее всех манифестов может принадлежать снимку,
+                # который сейчас создается другим процессом
+                if os.path.getmtime(chunk_path) > newest_manifest:
+                    continue
+                os.remove(chunk_path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
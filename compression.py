@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Сжатие ответов приложения.
+
+HTML-страницы и JSON сжимаются на лету (brotli, если установлен модуль
+brotli и его принимает браузер, иначе gzip). Потоковые ответы (страница
+статистики) сжимаются по частям и остаются потоковыми.
+
+Статические файлы на лету не сжимаются: рядом с ними заранее создаются
+копии .br и .gz, которые раздача статики выбирает по Accept-Encoding.
+
+Подготовка сжатых копий статики (после изменения CSS/JS):
+    python compression.py
+"""
+
+import gzip
+import os
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость, без него только gzip
+    brotli = None
+
+from flask import request
+
+
+# Ответы меньше этого размера (байт) не сжимаются
+DEFAULT_MIN_SIZE = 500
+
+# Типы содержимого, которые имеет смысл сжимать
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+# Расширения статических файлов, для которых готовятся сжатые копии
+PRECOMPRESSED_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+
+# Суффиксы сжатых копий в порядке предпочтения
+PRECOMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """Возвращает кодировки, доступные для сжатия на лету, в порядке предпочтения."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(available: Iterable[str]) -> Optional[str]:
+    """Выбирает кодировку из available, которую принимает клиент текущего запроса."""
+    accepted = request.accept_encodings
+    for encoding in available:
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+class _StreamCompressor:
+    """Сжатие потока частями: каждая часть сразу готова к отправке клиенту."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            # wbits=31: формат gzip (заголовок и контрольная сумма)
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Сжимает часть и сбрасывает буфер, чтобы не задерживать поток."""
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """Завершает сжатый поток."""
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    """Сжимает данные целиком."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_stream(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """Сжимает итератор частей ответа."""
+    compressor = _StreamCompressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_response(response, min_size: int = DEFAULT_MIN_SIZE,
+                      gzip_level: int = 6, brotli_quality: int = 4):
+    """
+    Сжимает ответ, если клиент это поддерживает (after_request).
+
+    Файлы (direct_passthrough), уже сжатые ответы и ответы с
+    Cache-Control: no-transform не трогаются.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or response.cache_control.no_transform):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(supported_encodings())
+    if encoding is None:
+        return response
+    level = brotli_quality if encoding == 'br' else gzip_level
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.iter_encoded(), encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    # Сжатое представление побайтно отличается от исходного - ETag становится слабым
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def find_precompressed(static_folder: str, filename: str) -> Tuple[str, Optional[str]]:
+    """
+    Выбирает заранее сжатую копию статического файла для текущего запроса.
+
+    Копия используется, только если она не старше оригинала.
+
+    Returns:
+        tuple: (имя файла для отправки, кодировка или None для оригинала)
+    """
+    try:
+        original_mtime = os.stat(os.path.join(static_folder, filename)).st_mtime
+    except (OSError, ValueError):
+        return filename, None
+
+    candidates = []
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+        try:
+            if os.stat(os.path.join(static_folder, filename + suffix)).st_mtime >= original_mtime:
+                candidates.append(encoding)
+        except OSError:
+            continue
+
+    encoding = negotiate_encoding(candidates) if candidates else None
+    if encoding is None:
+        return filename, None
+    return filename + dict(PRECOMPRESSED_SUFFIXES)[encoding], encoding
+
+
+def precompress_static(static_folder: str) -> int:
+    """
+    Создает сжатые копии (.gz и, если установлен brotli, .br) статических файлов.
+
+    Returns:
+        int: Количество созданных или обновленных копий
+    """
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if os.path.splitext(name)[1] not in PRECOMPRESSED_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as source:
+                data = source.read()
+
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                level = 11 if encoding == 'br' else 9
+                with open(target, 'wb') as compressed:
+                    compressed.write(compress_bytes(data, encoding, level))
+                written += 1
+                print(f"✓ {os.path.relpath(target, static_folder)}")
+    return written
+
+
+def init_app(app):
+    """Подключает сжатие ответов по конфигурации приложения."""
+    @app.after_request
+    def compress(response):
+        if not app.config.get('COMPRESS_RESPONSES', True):
+            return response
+        return compress_response(
+            response,
+            min_size=app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE),
+            gzip_level=app.config.get('COMPRESS_GZIP_LEVEL', 6),
+            brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+        )
+
+
+def main():
+    """Готовит сжатые копии статических файлов."""
+    static_folder = os.path.join(os.path.dirname(__file__), 'static')
+    if brotli is None:
+        print("⚠️  Модуль brotli не установлен - создаются только копии .gz (pip install Brotli)")
+    written = precompress_static(static_folder)
+    print(f"🎉 Создано сжатых копий: {written}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""
+Пул соединений с SQLite для приложения тренировок.
+
+Соединения переиспользуются между вызовами моделей вместо того, чтобы
+открываться заново на каждый запрос к БД. Внутри Flask-запроса все модели
+работают через одно соединение, привязанное к контексту приложения.
+
+Каждое новое соединение настраивается PRAGMA-параметрами пула (журнал WAL,
+ожидание блокировок и т.д., см. DEFAULT_PRAGMAS и db_storage.py).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Callable
+
+from flask import g, has_app_context
+
+
+# Параметры соединения по умолчанию (порядок важен: busy_timeout - первым,
+# чтобы переключение журнала ждало блокировку, а не падало)
+DEFAULT_PRAGMAS: Dict[str, Any] = {
+    'busy_timeout': 5000,  # мс ожидания блокировки вместо ошибки "database is locked"
+    'journal_mode': 'WAL',  # читатели не ждут писателей и наоборот
+    'synchronous': 'NORMAL',  # с WAL надежно при сбое приложения, fsync - при checkpoint
+    'cache_size': -16000,  # отрицательное значение - в КиБ: 16 МБ кеша страниц
+    'mmap_size': 64 * 1024 * 1024,  # чтение через отображение файла в память, байт
+    'wal_autocheckpoint': 1000,  # страниц в WAL до автоматического checkpoint
+    'journal_size_limit': 64 * 1024 * 1024,  # до какого размера усекать WAL после checkpoint
+    'foreign_keys': 'ON',
+}
+
+# Допустимое значение PRAGMA: число или слово (значения подставляются в SQL)
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def apply_pragmas(conn: sqlite3.Connection, pragmas: Dict[str, Any]):
+    """
+    Настраивает соединение PRAGMA-параметрами.
+
+    Raises:
+        ValueError: Если имя или значение параметра недопустимо
+    """
+    for name, value in pragmas.items():
+        if not PRAGMA_VALUE_RE.match(name) or not PRAGMA_VALUE_RE.match(str(value)):
+            raise ValueError(f"Недопустимый параметр PRAGMA: {name} = {value}")
+        conn.execute(f'PRAGMA {name} = {value}').fetchall()
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с базой данных SQLite."""
+
+    def __init__(self, db_path_getter: Callable[[], str], max_size: int = 5,
+                 health_check_interval: float = 30.0,
+                 pragmas: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path_getter: Функция, возвращающая путь к файлу БД
+            max_size: Максимальное число простаивающих соединений в пуле
+            health_check_interval: Через сколько секунд простоя соединение
+                проверяется перед повторным использованием
+            pragmas: PRAGMA-параметры новых соединений (по умолчанию DEFAULT_PRAGMAS)
+        """
+        self._db_path_getter = db_path_getter
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._idle: List[tuple] = []  # (соединение, время возврата в пул, inode файла БД)
+        self._local = threading.local()
+        self._generation = 0
+        self._checked_out = 0
+        self._exclusive_owner: Optional[int] = None
+
+        self._opened = 0
+        self._reused = 0
+        self._closed = 0
+        self._health_check_failures = 0
+
+    def configure(self, max_size: Optional[int] = None,
+                  health_check_interval: Optional[float] = None,
+                  pragmas: Optional[Dict[str, Any]] = None):
+        """
+        Изменяет параметры пула, лишние простаивающие соединения закрываются.
+
+        При смене PRAGMA-параметров закрываются все простаивающие соединения,
+        чтобы новые открылись уже с ними.
+        """
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if health_check_interval is not None:
+                self.health_check_interval = health_check_interval
+            if pragmas is not None and pragmas != self.pragmas:
+                self.pragmas = dict(pragmas)
+                self._generation += 1
+                excess, self._idle = self._idle, []
+            else:
+                excess = self._idle[self.max_size:]
+                self._idle = self._idle[:self.max_size]
+        for conn, _, _ in excess:
+            self._close(conn)
+
+    def _db_inode(self) -> Optional[int]:
+        """Возвращает inode файла БД (меняется, когда файл подменяют)."""
+        try:
+            return os.stat(self._db_path_getter()).st_ino
+        except OSError:
+            return None
+
+    def _open(self) -> sqlite3.Connection:
+        """Открывает новое соединение с настройками приложения."""
+        conn = sqlite3.connect(self._db_path_getter(), check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Возвращать результаты как dict
+        try:
+            apply_pragmas(conn, self.pragmas)
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def _close(self, conn: sqlite3.Connection):
+        """Закрывает соединение, игнорируя ошибки."""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._closed += 1
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """Проверяет, что соединение еще работоспособно."""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            with self._lock:
+                self._health_check_failures += 1
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        Выдает соединение текущему потоку.
+
+        Повторный вызов из того же потока до release() возвращает то же
+        соединение, поэтому вложенные вызовы моделей не открывают новых.
+        Пока другой поток держит монопольный доступ (exclusive), вызов ждет.
+        """
+        local_conn = getattr(self._local, 'conn', None)
+        if local_conn is not None:
+            self._local.depth += 1
+            with self._lock:
+                self._reused += 1
+            return local_conn
+
+        with self._condition:
+            me = threading.get_ident()
+            if not self._condition.wait_for(
+                    lambda: self._exclusive_owner in (None, me), timeout=timeout):
+                raise TimeoutError("База данных занята восстановлением")
+            self._checked_out += 1
+
+        try:
+            conn, generation, inode = self._take_idle()
+            if conn is None:
+                inode = self._db_inode()
+                conn = self._open()
+                generation = self._generation
+        except BaseException:
+            with self._condition:
+                self._checked_out -= 1
+                self._condition.notify_all()
+            raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        self._local.generation = generation
+        self._local.inode = inode
+        return conn
+
+    def _take_idle(self):
+        """Берет из пула исправное соединение к текущему файлу БД."""
+        current_inode = self._db_inode()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None, None, None
+                candidate, released_at, inode = self._idle.pop()
+                generation = self._generation
+
+            # Файл БД подменили (например, восстановлением в другом процессе)
+            if inode != current_inode:
+                self._close(candidate)
+                continue
+
+            idle_for = time.monotonic() - released_at
+            if idle_for >= self.health_check_interval and not self._is_healthy(candidate):
+                self._close(candidate)
+                continue
+
+            with self._lock:
+                self._reused += 1
+            return candidate, generation, inode
+
+    def release(self, conn: sqlite3.Connection):
+        """Возвращает соединение в пул (или закрывает, если пул заполнен)."""
+        if getattr(self._local, 'conn', None) is not conn:
+            # Чужое соединение - просто закрываем
+            self._close(conn)
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        generation = self._local.generation
+        inode = self._local.inode
+        self._local.conn = None
+
+        try:
+            # Незавершенная транзакция не должна перейти к следующему пользователю
+            if conn.in_transaction:
+                conn.rollback()
+            keep = True
+        except sqlite3.Error:
+            keep = False
+
+        with self._condition:
+            if (keep and generation == self._generation and self._exclusive_owner is None
+                    and len(self._idle) < self.max_size):
+                self._idle.append((conn, time.monotonic(), inode))
+                self._checked_out -= 1
+                self._condition.notify_all()
+                return
+        # Соединение считается выданным, пока не закрыто: exclusive() не должен
+        # подменить файл БД, пока оно еще открыто
+        self._close(conn)
+        with self._condition:
+            self._checked_out -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self):
+        """Контекстный менеджер: выдает соединение и возвращает его в пул."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """
+        Закрывает все простаивающие соединения.
+
+        Соединения, выданные в данный момент, будут закрыты при возврате,
+        поэтому после замены файла БД никто не продолжит работать со старым.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._generation += 1
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    @contextmanager
+    def exclusive(self, timeout: float = 30.0):
+        """
+        Монопольный доступ к файлу БД (например, для его замены).
+
+        Новые соединения не выдаются, выданные дожидаются возврата, после
+        чего все соединения закрываются. Текущий поток не должен держать
+        соединение из пула.
+
+        Raises:
+            TimeoutError: Если выданные соединения не вернулись за timeout секунд
+        """
+        if getattr(self._local, 'conn', None) is not None:
+            raise RuntimeError("Поток держит соединение из пула и не может получить монопольный доступ")
+
+        me = threading.get_ident()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._exclusive_owner is None, timeout=timeout):
+                raise TimeoutError("База данных занята восстановлением")
+            self._exclusive_owner = me
+            drained = self._condition.wait_for(lambda: self._checked_out == 0, timeout=timeout)
+            if not drained:
+                self._exclusive_owner = None
+                self._condition.notify_all()
+                raise TimeoutError("Не удалось дождаться завершения запросов к БД")
+
+        try:
+            self.close_all()
+            yield
+        finally:
+            self.close_all()
+            with self._condition:
+                self._exclusive_owner = None
+                self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики пула."""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'checked_out': self._checked_out,
+                'opened': self._opened,
+                'reused': self._reused,
+                'closed': self._closed,
+                'health_check_failures': self._health_check_failures,
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+def get_pool() -> ConnectionPool:
+    """Возвращает общий пул соединений приложения."""
+    global _pool
+    if _pool is None:
+        # Импорт здесь, чтобы избежать циклической зависимости с models
+        from models import get_db_path
+        _pool = ConnectionPool(get_db_path)
+    return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Выдает соединение для одной операции модели.
+
+    Внутри контекста Flask соединение берется один раз на весь запрос и
+    возвращается в пул при завершении контекста приложения. Незакоммиченное
+    откатывается только при выходе из внешнего вызова: вложенный вызов
+    модели не отменяет записи вызывающей транзакции (как _local.depth в
+    ConnectionPool.acquire/release).
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            conn = get_pool().acquire()
+            g._db_conn = conn
+        g._db_depth = g.get('_db_depth', 0) + 1
+        try:
+            yield conn
+        finally:
+            # Соединение могло быть возвращено в пул раньше (exclusive_access)
+            if g.get('_db_conn') is conn:
+                g._db_depth -= 1
+                # Поведение как у отдельного соединения: незакоммиченное откатывается
+                if g._db_depth == 0 and conn.in_transaction:
+                    conn.rollback()
+    else:
+        with get_pool().connection() as conn:
+            yield conn
+
+
+def release_request_connection(exception=None):
+    """Возвращает соединение запроса в пул (teardown_appcontext)."""
+    conn = g.pop('_db_conn', None)
+    g.pop('_db_depth', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+@contextmanager
+def exclusive_access(timeout: float = 30.0):
+    """
+    Монопольный доступ к файлу БД для текущего потока.
+
+    Соединение текущего запроса заранее возвращается в пул, чтобы не
+    ждать самого себя; после выхода модели получат новое соединение.
+    """
+    if has_app_context():
+        release_request_connection()
+    with get_pool().exclusive(timeout=timeout):
+        yield
+
+
+def init_app(app):
+    """Настраивает пул по конфигурации приложения и регистрирует teardown."""
+    get_pool().configure(
+        max_size=app.config.get('DB_POOL_SIZE', 5),
+        health_check_interval=app.config.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30.0)
+    )
+    app.teardown_appcontext(release_request_connection)
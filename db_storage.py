@@ -0,0 +1,101 @@
+"""
+Настройка хранения SQLite для нескольких рабочих процессов.
+
+БД работает в режиме WAL: читатели не ждут писателей, а писатель,
+встретив блокировку, ждет busy_timeout миллисекунд вместо ошибки
+"database is locked". Параметры соединений берутся из конфигурации
+приложения (ключи DB_*), а WAL регулярно переносится в файл БД фоновой
+задачей db_checkpoint, чтобы он не разрастался между автоматическими
+checkpoint.
+"""
+
+import os
+from typing import Dict, Any
+
+import db_pool
+import jobs
+from models import get_db_path
+
+
+# Ключи конфигурации -> PRAGMA-параметры соединения
+CONFIG_PRAGMAS = (
+    ('DB_BUSY_TIMEOUT_MS', 'busy_timeout'),
+    ('DB_JOURNAL_MODE', 'journal_mode'),
+    ('DB_SYNCHRONOUS', 'synchronous'),
+    ('DB_MMAP_SIZE', 'mmap_size'),
+    ('DB_WAL_AUTOCHECKPOINT', 'wal_autocheckpoint'),
+    ('DB_JOURNAL_SIZE_LIMIT', 'journal_size_limit'),
+)
+
+# Режимы PRAGMA wal_checkpoint
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def pragmas_from_config(config) -> Dict[str, Any]:
+    """Собирает PRAGMA-параметры соединений из конфигурации приложения."""
+    pragmas = dict(db_pool.DEFAULT_PRAGMAS)
+    for key, pragma in CONFIG_PRAGMAS:
+        if config.get(key) is not None:
+            pragmas[pragma] = config[key]
+    if config.get('DB_CACHE_SIZE_KB') is not None:
+        # Отрицательное значение cache_size - размер в КиБ, а не в страницах
+        pragmas['cache_size'] = -abs(int(config['DB_CACHE_SIZE_KB']))
+    return pragmas
+
+
+def checkpoint(mode: str = 'PASSIVE') -> Dict[str, Any]:
+    """
+    Переносит WAL в файл БД.
+
+    PASSIVE не ждет читателей и писателей; TRUNCATE дожидается их
+    (в пределах busy_timeout) и усекает WAL до нуля.
+
+    Returns:
+        dict: busy (checkpoint не завершен из-за блокировки), wal_pages,
+        checkpointed_pages; пустой, если БД не в режиме WAL
+
+    Raises:
+        ValueError: Если режим неизвестен
+    """
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f"Неизвестный режим checkpoint: {mode}")
+    with db_pool.get_pool().connection() as conn:
+        if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            return {}
+        busy, wal_pages, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    return {'busy': bool(busy), 'wal_pages': wal_pages, 'checkpointed_pages': checkpointed}
+
+
+@jobs.handler('db_checkpoint')
+def checkpoint_job(payload: Dict[str, Any]):
+    """Периодическая фоновая задача: checkpoint WAL."""
+    result = checkpoint(payload.get('mode', 'PASSIVE'))
+    if result.get('busy'):
+        print(f"Checkpoint БД не завершен: перенесено {result['checkpointed_pages']} "
+              f"из {result['wal_pages']} страниц")
+
+
+def stats() -> Dict[str, Any]:
+    """Возвращает режим журнала, размер WAL и действующие параметры соединений."""
+    db_path = get_db_path()
+    try:
+        wal_size = os.path.getsize(db_path + '-wal')
+    except OSError:
+        wal_size = 0
+    with db_pool.get_pool().connection() as conn:
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    return {
+        'journal_mode': journal_mode,
+        'wal_size': wal_size,
+        'pragmas': dict(db_pool.get_pool().pragmas),
+    }
+
+
+def init_app(app):
+    """Настраивает соединения пула и периодический checkpoint по конфигурации."""
+    db_pool.get_pool().configure(pragmas=pragmas_from_config(app.config))
+    interval = app.config.get('DB_CHECKPOINT_INTERVAL_SECONDS', 300)
+    if interval:
+        jobs.get_queue().every('db_checkpoint', interval,
+                               {'mode': app.config.get('DB_CHECKPOINT_MODE', 'PASSIVE')})
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Сборка мусора в папке изображений упражнений.
+
+Находит файлы в static/images/exercises/ (и в подпапке копий), о которых
+не знает БД: изображения удаленных упражнений и комплексов, копии удаленных
+изображений, оставшиеся от прерванных загрузок временные файлы. Папка
+читается один раз, а каждый файл проверяется по множеству путей из БД.
+
+Свежие файлы (моложе min_age_seconds) не трогаются: они могут
+принадлежать загрузке, которая еще не успела записать ссылку в БД.
+
+Использование:
+    python image_gc.py            # отчет без удаления
+    python image_gc.py --delete   # удалить найденные файлы
+"""
+
+import os
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+from models import ImageFileModel, ImageVariantModel
+import image_pipeline
+import jobs
+
+
+# Файлы моложе этого возраста (сек) не удаляются
+DEFAULT_MIN_AGE_SECONDS = 3600
+
+# Сколько файлов удаляется за одну порцию
+DEFAULT_BATCH_SIZE = 100
+
+# Папки с файлами изображений относительно static/
+SCANNED_DIRS = ('images/exercises', f'images/exercises/{image_pipeline.VARIANTS_DIR}')
+
+
+def scan_files(static_folder: str) -> Dict[str, Tuple[int, float]]:
+    """
+    Читает папки изображений.
+
+    Returns:
+        dict: {путь относительно static/: (размер, время изменения)}
+    """
+    files = {}
+    for directory in SCANNED_DIRS:
+        try:
+            entries = os.scandir(os.path.join(static_folder, directory))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[f"{directory}/{entry.name}"] = (stat.st_size, stat.st_mtime)
+    return files
+
+
+def find_orphans(static_folder: str,
+                 min_age_seconds: int = DEFAULT_MIN_AGE_SECONDS) -> Dict[str, Any]:
+    """
+    Сравнивает файлы на диске с путями из БД.
+
+    Returns:
+        dict: orphans - файлы без записи в БД ({path, size}), старше
+        min_age_seconds; reclaimable_bytes - их общий размер; scanned_files;
+        skipped_recent - свежие файлы без записи; missing - пути из БД,
+        файлов для которых нет на диске
+    """
+    files = scan_files(static_folder)
+    known = ImageFileModel.get_known_paths()
+    cutoff = time.time() - min_age_seconds
+
+    orphans: List[Dict[str, Any]] = []
+    skipped_recent = 0
+    for path, (size, mtime) in sorted(files.items()):
+        if path in known:
+            continue
+        if mtime > cutoff:
+            skipped_recent += 1
+            continue
+        orphans.append({'path': path, 'size': size})
+
+    return {
+        'orphans': orphans,
+        'orphan_count': len(orphans),
+        'reclaimable_bytes': sum(orphan['size'] for orphan in orphans),
+        'scanned_files': len(files),
+        'skipped_recent': skipped_recent,
+        'missing': sorted(known - files.keys()),
+    }
+
+
+def collect_orphans(static_folder: str, dry_run: bool = True,
+                    min_age_seconds: int = DEFAULT_MIN_AGE_SECONDS,
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    batch_pause: float = 0.0) -> Dict[str, Any]:
+    """
+    Удаляет файлы без записи в БД порциями.
+
+    Перед каждой порцией пути из БД перечитываются, а возраст файла
+    проверяется заново, поэтому файл, на который успели сослаться во
+    время сборки, не удаляется.
+
+    Args:
+        static_folder: Путь к папке static
+        dry_run: Только отчет, без удаления
+        min_age_seconds: Минимальный возраст удаляемого файла
+        batch_size: Сколько файлов удалять за порцию
+        batch_pause: Пауза между порциями (сек), чтобы не нагружать диск
+
+    Returns:
+        dict: Отчет find_orphans, дополненный deleted_count, deleted_bytes
+        и stale_variant_rows (удаленные записи о копиях без оригинала)
+    """
+    report = find_orphans(static_folder, min_age_seconds)
+    report['deleted_count'] = 0
+    report['deleted_bytes'] = 0
+    report['stale_variant_rows'] = 0
+    if dry_run:
+        return report
+
+    report['stale_variant_rows'] = ImageVariantModel.delete_orphaned()
+
+    orphans = report['orphans']
+    for start in range(0, len(orphans), batch_size):
+        if start and batch_pause:
+            time.sleep(batch_pause)
+        known = ImageFileModel.get_known_paths()
+        cutoff = time.time() - min_age_seconds
+        for orphan in orphans[start:start + batch_size]:
+            full_path = os.path.join(static_folder, orphan['path'])
+            try:
+                if orphan['path'] in known or os.stat(full_path).st_mtime > cutoff:
+                    continue
+                os.remove(full_path)
+            except FileNotFoundError:
+                continue
+            report['deleted_count'] += 1
+            report['deleted_bytes'] += orphan['size']
+    return report
+
+
+@jobs.handler('image_gc')
+def gc_job(payload: Dict[str, Any]):
+    """Периодическая фоновая задача: удалить файлы изображений без записи в БД."""
+    report = collect_orphans(
+        image_pipeline.get_static_folder(),
+        dry_run=False,
+        min_age_seconds=payload.get('min_age_seconds', DEFAULT_MIN_AGE_SECONDS),
+        batch_size=payload.get('batch_size', DEFAULT_BATCH_SIZE),
+        batch_pause=payload.get('batch_pause', 0.1)
+    )
+    if report['deleted_count']:
+        print(f"Сборка мусора изображений: удалено {report['deleted_count']} файлов "
+              f"({report['deleted_bytes']} байт)")
+
+
+def format_size(size: int) -> str:
+    """Форматирует размер в байтах для отчета."""
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} КБ"
+    return f"{size / 1024 / 1024:.1f} МБ"
+
+
+def show_help():
+    """Показывает справку по использованию скрипта."""
+    print("""
+Использование: python image_gc.py [опции]
+
+Опции:
+  --delete          Удалить найденные файлы (без этой опции - только отчет)
+  --min-age СЕК     Не трогать файлы моложе СЕК секунд (по умолчанию 3600)
+  --batch-size N    Удалять по N файлов за порцию (по умолчанию 100)
+  --help, -h        Показать эту справку
+    """)
+
+
+def main():
+    """Основная функция скрипта."""
+    args = sys.argv[1:]
+
+    if '--help' in args or '-h' in args:
+        show_help()
+        return
+
+    def option(name: str, default: int) -> int:
+        if name in args:
+            return int(args[args.index(name) + 1])
+        return default
+
+    dry_run = '--delete' not in args
+    report = collect_orphans(
+        image_pipeline.get_static_folder(),
+        dry_run=dry_run,
+        min_age_seconds=option('--min-age', DEFAULT_MIN_AGE_SECONDS),
+        batch_size=option('--batch-size', DEFAULT_BATCH_SIZE)
+    )
+
+    for orphan in report['orphans']:
+        print(f"  {orphan['path']} ({format_size(orphan['size'])})")
+    for path in report['missing']:
+        print(f"⚠️  Нет файла для записи в БД: {path}")
+
+    print(f"\nПроверено файлов: {report['scanned_files']}, "
+          f"пропущено свежих: {report['skipped_recent']}")
+    print(f"Файлов без записи в БД: {report['orphan_count']} "
+          f"({format_size(report['reclaimable_bytes'])})")
+    if dry_run:
+        print("Это отчет: для удаления запустите с опцией --delete")
+    else:
+        print(f"🎉 Удалено файлов: {report['deleted_count']} "
+              f"({format_size(report['deleted_bytes'])})")
+
+
+if __name__ == '__main__':
+    main()
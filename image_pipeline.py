@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Уменьшенные копии изображений упражнений.
+
+При загрузке изображения для него создаются копии нескольких ширин в
+форматах WebP и AVIF (если их поддерживает установленный Pillow). Шаблоны
+отдают копии через srcset, поэтому на миниатюрах браузер загружает
+несколько килобайт вместо оригинала.
+
+Без Pillow копии не создаются и везде показываются оригиналы.
+
+Использование для уже загруженных изображений:
+    python image_pipeline.py
+"""
+
+import os
+from typing import List, Dict, Any
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow - необязательная зависимость
+    Image = None
+
+from models import ImageVariantModel
+import jobs
+
+
+# Ширины копий в пикселях: миниатюры 90-160px на экранах с плотностью 1x-4x
+VARIANT_WIDTHS = (160, 320, 640)
+
+# Подпапка для копий рядом с оригиналами
+VARIANTS_DIR = 'variants'
+
+# Параметры кодирования; форматы перечислены в порядке предпочтения
+FORMAT_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 80, 'method': 6},
+}
+
+
+def get_static_folder() -> str:
+    """Возвращает путь к папке static приложения."""
+    return os.path.join(os.path.dirname(__file__), 'static')
+
+
+def available_formats() -> List[str]:
+    """Возвращает форматы копий, которые умеет кодировать установленный Pillow."""
+    if Image is None:
+        return []
+    # Кодировщик AVIF есть в Pillow >= 11.3 или в плагине pillow-avif-plugin
+    extensions = Image.registered_extensions()
+    return [image_format for image_format in FORMAT_OPTIONS
+            if extensions.get(f'.{image_format}') in Image.SAVE]
+
+
+def variant_path(source_path: str, width: int, image_format: str) -> str:
+    """Возвращает путь копии относительно static/ (images/exercises/variants/<имя>_<ширина>w.<формат>)."""
+    directory, filename = os.path.split(source_path)
+    stem = os.path.splitext(filename)[0]
+    return f"{directory}/{VARIANTS_DIR}/{stem}_{width}w.{image_format}"
+
+
+def generate_variants(static_folder: str, source_path: str) -> List[Dict[str, Any]]:
+    """
+    Создает копии изображения всех ширин и форматов.
+
+    Копии шире оригинала не создаются; оригинал меньше самой малой ширины
+    только перекодируется.
+
+    Args:
+        static_folder: Путь к папке static
+        source_path: Путь к оригиналу относительно static/
+
+    Returns:
+        list: Созданные копии ({format, width, height, path}); пустой, если
+        Pillow не установлен или файл не удалось прочитать
+    """
+    formats = available_formats()
+    if not formats:
+        return []
+
+    try:
+        with Image.open(os.path.join(static_folder, source_path)) as original:
+            # Учитываем поворот из EXIF - иначе фото с телефона лягут набок
+            image = ImageOps.exif_transpose(original)
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать изображение {source_path}: {e}")
+        return []
+
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [image.width]
+    variants = []
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            path = variant_path(source_path, width, image_format)
+            full_path = os.path.join(static_folder, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                resized.save(full_path, image_format.upper(), **FORMAT_OPTIONS[image_format])
+            except OSError as e:
+                print(f"Не удалось сохранить копию {path}: {e}")
+                continue
+            variants.append({'format': image_format, 'width': width,
+                             'height': height, 'path': path})
+    return variants
+
+
+def process_image(static_folder: str, source_path: str) -> List[Dict[str, Any]]:
+    """Создает копии загруженного изображения и записывает их в БД."""
+    variants = generate_variants(static_folder, source_path)
+    if variants:
+        ImageVariantModel.replace(source_path, variants)
+    return variants
+
+
+def delete_variants(static_folder: str, source_path: str) -> int:
+    """
+    Удаляет копии изображения с диска и из БД.
+
+    Returns:
+        int: Количество удаленных записей о копиях
+    """
+    for variant in ImageVariantModel.get_for_path(source_path):
+        try:
+            os.remove(os.path.join(static_folder, variant['path']))
+        except FileNotFoundError:
+            pass
+    return ImageVariantModel.delete_for_path(source_path)
+
+
+def resolve_upload_path(static_folder: str, image_path: str) -> str:
+    """
+    Возвращает полный путь к загруженному изображению.
+
+    Raises:
+        ValueError: Если путь указывает за пределы папки загрузок
+    """
+    uploads = os.path.realpath(os.path.join(static_folder, 'images', 'exercises'))
+    full_path = os.path.realpath(os.path.join(static_folder, image_path))
+    if os.path.dirname(full_path) != uploads:
+        raise ValueError(f"Недопустимый путь изображения: {image_path}")
+    return full_path
+
+
+@jobs.handler('image_variants')
+def variants_job(payload: Dict[str, Any]):
+    """Фоновая задача: создать копии загруженного изображения."""
+    static_folder = get_static_folder()
+    resolve_upload_path(static_folder, payload['path'])
+    process_image(static_folder, payload['path'])
+
+
+def main():
+    """Создает копии для всех изображений упражнений, у которых их еще нет."""
+    if not available_formats():
+        print("❌ Pillow не установлен или не поддерживает WebP/AVIF: pip install Pillow")
+        return
+
+    static_folder = get_static_folder()
+    sources = ImageVariantModel.get_sources_without_variants()
+    print(f"Изображений без копий: {len(sources)}")
+
+    processed = 0
+    for source_path in sources:
+        if not os.path.exists(os.path.join(static_folder, source_path)):
+            print(f"⚠️  Файл не найден: {source_path}")
+            continue
+        if process_image(static_folder, source_path):
+            processed += 1
+            print(f"✓ {source_path}")
+
+    print(f"🎉 Обработано изображений: {processed}")
+
+
+if __name__ == '__main__':
+    main()
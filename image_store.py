@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Хранилище изображений упражнений с адресацией по содержимому.
+
+Загруженный файл называется по хешу своего содержимого
+(images/exercises/<blake2b>.<расширение>), поэтому одно и то же изображение,
+загруженное в несколько упражнений, хранится на диске один раз. Ссылки на
+файлы считают триггеры на exercise_images (таблица image_files); файл,
+на который не осталось ссылок, удаляет фоновая задача collect_images после
+паузы, чтобы не удалить его между загрузкой и сохранением упражнения.
+
+Перевод ранее загруженных файлов на адресацию по содержимому:
+    python image_store.py
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import Tuple, Dict, Any
+
+from werkzeug.utils import secure_filename
+
+from models import ImageFileModel
+import image_pipeline
+import jobs
+
+
+# Размер блока при чтении загружаемого файла
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Сколько секунд файл без ссылок хранится до удаления
+DEFAULT_GRACE_SECONDS = 300
+
+# Сколько файлов удаляется за один проход фоновой задачи
+COLLECT_BATCH_SIZE = 100
+
+
+def content_hash_of(stream, copy_to=None) -> Tuple[str, int]:
+    """
+    Считает хеш содержимого потока, читая его блоками.
+
+    Args:
+        stream: Поток для чтения
+        copy_to: Файл, в который прочитанное одновременно копируется (необязательно)
+
+    Returns:
+        tuple: (хеш, размер в байтах)
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    size = 0
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        if copy_to is not None:
+            copy_to.write(chunk)
+        size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+def store_upload(image_file, static_folder: str) -> Tuple[str, bool]:
+    """
+    Сохраняет загруженное изображение под именем по хешу содержимого.
+
+    Файл пишется во временный файл с одновременным подсчетом хеша. Затем
+    запись о файле обновляется или создается (это откладывает его удаление
+    сборщиком), и только после этого файл кладется на место, если его нет
+    на диске: сборщик мог удалить файл перед тем, как запись была сохранена.
+
+    Returns:
+        tuple: (путь относительно static/, True если файл записан на диск)
+    """
+    extension = os.path.splitext(secure_filename(image_file.filename))[1].lower()
+    uploads = os.path.join(static_folder, 'images', 'exercises')
+
+    fd, temp_path = tempfile.mkstemp(dir=uploads, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            content_hash, size = content_hash_of(image_file.stream, copy_to=temp_file)
+
+        path = ImageFileModel.touch_by_hash(content_hash)
+        if path is None:
+            path = f"images/exercises/{content_hash}{extension}"
+            ImageFileModel.register(path, content_hash, size)
+
+        # Запись сохранена - сборщик не удалит файл до конца паузы; файла
+        # может не быть на диске, если его удалили до сохранения записи
+        full_path = os.path.join(static_folder, path)
+        if os.path.exists(full_path):
+            return path, False
+        os.replace(temp_path, full_path)
+        return path, True
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def collect_unreferenced(static_folder: str, grace_seconds: int = DEFAULT_GRACE_SECONDS) -> int:
+    """
+    Удаляет файлы изображений, на которые нет ссылок дольше grace_seconds.
+
+    Returns:
+        int: Количество удаленных файлов
+    """
+    removed = 0
+    while True:
+        paths = ImageFileModel.get_collectable(grace_seconds, limit=COLLECT_BATCH_SIZE)
+        if not paths:
+            return removed
+        for path in paths:
+            if not ImageFileModel.delete_if_unreferenced(path, grace_seconds,
+                                                         lambda: _remove_upload(static_folder, path)):
+                continue
+            image_pipeline.delete_variants(static_folder, path)
+            removed += 1
+
+
+def _remove_upload(static_folder: str, path: str):
+    """Удаляет файл изображения с диска (отсутствующий файл - не ошибка)."""
+    try:
+        os.remove(image_pipeline.resolve_upload_path(static_folder, path))
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        # Путь вне папки загрузок - запись удаляется, файл не трогаем
+        pass
+
+
+def schedule_collect(grace_seconds: int = DEFAULT_GRACE_SECONDS):
+    """Ставит в очередь удаление файлов без ссылок (если задача еще не запланирована)."""
+    jobs.enqueue('collect_images', {'grace_seconds': grace_seconds}, delay=grace_seconds, unique=True)
+
+
+@jobs.handler('collect_images')
+def collect_job(payload: Dict[str, Any]):
+    """Фоновая задача: удалить файлы без ссылок, дождавшиеся конца паузы."""
+    grace_seconds = payload.get('grace_seconds', DEFAULT_GRACE_SECONDS)
+    collect_unreferenced(image_pipeline.get_static_folder(), grace_seconds)
+    # Файлы, у которых пауза еще не прошла, удалит следующий запуск
+    if ImageFileModel.count_unreferenced():
+        schedule_collect(grace_seconds)
+
+
+def main():
+    """Переводит ранее загруженные файлы на адресацию по содержимому."""
+    static_folder = image_pipeline.get_static_folder()
+    paths = ImageFileModel.get_without_hash()
+    print(f"Файлов без хеша: {len(paths)}")
+
+    converted = 0
+    for old_path in paths:
+        try:
+            full_path = image_pipeline.resolve_upload_path(static_folder, old_path)
+            with open(full_path, 'rb') as image_file:
+                content_hash, size = content_hash_of(image_file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Пропущен {old_path}: {e}")
+            continue
+
+        new_path = ImageFileModel.touch_by_hash(content_hash)
+        if new_path is None:
+            extension = os.path.splitext(old_path)[1].lower()
+            new_path = f"images/exercises/{content_hash}{extension}"
+            new_full_path = os.path.join(static_folder, new_path)
+            if not os.path.exists(new_full_path):
+                # Жесткая ссылка: старое имя удалит сборщик, когда на него не останется ссылок
+                os.link(full_path, new_full_path)
+        ImageFileModel.readdress(old_path, new_path, content_hash, size)
+        converted += 1
+        print(f"✓ {old_path} -> {new_path}")
+
+    removed = collect_unreferenced(static_folder, grace_seconds=0)
+    print(f"🎉 Переведено файлов: {converted}, удалено файлов без ссылок: {removed}")
+
+
+if __name__ == '__main__':
+    main()
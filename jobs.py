@@ -0,0 +1,267 @@
+"""
+Фоновые задачи приложения тренировок.
+
+Долгие операции с файлами (создание копий изображений, удаление файлов)
+выполняются вне запроса: обработчик запроса только ставит задачу в очередь,
+а рабочие потоки забирают ее из таблицы jobs. Задачи хранятся в БД, поэтому
+не теряются при перезапуске приложения; неудачные повторяются с задержкой.
+
+Выполняемая задача арендуется: пока процесс жив, он раз в треть срока
+аренды обновляет updated_at своих задач. Задачи с истекшей арендой
+(процесс остановлен или упал) возвращаются в очередь любым процессом,
+поэтому несколько процессов приложения не выполняют одну задачу дважды.
+"""
+
+import threading
+import time
+import traceback
+from typing import Dict, Any, Callable, List, Optional, Set
+
+from models import JobModel
+
+
+# Обработчики задач по типу: kind -> функция(payload)
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+
+def handler(kind: str):
+    """Декоратор: регистрирует функцию как обработчик задач типа kind."""
+    def register(func: Callable[[Dict[str, Any]], None]):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class JobQueue:
+    """Очередь фоновых задач с пулом рабочих потоков."""
+
+    def __init__(self, workers: int = 2, poll_interval: float = 5.0,
+                 max_attempts: int = 3, retry_delay: float = 10.0, retention_days: float = 7,
+                 lease_seconds: float = 60.0):
+        """
+        Args:
+            workers: Количество рабочих потоков
+            poll_interval: Как часто (сек) проверять очередь без уведомлений,
+                например чтобы подхватить отложенные повторы
+            max_attempts: Сколько раз пытаться выполнить задачу
+            retry_delay: Задержка перед повтором (сек), растет с каждой попыткой
+            retention_days: Сколько дней хранить строки завершенных задач
+            lease_seconds: Через сколько секунд без продления аренды
+                выполняемая задача считается прерванной
+        """
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention_days = retention_days
+        self.lease_seconds = lease_seconds
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._lease_wakeup = threading.Condition(self._lock)  # будит поток аренды только при остановке
+        self._threads: List[threading.Thread] = []
+        self._lease_thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._wakeups = 0  # уведомления о новых задачах, еще не разобранные потоками
+        self._periodic: Dict[str, tuple] = {}  # kind -> (интервал в секундах, payload)
+        self._running: Set[str] = set()  # коды задач, которые выполняют потоки этого процесса
+
+    def configure(self, workers: Optional[int] = None, max_attempts: Optional[int] = None,
+                  retry_delay: Optional[float] = None, retention_days: Optional[float] = None,
+                  lease_seconds: Optional[float] = None):
+        """Изменяет параметры очереди (число потоков - до запуска)."""
+        if workers is not None:
+            self.workers = workers
+        if max_attempts is not None:
+            self.max_attempts = max_attempts
+        if retry_delay is not None:
+            self.retry_delay = retry_delay
+        if retention_days is not None:
+            self.retention_days = retention_days
+        if lease_seconds is not None:
+            self.lease_seconds = lease_seconds
+
+    def every(self, kind: str, interval: float, payload: Dict[str, Any] = None):
+        """
+        Делает задачу kind периодической: после каждого выполнения следующая
+        ставится в очередь через interval секунд.
+        """
+        self._periodic[kind] = (interval, payload or {})
+        if self._threads:
+            self._schedule_periodic(kind)
+
+    def _schedule_periodic(self, kind: str):
+        """Ставит следующий запуск периодической задачи, если он еще не запланирован."""
+        interval, payload = self._periodic[kind]
+        JobModel.create_unless_pending(kind, payload, run_after=time.time() + interval)
+
+    def start(self):
+        """Запускает рабочие потоки (повторный вызов ничего не делает)."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            # Задачи, прерванные прошлой остановкой приложения, выполняются заново
+            JobModel.requeue_running(self.lease_seconds)
+            JobModel.delete_finished(self.retention_days)
+            for kind in self._periodic:
+                self._schedule_periodic(kind)
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._lease_thread = threading.Thread(target=self._renew_leases, name='job-lease', daemon=True)
+            self._lease_thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Останавливает рабочие потоки после завершения текущих задач."""
+        with self._wakeup:
+            self._stopping = True
+            threads = self._threads + ([self._lease_thread] if self._lease_thread else [])
+            self._threads = []
+            self._lease_thread = None
+            self._wakeup.notify_all()
+            self._lease_wakeup.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+
+    def enqueue(self, kind: str, payload: Dict[str, Any] = None, delay: float = 0,
+                unique: bool = False) -> Optional[str]:
+        """
+        Ставит задачу в очередь и будит рабочий поток.
+
+        Args:
+            kind: Тип задачи
+            payload: Параметры задачи (сохраняются как JSON)
+            delay: Через сколько секунд задачу можно выполнять
+            unique: Не ставить задачу, если задача того же типа уже ждет
+
+        Returns:
+            str: Код задачи для запроса статуса (None, если при unique
+            задача уже была в очереди)
+
+        Raises:
+            ValueError: Если для kind не зарегистрирован обработчик
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+        if unique:
+            code = JobModel.create_unless_pending(kind, payload, run_after=time.time() + delay)
+            if code is None:
+                return None
+        else:
+            code = JobModel.create(kind, payload, run_after=time.time() + delay)
+        self.start()
+        with self._wakeup:
+            self._wakeups += 1
+            self._wakeup.notify()
+        return code
+
+    def _run(self):
+        """Цикл рабочего потока."""
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            try:
+                job = JobModel.claim_next()
+                if job is not None:
+                    self._execute(job)
+            except Exception:
+                # Ошибка самой очереди (например, БД занята восстановлением) - пробуем позже
+                traceback.print_exc()
+                job = None
+
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping and not self._wakeups:
+                        self._wakeup.wait(self.poll_interval)
+                    self._wakeups = max(0, self._wakeups - 1)
+
+    def _renew_leases(self):
+        """
+        Цикл потока аренды: продлевает аренду задач этого процесса и
+        возвращает в очередь задачи, аренда которых истекла.
+        """
+        while True:
+            with self._lease_wakeup:
+                if self._stopping:
+                    return
+                self._lease_wakeup.wait(self.lease_seconds / 3)
+                if self._stopping:
+                    return
+                codes = list(self._running)
+            try:
+                JobModel.renew_lease(codes)
+                JobModel.requeue_running(self.lease_seconds)
+            except Exception:
+                traceback.print_exc()
+
+    def _execute(self, job: Dict[str, Any]):
+        """Выполняет задачу и записывает результат."""
+        func = HANDLERS.get(job['kind'])
+        with self._lock:
+            self._running.add(job['code'])
+        try:
+            if func is None:
+                raise ValueError(f"Неизвестный тип задачи: {job['kind']}")
+            func(job['payload'])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            retry_at = None
+            if func is not None and job['attempts'] < self.max_attempts:
+                retry_at = time.time() + self.retry_delay * job['attempts']
+            print(f"Ошибка задачи {job['kind']} ({job['code']}): {error}")
+            JobModel.mark_failed(job['code'], error, retry_at)
+        else:
+            JobModel.mark_done(job['code'])
+        finally:
+            with self._lock:
+                self._running.discard(job['code'])
+
+        if job['kind'] in self._periodic:
+            self._schedule_periodic(job['kind'])
+            # Строки прошлых запусков периодической задачи не копятся
+            JobModel.delete_finished(self.retention_days, kind=job['kind'])
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает количество задач по статусам и число рабочих потоков."""
+        stats: Dict[str, Any] = JobModel.count_by_status()
+        with self._lock:
+            stats['workers'] = len(self._threads)
+        return stats
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_queue() -> JobQueue:
+    """Возвращает общую очередь задач приложения."""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def enqueue(kind: str, payload: Dict[str, Any] = None, delay: float = 0,
+            unique: bool = False) -> Optional[str]:
+    """Ставит задачу в общую очередь."""
+    return get_queue().enqueue(kind, payload, delay, unique)
+
+
+def init_app(app):
+    """
+    Настраивает очередь по конфигурации приложения.
+
+    Рабочие потоки запускаются при первом запросе, а не при импорте:
+    так их не запускает процесс-наблюдатель перезагрузчика Flask.
+    """
+    queue = get_queue()
+    queue.configure(
+        workers=app.config.get('JOB_WORKERS', 2),
+        max_attempts=app.config.get('JOB_MAX_ATTEMPTS', 3),
+        retry_delay=app.config.get('JOB_RETRY_DELAY', 10.0),
+        retention_days=app.config.get('JOB_RETENTION_DAYS', 7),
+        lease_seconds=app.config.get('JOB_LEASE_SECONDS', 60.0)
+    )
+    app.before_request(queue.start)
@@ -5,11 +5,18 @@
 import sqlite3
 import os
 import json
+import base64
+import time
 from datetime import datetime
 from uuid import uuid4
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable
 from contextlib import contextmanager
 
+from db_pool import pooled_connection, exclusive_access
+import backups
+import page_cache
+import workout_rollups
+
 
 def get_db_path() -> str:
     """Возвращает путь к файлу базы данных."""
@@ -18,43 +25,145 @@ def get_db_path() -> str:
 
 @contextmanager
 def get_db_connection():
-    """Контекстный менеджер для работы с БД."""
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row  # Возвращать результаты как dict
-    conn.execute('PRAGMA foreign_keys = ON')
-    try:
+    """Контекстный менеджер для работы с БД (соединение берется из пула)."""
+    with pooled_connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+
+def get_data_versions(*names: str) -> Dict[str, Optional[int]]:
+    """
+    Номера версий таблиц из data_versions (их увеличивают триггеры при
+    каждой записи). None для таблиц без версии (БД без миграции).
+    """
+    with get_db_connection() as conn:
+        try:
+            rows = conn.execute(
+                f"SELECT name, version FROM data_versions WHERE name IN ({', '.join('?' * len(names))})",
+                names).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+    versions = dict.fromkeys(names)
+    versions.update((row[0], row[1]) for row in rows)
+    return versions
+
+
+def encode_log_cursor(date_epoch: int, code: str) -> str:
+    """Кодирует позицию в журнале тренировок (date_epoch, code) в строку-курсор."""
+    raw = f"{date_epoch}|{code}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_log_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    Декодирует курсор журнала тренировок.
+
+    Raises:
+        ValueError: Если курсор поврежден
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_epoch, code = raw.rsplit('|', 1)
+        return int(date_epoch), code
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+
+def to_local_datetime(value) -> datetime:
+    """
+    Приводит дату журнала к местному времени с часовым поясом.
+
+    Принимает datetime, date (местная полночь), число секунд UTC или
+    ISO-строку (в том числе с суффиксом Z). Время без часового пояса
+    считается местным.
+
+    Raises:
+        ValueError: Если строку не удалось разобрать
+    """
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).astimezone()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.astimezone()
+
+
+def to_epoch(value) -> int:
+    """Переводит дату (datetime, date, ISO-строку или секунды) в секунды UTC."""
+    return int(to_local_datetime(value).timestamp())
 
 
 class UserPrefsModel:
     """Модель для работы с настройками пользователя."""
 
+    # Кэш настроек: (версия из data_versions, время сверки версии, настройки)
+    _defaults_cache: Tuple[Optional[int], float, Optional[Dict[str, Any]]] = (None, 0.0, None)
+
+    # Как часто (сек) сверять закэшированные настройки с версией в БД
+    VERSION_CHECK_INTERVAL = 5.0
+
+    @staticmethod
+    def _get_version(conn: sqlite3.Connection) -> Optional[int]:
+        """Версия настроек, которую увеличивают триггеры на user_prefs."""
+        try:
+            row = conn.execute("SELECT version FROM data_versions WHERE name = 'user_prefs'").fetchone()
+        except sqlite3.OperationalError:
+            # БД без миграции data_versions
+            return None
+        return row[0] if row else None
+
     @staticmethod
     def get_defaults() -> Dict[str, Any]:
-        """Получает настройки по умолчанию."""
+        """
+        Получает настройки по умолчанию.
+
+        Настройки кэшируются в процессе. Запись через create/update сбрасывает
+        кэш сразу, а изменения из других процессов обнаруживаются по версии
+        в data_versions, которая сверяется не чаще VERSION_CHECK_INTERVAL.
+        """
+        cached = UserPrefsModel._defaults_cache
+        version, checked_at, prefs = cached
+        now = time.monotonic()
+        if prefs is not None and now - checked_at < UserPrefsModel.VERSION_CHECK_INTERVAL:
+            return dict(prefs)
+
         with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT default_repeat_count, default_round_count, default_rest_seconds,
-                       default_warmup_rest_seconds, timer_sound, notifications_enabled
-                FROM user_prefs
-                LIMIT 1
-            ''')
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            else:
-                # Возвращаем значения по умолчанию, если настроек нет
-                return {
-                    'default_repeat_count': 10,
-                    'default_round_count': 3,
-                    'default_rest_seconds': 60,
-                    'default_warmup_rest_seconds': 120,
-                    'timer_sound': 'default',
-                    'notifications_enabled': True
-                }
+            current_version = UserPrefsModel._get_version(conn)
+            if prefs is None or current_version is None or current_version != version:
+                prefs = UserPrefsModel._load_defaults(conn)
+        # Кэш, сброшенный записью во время чтения, не перезаписываем прочитанным
+        if UserPrefsModel._defaults_cache is cached:
+            UserPrefsModel._defaults_cache = (current_version, now, prefs)
+        return dict(prefs)
+
+    @staticmethod
+    def invalidate_cache():
+        """Сбрасывает кэш настроек (после записи или замены БД)."""
+        UserPrefsModel._defaults_cache = (None, 0.0, None)
+
+    @staticmethod
+    def _load_defaults(conn: sqlite3.Connection) -> Dict[str, Any]:
+        """Читает настройки по умолчанию из БД."""
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT default_repeat_count, default_round_count, default_rest_seconds,
+                   default_warmup_rest_seconds, timer_sound, notifications_enabled
+            FROM user_prefs
+            LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        if row:
+            return dict(row)
+        else:
+            # Возвращаем значения по умолчанию, если настроек нет
+            return {
+                'default_repeat_count': 10,
+                'default_round_count': 3,
+                'default_rest_seconds': 60,
+                'default_warmup_rest_seconds': 120,
+                'timer_sound': 'default',
+                'notifications_enabled': True
+            }
 
     @staticmethod
     def get_first() -> Optional[Dict[str, Any]]:
@@ -86,6 +195,8 @@ class UserPrefsModel:
             ''', (code, default_repeat_count, default_round_count, default_rest_seconds,
                   default_warmup_rest_seconds, timer_sound, notifications_enabled))
             conn.commit()
+        UserPrefsModel.invalidate_cache()
+        page_cache.invalidate_all()
         return code
 
     @staticmethod
@@ -103,19 +214,49 @@ class UserPrefsModel:
             ''', (default_repeat_count, default_round_count, default_rest_seconds,
                   default_warmup_rest_seconds, timer_sound, notifications_enabled, code))
             conn.commit()
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+        UserPrefsModel.invalidate_cache()
+        page_cache.invalidate_all()
+        return updated
 
 
 class ExerciseModel:
     """Модель для работы с упражнениями."""
 
+    @staticmethod
+    def _load_images(conn: sqlite3.Connection, exercise_codes: List[str]) -> Dict[str, List[str]]:
+        """Загружает изображения нескольких упражнений одним запросом."""
+        images: Dict[str, List[str]] = {code: [] for code in exercise_codes}
+        if not exercise_codes:
+            return images
+
+        placeholders = ', '.join('?' for _ in exercise_codes)
+        cursor = conn.execute(f'''
+            SELECT exercise_code, path
+            FROM exercise_images
+            WHERE exercise_code IN ({placeholders})
+            ORDER BY exercise_code, position
+        ''', exercise_codes)
+        for exercise_code, path in cursor.fetchall():
+            images[exercise_code].append(path)
+        return images
+
+    @staticmethod
+    def _save_images(conn: sqlite3.Connection, exercise_code: str, images: List[str]):
+        """Заменяет список изображений упражнения (без commit)."""
+        conn.execute('DELETE FROM exercise_images WHERE exercise_code = ?', (exercise_code,))
+        conn.executemany('''
+            INSERT INTO exercise_images (exercise_code, position, path)
+            VALUES (?, ?, ?)
+        ''', [(exercise_code, position, path) for position, path in enumerate(images)])
+
     @staticmethod
     def get_by_code(code: str) -> Optional[Dict[str, Any]]:
         """Получает упражнение по коду."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT code, name, description, images, video_url,
+                SELECT code, name, description, video_url,
                        repeat_count, round_count, rest_seconds,
                        workoutset_code, created_at, updated_at
                 FROM exercises
@@ -124,60 +265,40 @@ class ExerciseModel:
             row = cursor.fetchone()
             if row:
                 exercise = dict(row)
-                # Парсим JSON список изображений
-                try:
-                    exercise['images'] = json.loads(exercise['images']) if exercise['images'] else []
-                except (json.JSONDecodeError, TypeError):
-                    exercise['images'] = []
+                exercise['images'] = ExerciseModel._load_images(conn, [code])[code]
                 return exercise
             return None
 
     @staticmethod
-    def get_by_workoutset(workoutset_code: str) -> List[Dict[str, Any]]:
-        """Получает все упражнения комплекса."""
+    def get_by_workoutset(workoutset_code: str, include_images: bool = True) -> List[Dict[str, Any]]:
+        """
+        Получает все упражнения комплекса.
+
+        Изображения всех упражнений загружаются одним запросом; при
+        include_images=False они не загружаются вовсе.
+        """
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT code, name, description, images, video_url,
+                SELECT code, name, description, video_url,
                        repeat_count, round_count, rest_seconds,
                        created_at, updated_at
                 FROM exercises
                 WHERE workoutset_code = ?
                 ORDER BY created_at ASC
             ''', (workoutset_code,))
-            exercises = []
-            for row in cursor.fetchall():
-                exercise = dict(row)
-                # Парсим JSON список изображений
-                try:
-                    exercise['images'] = json.loads(exercise['images']) if exercise['images'] else []
-                except (json.JSONDecodeError, TypeError):
-                    exercise['images'] = []
-                exercises.append(exercise)
+            exercises = [dict(row) for row in cursor.fetchall()]
+
+            if include_images:
+                images = ExerciseModel._load_images(conn, [ex['code'] for ex in exercises])
+                variants = ImageVariantModel.load_for_paths(
+                    conn, [path for paths in images.values() for path in paths])
+                for exercise in exercises:
+                    exercise['images'] = images[exercise['code']]
+                    exercise['image_variants'] = {path: variants[path]
+                                                  for path in exercise['images'] if path in variants}
             return exercises
 
-    @staticmethod
-    def get_by_code(code: str) -> Optional[Dict[str, Any]]:
-        """Получает упражнение по коду."""
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT code, name, description, images, video_url,
-                       repeat_count, round_count, rest_seconds,
-                       workoutset_code, created_at, updated_at
-                FROM exercises
-                WHERE code = ?
-            ''', (code,))
-            row = cursor.fetchone()
-            if row:
-                exercise = dict(row)
-                try:
-                    exercise['images'] = json.loads(exercise['images']) if exercise['images'] else []
-                except (json.JSONDecodeError, TypeError):
-                    exercise['images'] = []
-                return exercise
-            return None
-
     @staticmethod
     def create(workoutset_code: str, name: str, description: str = '',
                images: List[str] = None, video_url: str = '',
@@ -185,18 +306,21 @@ class ExerciseModel:
                rest_seconds: int = 60) -> str:
         """Создает новое упражнение."""
         code = str(uuid4())
-        images_json = json.dumps(images or [])
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO exercises (
-                    code, name, description, images, video_url,
+                    code, name, description, video_url,
                     repeat_count, round_count, rest_seconds, workoutset_code
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (code, name, description, images_json, video_url,
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (code, name, description, video_url,
                   repeat_count, round_count, rest_seconds, workoutset_code))
+            ExerciseModel._save_images(conn, code, images or [])
+            # Число упражнений изменилось - меняется процент завершения тренировок
+            workout_rollups.refresh_workoutset(conn, workoutset_code)
             conn.commit()
+        page_cache.invalidate_workout_set(workoutset_code)
         return code
 
     @staticmethod
@@ -205,29 +329,128 @@ class ExerciseModel:
                repeat_count: int = 10, round_count: int = 3,
                rest_seconds: int = 60) -> bool:
         """Обновляет упражнение."""
-        images_json = json.dumps(images or [])
-
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE exercises
-                SET name = ?, description = ?, images = ?, video_url = ?,
+                SET name = ?, description = ?, video_url = ?,
                     repeat_count = ?, round_count = ?, rest_seconds = ?,
                     updated_at = CURRENT_TIMESTAMP
                 WHERE code = ?
-            ''', (name, description, images_json, video_url,
+                RETURNING workoutset_code
+            ''', (name, description, video_url,
                   repeat_count, round_count, rest_seconds, code))
+            row = cursor.fetchone()
+            if row:
+                ExerciseModel._save_images(conn, code, images or [])
             conn.commit()
-            return cursor.rowcount > 0
+        if row:
+            page_cache.invalidate_workout_set(row['workoutset_code'])
+        return row is not None
 
     @staticmethod
     def delete(code: str) -> bool:
         """Удаляет упражнение."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM exercises WHERE code = ?', (code,))
+            cursor.execute('DELETE FROM exercises WHERE code = ? RETURNING workoutset_code', (code,))
+            row = cursor.fetchone()
+            if row:
+                workout_rollups.refresh_workoutset(conn, row['workoutset_code'])
             conn.commit()
-            return cursor.rowcount > 0
+        if row:
+            page_cache.invalidate_workout_set(row['workoutset_code'])
+        return row is not None
+
+    @staticmethod
+    def save_for_workoutset(workoutset_code: str, exercises: List[Dict[str, Any]],
+                            name: Optional[str] = None,
+                            description: str = '') -> Optional[Dict[str, Any]]:
+        """
+        Сохраняет упражнения комплекса из редактора одной транзакцией.
+
+        Упражнения с кодом, который уже есть в комплексе, обновляются,
+        остальные создаются; упражнения комплекса, которых нет в списке,
+        удаляются. Изменения записываются пакетно (executemany) и
+        фиксируются одним commit: при ошибке комплекс остается прежним.
+
+        Args:
+            workoutset_code: Код комплекса
+            exercises: Упражнения в порядке показа - словари с полями name,
+                description, images, video_url, repeat_count, round_count,
+                rest_seconds и необязательным code
+            name: Новое название комплекса (None - не менять название и описание)
+            description: Новое описание комплекса (вместе с name)
+
+        Returns:
+            dict: created - коды созданных упражнений, updated и deleted -
+            количество обновленных и удаленных; None, если комплекс не найден
+            (при переданном name)
+        """
+        with get_db_connection() as conn:
+            # Блокировка записи до чтения: список упражнений не изменится до commit
+            conn.execute('BEGIN IMMEDIATE')
+            if name is not None:
+                cursor = conn.execute('''
+                    UPDATE workout_sets
+                    SET name = ?, description = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE code = ?
+                ''', (name, description, workoutset_code))
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    return None
+            existing = {row[0] for row in conn.execute(
+                'SELECT code FROM exercises WHERE workoutset_code = ?', (workoutset_code,))}
+
+            updates, inserts, images = [], [], []
+            updated_codes = set()
+            for exercise in exercises:
+                code = exercise.get('code')
+                values = (exercise['name'], exercise.get('description', ''),
+                          exercise.get('video_url', ''), exercise.get('repeat_count', 10),
+                          exercise.get('round_count', 3), exercise.get('rest_seconds', 60))
+                if code in existing and code not in updated_codes:
+                    updates.append(values + (code,))
+                    updated_codes.add(code)
+                else:
+                    code = str(uuid4())
+                    inserts.append((code,) + values + (workoutset_code,))
+                images.extend((code, position, path)
+                              for position, path in enumerate(exercise.get('images') or []))
+            deletes = [(code,) for code in existing - updated_codes]
+
+            conn.executemany('''
+                UPDATE exercises
+                SET name = ?, description = ?, video_url = ?,
+                    repeat_count = ?, round_count = ?, rest_seconds = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE code = ?
+            ''', updates)
+            conn.executemany('''
+                INSERT INTO exercises (
+                    code, name, description, video_url,
+                    repeat_count, round_count, rest_seconds, workoutset_code
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', inserts)
+            conn.executemany('DELETE FROM exercises WHERE code = ?', deletes)
+
+            # Изображения обновленных упражнений заменяются целиком
+            conn.executemany('DELETE FROM exercise_images WHERE exercise_code = ?',
+                             [(code,) for code in updated_codes])
+            conn.executemany('''
+                INSERT INTO exercise_images (exercise_code, position, path)
+                VALUES (?, ?, ?)
+            ''', images)
+            if len(inserts) != len(deletes):
+                workout_rollups.refresh_workoutset(conn, workoutset_code)
+            conn.commit()
+
+        page_cache.invalidate_workout_set(workoutset_code)
+        return {
+            'created': [row[0] for row in inserts],
+            'updated': len(updates),
+            'deleted': len(deletes),
+        }
 
     @staticmethod
     def delete_by_workoutset(workoutset_code: str) -> int:
@@ -235,9 +458,274 @@ class ExerciseModel:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM exercises WHERE workoutset_code = ?', (workoutset_code,))
+            deleted = cursor.rowcount
+            if deleted:
+                workout_rollups.refresh_workoutset(conn, workoutset_code)
+            conn.commit()
+        page_cache.invalidate_workout_set(workoutset_code)
+        return deleted
+
+
+class ImageVariantModel:
+    """Модель для работы с уменьшенными копиями изображений."""
+
+    @staticmethod
+    def load_for_paths(conn: sqlite3.Connection,
+                       source_paths: List[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """
+        Загружает копии нескольких изображений одним запросом.
+
+        Returns:
+            dict: {путь оригинала: {формат: [{width, height, path}, ...]}},
+            копии каждого формата упорядочены по ширине
+        """
+        variants: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        source_paths = list(dict.fromkeys(source_paths))
+        if not source_paths:
+            return variants
+
+        placeholders = ', '.join('?' for _ in source_paths)
+        cursor = conn.execute(f'''
+            SELECT source_path, format, width, height, path
+            FROM image_variants
+            WHERE source_path IN ({placeholders})
+            ORDER BY source_path, format, width
+        ''', source_paths)
+        for source_path, image_format, width, height, path in cursor.fetchall():
+            variants.setdefault(source_path, {}).setdefault(image_format, []).append(
+                {'width': width, 'height': height, 'path': path})
+        return variants
+
+    @staticmethod
+    def get_for_path(source_path: str) -> List[Dict[str, Any]]:
+        """Получает все копии одного изображения."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT format, width, height, path
+                FROM image_variants
+                WHERE source_path = ?
+                ORDER BY format, width
+            ''', (source_path,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def replace(source_path: str, variants: List[Dict[str, Any]]):
+        """Заменяет записи о копиях изображения."""
+        with get_db_connection() as conn:
+            conn.execute('DELETE FROM image_variants WHERE source_path = ?', (source_path,))
+            conn.executemany('''
+                INSERT INTO image_variants (source_path, format, width, height, path)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(source_path, v['format'], v['width'], v['height'], v['path']) for v in variants])
+            conn.commit()
+        # Копии появляются в разметке страниц тренировки (srcset)
+        page_cache.invalidate_all()
+
+    @staticmethod
+    def delete_for_path(source_path: str) -> int:
+        """Удаляет записи о копиях изображения."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM image_variants WHERE source_path = ?', (source_path,))
             conn.commit()
             return cursor.rowcount
 
+    @staticmethod
+    def delete_orphaned() -> int:
+        """Удаляет записи о копиях изображений, которых больше нет в БД."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM image_variants
+                WHERE source_path NOT IN (SELECT path FROM exercise_images)
+                  AND source_path NOT IN (SELECT path FROM image_files)
+            ''')
+            conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def get_sources_without_variants() -> List[str]:
+        """Получает пути изображений упражнений, для которых еще нет копий."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT ei.path
+                FROM exercise_images ei
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM image_variants iv WHERE iv.source_path = ei.path
+                )
+                ORDER BY ei.path
+            ''')
+            return [row[0] for row in cursor.fetchall()]
+
+
+class ImageFileModel:
+    """
+    Модель для работы с файлами изображений.
+
+    Счетчик ссылок ref_count поддерживается триггерами на exercise_images.
+    """
+
+    @staticmethod
+    def touch_by_hash(content_hash: str) -> Optional[str]:
+        """
+        Находит уже сохраненный файл с таким же содержимым.
+
+        Если на файл сейчас нет ссылок, отсчет паузы перед его удалением
+        начинается заново, чтобы сборщик не удалил файл до сохранения
+        упражнения, которое на него сошлется.
+
+        Returns:
+            str: Путь к файлу или None
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE image_files
+                SET unreferenced_since = CASE WHEN ref_count = 0 THEN CURRENT_TIMESTAMP
+                                              ELSE unreferenced_since END
+                WHERE content_hash = ?
+                RETURNING path
+            ''', (content_hash,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row['path'] if row else None
+
+    @staticmethod
+    def register(path: str, content_hash: str, size: int):
+        """Записывает сохраненный файл (пока без ссылок)."""
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO image_files (path, content_hash, size, unreferenced_since)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (path) DO UPDATE
+                SET content_hash = excluded.content_hash, size = excluded.size,
+                    unreferenced_since = CASE WHEN image_files.ref_count = 0 THEN CURRENT_TIMESTAMP
+                                              ELSE image_files.unreferenced_since END
+            ''', (path, content_hash, size))
+            conn.commit()
+
+    @staticmethod
+    def get_collectable(grace_seconds: int, limit: int = 100) -> List[str]:
+        """Получает пути файлов без ссылок дольше grace_seconds секунд."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT path FROM image_files
+                WHERE ref_count <= 0 AND unreferenced_since <= datetime('now', ?)
+                ORDER BY unreferenced_since
+                LIMIT ?
+            ''', (f'-{int(grace_seconds)} seconds', limit))
+            return [row['path'] for row in cursor.fetchall()]
+
+    @staticmethod
+    def count_unreferenced() -> int:
+        """Подсчитывает файлы без ссылок (включая те, чья пауза еще не прошла)."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM image_files WHERE ref_count <= 0')
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def delete_if_unreferenced(path: str, grace_seconds: int, remove_file: Callable[[], None]) -> bool:
+        """
+        Удаляет запись о файле и сам файл, если ссылок на него по-прежнему нет.
+
+        Проверка, удаление записи и remove_file выполняются в одной
+        транзакции с блокировкой записи. touch_by_hash и register из
+        store_upload ждут ее конца, поэтому файл, на который успели сослаться
+        или который загрузили повторно, не удаляется с диска после того,
+        как запись о нем сохранена.
+
+        Returns:
+            bool: True, если запись и файл удалены
+        """
+        with get_db_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+                DELETE FROM image_files
+                WHERE path = ? AND ref_count <= 0 AND unreferenced_since <= datetime('now', ?)
+            ''', (path, f'-{int(grace_seconds)} seconds'))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            try:
+                remove_file()
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return True
+
+    @staticmethod
+    def get_known_paths() -> set:
+        """
+        Получает пути всех файлов, о которых знает БД.
+
+        Это изображения упражнений, файлы хранилища (в том числе ожидающие
+        удаления сборщиком collect_images) и копии этих изображений.
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH sources AS (
+                    SELECT path FROM exercise_images
+                    UNION
+                    SELECT path FROM image_files
+                )
+                SELECT path FROM sources
+                UNION
+                SELECT iv.path FROM image_variants iv
+                WHERE iv.source_path IN (SELECT path FROM sources)
+            ''')
+            return {row['path'] for row in cursor.fetchall()}
+
+    @staticmethod
+    def get_without_hash() -> List[str]:
+        """Получает пути файлов, загруженных до адресации по содержимому."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT path FROM image_files
+                WHERE content_hash IS NULL
+                ORDER BY path
+            ''')
+            return [row['path'] for row in cursor.fetchall()]
+
+    @staticmethod
+    def readdress(old_path: str, new_path: str, content_hash: str, size: int) -> bool:
+        """
+        Переводит ссылки с файла old_path на файл с адресом по содержимому.
+
+        Если файл с таким хешем уже есть, ссылки переводятся на него, а
+        запись old_path остается без ссылок. Копии изображения переносятся
+        вместе со ссылками, если у нового файла их еще нет.
+
+        Returns:
+            bool: True, если new_path - новый файл (его нужно создать на диске)
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT path FROM image_files WHERE content_hash = ?', (content_hash,))
+            row = cursor.fetchone()
+            created = row is None
+            if row:
+                new_path = row['path']
+            else:
+                cursor.execute('''
+                    INSERT INTO image_files (path, content_hash, size) VALUES (?, ?, ?)
+                ''', (new_path, content_hash, size))
+
+            cursor.execute('UPDATE exercise_images SET path = ? WHERE path = ?', (new_path, old_path))
+            cursor.execute('''
+                UPDATE image_variants SET source_path = ?
+                WHERE source_path = ?
+                  AND NOT EXISTS (SELECT 1 FROM image_variants WHERE source_path = ?)
+            ''', (new_path, old_path, new_path))
+            conn.commit()
+            return created
+
 
 class WorkoutSetModel:
     """Модель для работы с комплексами упражнений."""
@@ -248,19 +736,49 @@ class WorkoutSetModel:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT code, name, description, created_at, updated_at
+                SELECT code, name, description, created_at, updated_at,
+                       exercise_count, total_rounds, total_rest_seconds
                 FROM workout_sets
                 ORDER BY created_at DESC
             ''')
             return [dict(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def get_all_with_summary() -> List[Dict[str, Any]]:
+        """
+        Получает все комплексы вместе со сводкой одним запросом.
+
+        Для каждого комплекса возвращаются exercise_count, total_rounds,
+        total_rest_seconds (отдых между подходами), last_workout_date и
+        last_workout_local_date (день последней тренировки по местному времени).
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ws.code, ws.name, ws.description, ws.created_at, ws.updated_at,
+                       ws.exercise_count, ws.total_rounds, ws.total_rest_seconds,
+                       wl.last_workout_date, wl.last_workout_local_date
+                FROM workout_sets ws
+                LEFT JOIN (
+                    -- Голые колонки берутся из строки с MAX(date_epoch)
+                    SELECT workoutset_code, MAX(date_epoch),
+                           date AS last_workout_date,
+                           local_date AS last_workout_local_date
+                    FROM workout_logs
+                    GROUP BY workoutset_code
+                ) wl ON wl.workoutset_code = ws.code
+                ORDER BY ws.created_at DESC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
     @staticmethod
     def get_by_code(code: str) -> Optional[Dict[str, Any]]:
         """Получает комплекс по коду."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT code, name, description, created_at, updated_at
+                SELECT code, name, description, created_at, updated_at,
+                       exercise_count, total_rounds, total_rest_seconds
                 FROM workout_sets
                 WHERE code = ?
             ''', (code,))
@@ -291,7 +809,9 @@ class WorkoutSetModel:
                 WHERE code = ?
             ''', (name, description, code))
             conn.commit()
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+        page_cache.invalidate_workout_set(code)
+        return updated
 
     @staticmethod
     def delete(code: str) -> bool:
@@ -300,44 +820,173 @@ class WorkoutSetModel:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM workout_sets WHERE code = ?', (code,))
             conn.commit()
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+        page_cache.invalidate_workout_set(code)
+        return deleted
 
     @staticmethod
     def count_exercises(code: str) -> int:
-        """Подсчитывает количество упражнений в комплексе."""
+        """Возвращает количество упражнений в комплексе (счетчик в workout_sets)."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT exercise_count FROM workout_sets WHERE code = ?', (code,))
+            row = cursor.fetchone()
+            return row[0] if row else 0
+
+    @staticmethod
+    def verify_counters() -> List[Dict[str, Any]]:
+        """
+        Сверяет счетчики упражнений комплексов (exercise_count, total_rounds,
+        total_rest_seconds) с таблицей exercises.
+
+        Счетчики поддерживаются триггерами; расхождение возможно только после
+        изменения БД в обход них. Пересчет: python setup/make_db.py --migrate
+
+        Returns:
+            list: Комплексы с расхождениями - code, сохраненные значения и
+            ожидаемые (expected_*)
+        """
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT COUNT(*) FROM exercises WHERE workoutset_code = ?
-            ''', (code,))
-            return cursor.fetchone()[0]
+                SELECT ws.code, ws.exercise_count, ws.total_rounds, ws.total_rest_seconds,
+                       COUNT(e.code) AS expected_exercise_count,
+                       COALESCE(SUM(e.round_count), 0) AS expected_total_rounds,
+                       COALESCE(SUM(e.rest_seconds * (e.round_count - 1)), 0) AS expected_total_rest_seconds
+                FROM workout_sets ws
+                LEFT JOIN exercises e ON e.workoutset_code = ws.code
+                GROUP BY ws.code
+                HAVING ws.exercise_count != expected_exercise_count
+                    OR ws.total_rounds != expected_total_rounds
+                    OR ws.total_rest_seconds != expected_total_rest_seconds
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
 
 
 class WorkoutLogModel:
     """Модель для работы с журналом тренировок."""
 
+    # Колонки записи журнала для выборок
+    LOG_COLUMNS_SQL = '''
+        wl.code, wl.date, wl.date_epoch, wl.local_date, wl.workoutset_code,
+        wl.duration_seconds, wl.completed_exercises, ws.name as workoutset_name
+    '''
+
+    @staticmethod
+    def _decode_log(row: sqlite3.Row) -> Dict[str, Any]:
+        """Превращает строку журнала в словарь с разобранным списком упражнений."""
+        log = dict(row)
+        # Парсим JSON массив завершенных упражнений
+        try:
+            log['completed_exercises'] = json.loads(log['completed_exercises']) if log['completed_exercises'] else []
+        except (json.JSONDecodeError, TypeError):
+            log['completed_exercises'] = []
+        return log
+
     @staticmethod
     def get_all() -> List[Dict[str, Any]]:
         """Получает все записи журнала тренировок."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT wl.code, wl.date, wl.workoutset_code, wl.duration_seconds,
-                       wl.completed_exercises, ws.name as workoutset_name
+            cursor.execute(f'''
+                SELECT {WorkoutLogModel.LOG_COLUMNS_SQL}
                 FROM workout_logs wl
                 LEFT JOIN workout_sets ws ON wl.workoutset_code = ws.code
-                ORDER BY wl.date DESC
+                ORDER BY wl.date_epoch DESC
             ''')
-            logs = []
-            for row in cursor.fetchall():
-                log = dict(row)
-                # Парсим JSON массив завершенных упражнений
-                try:
-                    log['completed_exercises'] = json.loads(log['completed_exercises']) if log['completed_exercises'] else []
-                except (json.JSONDecodeError, TypeError):
-                    log['completed_exercises'] = []
-                logs.append(log)
-            return logs
+            return [WorkoutLogModel._decode_log(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_page(limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Получает страницу журнала тренировок (новые сначала).
+
+        Пагинация по ключу (date_epoch, code): следующая страница начинается
+        строго после последней записи предыдущей, поэтому время запроса не
+        зависит от номера страницы.
+
+        Args:
+            limit: Количество записей на странице
+            cursor: Курсор из next_cursor предыдущей страницы
+
+        Returns:
+            dict: logs - записи страницы, next_cursor - курсор следующей
+            страницы или None, если записей больше нет
+
+        Raises:
+            ValueError: Если курсор поврежден
+        """
+        where_sql = ''
+        params: List[Any] = []
+        if cursor:
+            where_sql = 'WHERE (wl.date_epoch, wl.code) < (?, ?)'
+            params.extend(decode_log_cursor(cursor))
+
+        with get_db_connection() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(f'''
+                SELECT {WorkoutLogModel.LOG_COLUMNS_SQL}
+                FROM workout_logs wl
+                LEFT JOIN workout_sets ws ON wl.workoutset_code = ws.code
+                {where_sql}
+                ORDER BY wl.date_epoch DESC, wl.code DESC
+                LIMIT ?
+            ''', (*params, limit + 1))
+            rows = db_cursor.fetchall()
+
+        logs = [WorkoutLogModel._decode_log(row) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit and logs:
+            next_cursor = encode_log_cursor(logs[-1]['date_epoch'], logs[-1]['code'])
+        return {'logs': logs, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def get_between(start=None, end=None, workoutset_code: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Получает записи журнала за период [start, end) (новые сначала).
+
+        Границы - datetime, date, ISO-строка или секунды UTC; None - без
+        ограничения. Выборка идет по индексу на date_epoch.
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('wl.date_epoch >= ?')
+            params.append(to_epoch(start))
+        if end is not None:
+            conditions.append('wl.date_epoch < ?')
+            params.append(to_epoch(end))
+        if workoutset_code is not None:
+            conditions.append('wl.workoutset_code = ?')
+            params.append(workoutset_code)
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        with get_db_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT {WorkoutLogModel.LOG_COLUMNS_SQL}
+                FROM workout_logs wl
+                LEFT JOIN workout_sets ws ON wl.workoutset_code = ws.code
+                {where_sql}
+                ORDER BY wl.date_epoch DESC, wl.code DESC
+            ''', params)
+            return [WorkoutLogModel._decode_log(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_for_days(first_day, last_day) -> List[Dict[str, Any]]:
+        """
+        Получает записи журнала за дни с first_day по last_day включительно
+        (по местному времени, date или YYYY-MM-DD). Выборка идет по индексу
+        на local_date.
+        """
+        with get_db_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT {WorkoutLogModel.LOG_COLUMNS_SQL}
+                FROM workout_logs wl
+                LEFT JOIN workout_sets ws ON wl.workoutset_code = ws.code
+                WHERE wl.local_date BETWEEN ? AND ?
+                ORDER BY wl.local_date DESC, wl.date_epoch DESC
+            ''', (str(first_day), str(last_day)))
+            return [WorkoutLogModel._decode_log(row) for row in cursor.fetchall()]
 
     @staticmethod
     def get_last_workout_for_set(workoutset_code: str) -> Optional[Dict[str, Any]]:
@@ -345,39 +994,41 @@ class WorkoutLogModel:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT code, date, workoutset_code, duration_seconds, completed_exercises
+                SELECT code, date, date_epoch, local_date, workoutset_code,
+                       duration_seconds, completed_exercises
                 FROM workout_logs
                 WHERE workoutset_code = ?
-                ORDER BY date DESC
+                ORDER BY date_epoch DESC
                 LIMIT 1
             ''', (workoutset_code,))
             row = cursor.fetchone()
-            if row:
-                log = dict(row)
-                # Парсим JSON массив завершенных упражнений
-                try:
-                    log['completed_exercises'] = json.loads(log['completed_exercises']) if log['completed_exercises'] else []
-                except (json.JSONDecodeError, TypeError):
-                    log['completed_exercises'] = []
-                return log
-            return None
+            return WorkoutLogModel._decode_log(row) if row else None
 
     @staticmethod
     def create(workoutset_code: str, duration_seconds: int, workout_date: str = None,
                completed_exercises: List[str] = None) -> str:
-        """Создает новую запись в журнале тренировок."""
+        """
+        Создает новую запись в журнале тренировок.
+
+        Raises:
+            ValueError: Если дату тренировки не удалось разобрать
+        """
         code = str(uuid4())
         if workout_date is None:
             workout_date = datetime.now().isoformat()
+        moment = to_local_datetime(workout_date)
 
         completed_exercises_json = json.dumps(completed_exercises or [])
 
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO workout_logs (code, date, workoutset_code, duration_seconds, completed_exercises)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (code, workout_date, workoutset_code, duration_seconds, completed_exercises_json))
+                INSERT INTO workout_logs (code, date, workoutset_code, duration_seconds, completed_exercises,
+                                          date_epoch, local_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (code, workout_date, workoutset_code, duration_seconds, completed_exercises_json,
+                  int(moment.timestamp()), moment.date().isoformat()))
+            workout_rollups.refresh(conn, [moment.date().isoformat()], [workoutset_code])
             conn.commit()
         return code
 
@@ -386,18 +1037,29 @@ class WorkoutLogModel:
         """Удаляет запись из журнала тренировок."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM workout_logs WHERE code = ?', (code,))
+            cursor.execute('''
+                DELETE FROM workout_logs WHERE code = ?
+                RETURNING local_date, workoutset_code
+            ''', (code,))
+            row = cursor.fetchone()
+            if row:
+                workout_rollups.refresh(conn, [row['local_date']], [row['workoutset_code']])
             conn.commit()
-            return cursor.rowcount > 0
+            return row is not None
 
     @staticmethod
     def delete_by_workoutset(workoutset_code: str) -> int:
         """Удаляет все записи тренировок для указанного комплекса."""
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('DELETE FROM workout_logs WHERE workoutset_code = ?', (workoutset_code,))
+            cursor.execute('''
+                DELETE FROM workout_logs WHERE workoutset_code = ?
+                RETURNING local_date
+            ''', (workoutset_code,))
+            days = [row['local_date'] for row in cursor.fetchall()]
+            workout_rollups.refresh(conn, days, [workoutset_code])
             conn.commit()
-            return cursor.rowcount
+            return len(days)
 
     @staticmethod
     def delete_all() -> int:
@@ -405,8 +1067,10 @@ class WorkoutLogModel:
         with get_db_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM workout_logs')
+            deleted = cursor.rowcount
+            workout_rollups.clear(conn)
             conn.commit()
-            return cursor.rowcount
+            return deleted
 
     @staticmethod
     def calculate_completion_percentage(workoutset_code: str, completed_exercises: List[str]) -> int:
@@ -427,16 +1091,208 @@ class WorkoutLogModel:
         return min(percentage, 100)  # Ограничиваем максимум 100%
 
 
+class JobModel:
+    """Модель для работы с фоновыми задачами."""
+
+    @staticmethod
+    def create(kind: str, payload: Dict[str, Any] = None, run_after: float = None) -> str:
+        """Ставит задачу в очередь."""
+        code = str(uuid4())
+        with get_db_connection() as conn:
+            conn.execute('''
+                INSERT INTO jobs (code, kind, payload, run_after)
+                VALUES (?, ?, ?, ?)
+            ''', (code, kind, json.dumps(payload or {}), run_after or time.time()))
+            conn.commit()
+        return code
+
+    @staticmethod
+    def create_unless_pending(kind: str, payload: Dict[str, Any] = None,
+                              run_after: float = None) -> Optional[str]:
+        """
+        Ставит задачу в очередь, если задача того же типа еще не ждет.
+
+        Проверка и вставка - один INSERT ... WHERE NOT EXISTS, поэтому
+        несколько процессов или потоков не поставят задачу дважды.
+
+        Returns:
+            str: Код новой задачи или None, если задача уже запланирована
+        """
+        code = str(uuid4())
+        with get_db_connection() as conn:
+            cursor = conn.execute('''
+                INSERT INTO jobs (code, kind, payload, run_after)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = ? AND status = 'pending')
+            ''', (code, kind, json.dumps(payload or {}), run_after or time.time(), kind))
+            conn.commit()
+            return code if cursor.rowcount else None
+
+    @staticmethod
+    def claim_next() -> Optional[Dict[str, Any]]:
+        """
+        Забирает следующую готовую к выполнению задачу.
+
+        Задача переводится в статус running одним UPDATE, поэтому два
+        обработчика не получат одну и ту же задачу.
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE code = (
+                    SELECT code FROM jobs
+                    WHERE status = 'pending' AND run_after <= ?
+                    ORDER BY run_after
+                    LIMIT 1
+                )
+                RETURNING code, kind, payload, attempts
+            ''', (time.time(),))
+            row = cursor.fetchone()
+            conn.commit()
+            if not row:
+                return None
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            return job
+
+    @staticmethod
+    def mark_done(code: str):
+        """Отмечает задачу выполненной."""
+        with get_db_connection() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = 'done', error = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE code = ?
+            ''', (code,))
+            conn.commit()
+
+    @staticmethod
+    def mark_failed(code: str, error: str, retry_at: float = None):
+        """
+        Отмечает неудачную попытку.
+
+        Если передан retry_at, задача вернется в очередь к этому времени,
+        иначе получит статус failed.
+        """
+        with get_db_connection() as conn:
+            conn.execute('''
+                UPDATE jobs
+                SET status = ?, error = ?, run_after = COALESCE(?, run_after),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE code = ?
+            ''', ('pending' if retry_at is not None else 'failed', error, retry_at, code))
+            conn.commit()
+
+    @staticmethod
+    def renew_lease(codes: List[str]):
+        """
+        Продлевает аренду выполняемых задач (обновляет updated_at).
+
+        Пока процесс жив, его рабочие потоки продлевают аренду своих задач,
+        и другие процессы не возвращают их в очередь.
+        """
+        if not codes:
+            return
+        with get_db_connection() as conn:
+            conn.executemany('''
+                UPDATE jobs SET updated_at = CURRENT_TIMESTAMP
+                WHERE code = ? AND status = 'running'
+            ''', [(code,) for code in codes])
+            conn.commit()
+
+    @staticmethod
+    def requeue_running(lease_seconds: float) -> int:
+        """
+        Возвращает в очередь задачи, прерванные остановкой процесса.
+
+        Задача считается прерванной, если ее аренду не продлевали дольше
+        lease_seconds: задачи, которые сейчас выполняет другой процесс,
+        остаются у него.
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE jobs SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running' AND updated_at < datetime('now', ?)
+            ''', (f'-{lease_seconds} seconds',))
+            conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def get_by_code(code: str) -> Optional[Dict[str, Any]]:
+        """Получает задачу по коду."""
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT code, kind, payload, status, attempts, error, created_at, updated_at
+                FROM jobs
+                WHERE code = ?
+            ''', (code,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            return job
+
+    @staticmethod
+    def count_by_status() -> Dict[str, int]:
+        """Считает задачи в каждом статусе."""
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+            for status, count in cursor.fetchall():
+                counts[status] = count
+        return counts
+
+    @staticmethod
+    def delete_finished(older_than_days: float = 7, kind: Optional[str] = None) -> int:
+        """
+        Удаляет выполненные задачи старше указанного числа дней.
+
+        Для типа kind (периодические задачи) удаляются и неудачные: следующий
+        запуск уже запланирован, а их строки иначе копились бы бесконечно.
+        """
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if kind is None:
+                cursor.execute('''
+                    DELETE FROM jobs
+                    WHERE status = 'done' AND updated_at < datetime('now', ?)
+                ''', (f'-{older_than_days} days',))
+            else:
+                cursor.execute('''
+                    DELETE FROM jobs
+                    WHERE kind = ? AND status IN ('done', 'failed')
+                      AND updated_at < datetime('now', ?)
+                ''', (kind, f'-{older_than_days} days'))
+            conn.commit()
+            return cursor.rowcount
+
+
 class DatabaseManager:
     """Класс для управления бэкапом и восстановлением базы данных."""
 
     @staticmethod
-    def create_backup() -> str:
+    def is_backup_filename(filename: str) -> bool:
+        """Проверяет, что имя файла похоже на бэкап (.db или сжатый .db.gz)."""
+        return (filename.startswith('workout_backup_') and
+                (filename.endswith('.db') or filename.endswith('.db' + backups.COMPRESSED_SUFFIX)))
+
+    @staticmethod
+    def create_backup(pages_per_step: int = backups.DEFAULT_PAGES_PER_STEP,
+                      compress: bool = True) -> str:
         """
         Создает бэкап базы данных.
         Возвращает путь к созданному файлу бэкапа.
+
+        Копия снимается онлайн через SQLite backup API порциями по
+        pages_per_step страниц, не блокируя запись в БД. Ход и итоги
+        копирования доступны через get_backup_progress(). При compress=True
+        копия сохраняется как gzip-архив .db.gz.
         """
-        import shutil
         from datetime import datetime
 
         backup_dir = os.path.join(os.path.dirname(__file__), 'backups')
@@ -451,16 +1307,110 @@ class DatabaseManager:
         if not os.path.exists(db_path):
             raise FileNotFoundError("База данных не найдена")
 
-        shutil.copy2(db_path, backup_path)
-        return backup_path
+        if not compress:
+            with get_db_connection() as conn:
+                backups.online_backup(conn, backup_path, pages_per_step=pages_per_step)
+            return backup_path
+
+        raw_path = os.path.join(backup_dir, f'.{backup_filename}')
+        archive_path = backup_path + backups.COMPRESSED_SUFFIX
+        try:
+            with get_db_connection() as conn:
+                backups.online_backup(conn, raw_path, pages_per_step=pages_per_step,
+                                      name=os.path.basename(archive_path))
+            backups.compress_file(raw_path, archive_path)
+        finally:
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+        return archive_path
+
+    @staticmethod
+    def get_incremental_backup_dir() -> str:
+        """Возвращает папку инкрементальных снимков."""
+        return os.path.join(os.path.dirname(__file__), 'backups', 'incremental')
+
+    @staticmethod
+    def create_incremental_backup() -> Dict[str, Any]:
+        """
+        Создает инкрементальный снимок БД.
+
+        На диск записываются только страницы, которых нет в предыдущих
+        снимках. Возвращает манифест снимка: name, created_at, page_size,
+        page_count, size, new_chunks, new_bytes.
+        """
+        from datetime import datetime
+
+        db_path = get_db_path()
+        if not os.path.exists(db_path):
+            raise FileNotFoundError("База данных не найдена")
+
+        # Микросекунды в имени: снимки, созданные в одну секунду, не совпадают
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        name = f'{backups.SNAPSHOT_PREFIX}{timestamp}'
+
+        with get_db_connection() as conn:
+            return backups.create_incremental_snapshot(
+                conn, DatabaseManager.get_incremental_backup_dir(), name
+            )
+
+    @staticmethod
+    def list_incremental_backups() -> List[Dict[str, Any]]:
+        """Возвращает список инкрементальных снимков (новые сначала)."""
+        return backups.list_incremental_snapshots(DatabaseManager.get_incremental_backup_dir())
+
+    @staticmethod
+    def restore_from_incremental_backup(name: str) -> bool:
+        """
+        Восстанавливает БД на момент инкрементального снимка.
+
+        Raises:
+            FileNotFoundError: Если снимок или его фрагменты не найдены
+        """
+        snapshots_dir = DatabaseManager.get_incremental_backup_dir()
+        temp_path = os.path.join(snapshots_dir, f'.restore_{name}.db')
+        try:
+            backups.assemble_snapshot(snapshots_dir, name, temp_path)
+            return DatabaseManager.restore_from_backup(temp_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def delete_incremental_backup(name: str) -> bool:
+        """Удаляет инкрементальный снимок и неиспользуемые фрагменты."""
+        try:
+            backups.delete_incremental_snapshot(DatabaseManager.get_incremental_backup_dir(), name)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def get_backup_progress() -> Dict[str, Any]:
+        """
+        Возвращает состояние текущего или последнего бэкапа.
+
+        Поля: status (idle/running/done/error), filename, copied_pages,
+        total_pages, percent, elapsed_seconds, pages_per_second, error.
+        """
+        return backups.progress.snapshot()
 
     @staticmethod
     def restore_from_backup(backup_file_path: str) -> bool:
         """
         Восстанавливает базу данных из бэкапа.
 
+        Бэкап проверяется, загружается через SQLite backup API в новый файл
+        рядом с БД и сбрасывается на диск. Затем, после того как выданные
+        соединения вернутся в пул, файл БД атомарно подменяется. Читатели
+        никогда не видят частично записанный файл.
+
+        Восстановление возможно, только пока БД использует один процесс:
+        монопольный доступ дожидается лишь соединений этого процесса, поэтому
+        если БД открыта где-то еще (второй экземпляр приложения, скрипт из
+        setup/), восстановление отклоняется до подмены файла.
+
         Args:
-            backup_file_path: Путь к файлу бэкапа
+            backup_file_path: Путь к файлу бэкапа (.db или сжатый .db.gz)
 
         Returns:
             bool: True если восстановление прошло успешно
@@ -468,44 +1418,89 @@ class DatabaseManager:
         Raises:
             FileNotFoundError: Если файл бэкапа не найден
             sqlite3.DatabaseError: Если файл не является корректной БД SQLite
+            TimeoutError: Если не удалось дождаться завершения запросов к БД
+            RuntimeError: Если БД открыта другим процессом
         """
-        import shutil
-
         if not os.path.exists(backup_file_path):
             raise FileNotFoundError("Файл бэкапа не найден")
 
+        if backup_file_path.endswith(backups.COMPRESSED_SUFFIX):
+            # Сжатый архив - распаковываем во временный файл и восстанавливаем из него
+            raw_path = backup_file_path[:-len(backups.COMPRESSED_SUFFIX)] + '.restore'
+            try:
+                try:
+                    backups.decompress_file(backup_file_path, raw_path)
+                except (OSError, EOFError) as e:
+                    raise sqlite3.DatabaseError(f"Поврежденный архив бэкапа: {str(e)}")
+                return DatabaseManager.restore_from_backup(raw_path)
+            finally:
+                if os.path.exists(raw_path):
+                    os.remove(raw_path)
+
         # Проверяем что файл является корректной БД SQLite
-        try:
-            test_conn = sqlite3.connect(backup_file_path)
-            # Проверяем что в БД есть нужные таблицы
-            cursor = test_conn.cursor()
-            cursor.execute("""
-                SELECT name FROM sqlite_master
-                WHERE type='table' AND name IN ('workout_sets', 'exercises', 'user_prefs', 'workout_logs')
-            """)
-            tables = [row[0] for row in cursor.fetchall()]
-            test_conn.close()
-
-            if len(tables) < 3:  # Минимум 3 основные таблицы должны быть
-                raise sqlite3.DatabaseError("Файл не содержит корректную структуру БД приложения")
-
-        except sqlite3.Error as e:
-            raise sqlite3.DatabaseError(f"Неверный формат файла базы данных: {str(e)}")
-
-        # Создаем резервную копию текущей БД
+        # (минимум 3 основные таблицы должны быть)
+        backups.validate_database(
+            backup_file_path,
+            required_tables=['workout_sets', 'exercises', 'user_prefs', 'workout_logs'],
+            min_tables=3
+        )
+
         db_path = get_db_path()
-        if os.path.exists(db_path):
-            from datetime import datetime
-            backup_current = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            shutil.copy2(db_path, backup_current)
+        temp_path = f"{db_path}.restore-{uuid4().hex}.tmp"
+        try:
+            # Загружаем бэкап в новый файл рядом с БД, чтобы замена была атомарной
+            backups.copy_database(backup_file_path, temp_path)
+
+            # Новые запросы ждут, выданные соединения возвращаются и закрываются
+            with exclusive_access():
+                # Создаем резервную копию текущей БД
+                if os.path.exists(db_path):
+                    from datetime import datetime
+                    backup_current = f"{db_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                    backups.copy_database(db_path, backup_current)
+
+                # Данные из WAL - в файл БД, чтобы старый WAL не наложился на новый файл.
+                # Заодно проверяется, что БД не открыта другими процессами: их
+                # соединения продолжили бы работать со старым файлом
+                backups.close_wal(db_path)
+
+                # Атомарно подменяем файл БД
+                os.replace(temp_path, db_path)
+                backups.fsync_path(os.path.dirname(db_path))
+            UserPrefsModel.invalidate_cache()
+            page_cache.invalidate_all()
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
-        # Восстанавливаем из бэкапа
-        shutil.copy2(backup_file_path, db_path)
         return True
 
+    # Кэш информации о БД: (признак изменения файлов, информация)
+    _database_info_cache: Tuple[Any, Optional[Dict[str, Any]]] = (None, None)
+
+    @staticmethod
+    def _database_change_token(db_path: str) -> Tuple:
+        """Признак изменения БД: меняется при любой записи в файл БД или WAL."""
+        token = []
+        for path in (db_path, db_path + '-wal'):
+            try:
+                st = os.stat(path)
+                token.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except OSError:
+                token.append(None)
+        return tuple(token)
+
     @staticmethod
     def get_database_info() -> Dict[str, Any]:
-        """Получает информацию о текущей базе данных."""
+        """
+        Получает информацию о текущей базе данных.
+
+        Количество записей читается из таблицы счетчиков table_row_counts,
+        которую поддерживают триггеры; для таблиц без счетчика (БД без
+        миграции) количество не считается и равно None. Размеры берутся из
+        PRAGMA page_count/page_size. Результат кэшируется до следующей
+        записи в БД.
+        """
         db_path = get_db_path()
 
         if not os.path.exists(db_path):
@@ -517,37 +1512,65 @@ class DatabaseManager:
                 'records_count': {}
             }
 
+        token = DatabaseManager._database_change_token(db_path)
+        cached_token, cached_info = DatabaseManager._database_info_cache
+        if cached_info is not None and cached_token == token:
+            return cached_info
+
         # Размер файла
         size = os.path.getsize(db_path)
 
         # Дата модификации
         modified = datetime.fromtimestamp(os.path.getmtime(db_path))
 
-        # Подсчет записей в таблицах
+        tables = []
         records_count = {}
+        pages = {}
         try:
             with get_db_connection() as conn:
                 cursor = conn.cursor()
 
-                # Получаем список таблиц
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                # Получаем список таблиц (служебную таблицу счетчиков не показываем)
+                cursor.execute("""
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name != 'table_row_counts'
+                """)
                 tables = [row[0] for row in cursor.fetchall()]
 
-                # Подсчитываем записи в каждой таблице
-                for table in tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    records_count[table] = cursor.fetchone()[0]
+                # Счетчики, поддерживаемые триггерами
+                try:
+                    cursor.execute("SELECT table_name, row_count FROM table_row_counts")
+                    counters = {row[0]: row[1] for row in cursor.fetchall()}
+                except sqlite3.OperationalError:
+                    # БД без миграции счетчиков
+                    counters = {}
+
+                # Без COUNT(*): кэш сбрасывается при любой записи, в том числе фоновыми задачами
+                records_count = {table: counters.get(table) for table in tables}
+
+                page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+                page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+                freelist_count = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+                pages = {
+                    'page_size': page_size,
+                    'page_count': page_count,
+                    'freelist_count': freelist_count,
+                    'used_bytes': (page_count - freelist_count) * page_size,
+                }
 
         except sqlite3.Error:
             records_count = {}
 
-        return {
+        info = {
             'exists': True,
             'size': size,
             'modified': modified,
-            'tables_count': len(tables) if 'tables' in locals() else 0,
-            'records_count': records_count
+            'tables_count': len(tables),
+            'records_count': records_count,
+            **pages
         }
+        DatabaseManager._database_info_cache = (token, info)
+        return info
 
     @staticmethod
     def list_backups() -> List[Dict[str, Any]]:
@@ -557,23 +1580,31 @@ class DatabaseManager:
         if not os.path.exists(backup_dir):
             return []
 
-        backups = []
+        backup_list = []
         for filename in os.listdir(backup_dir):
-            if filename.startswith('workout_backup_') and filename.endswith('.db'):
+            if DatabaseManager.is_backup_filename(filename):
                 filepath = os.path.join(backup_dir, filename)
                 size = os.path.getsize(filepath)
                 modified = datetime.fromtimestamp(os.path.getmtime(filepath))
+                compressed = filename.endswith(backups.COMPRESSED_SUFFIX)
+
+                try:
+                    logical_size = backups.compressed_logical_size(filepath) if compressed else size
+                except OSError:
+                    logical_size = size
 
-                backups.append({
+                backup_list.append({
                     'filename': filename,
                     'filepath': filepath,
                     'size': size,
+                    'logical_size': logical_size,
+                    'compressed': compressed,
                     'modified': modified
                 })
 
         # Сортируем по дате (новые сначала)
-        backups.sort(key=lambda x: x['modified'], reverse=True)
-        return backups
+        backup_list.sort(key=lambda x: x['modified'], reverse=True)
+        return backup_list
 
     @staticmethod
     def delete_backup(filename: str) -> bool:
@@ -0,0 +1,112 @@
+"""
+Кеш отрисованных фрагментов страниц.
+
+Страница тренировки (/workout-sets/<code>/start) меняется только при
+редактировании комплекса, его упражнений или настроек пользователя, поэтому
+ее основная часть отрисовывается один раз и хранится в памяти процесса.
+Ключ - (код комплекса, updated_at комплекса, время отдыха после разминки
+из настроек, номера версий таблиц WORKOUT_PAGE_TABLES из data_versions).
+Модели сбрасывают записи комплекса при каждой записи, влияющей на
+страницу, но только в своем процессе; версии таблиц меняются при любой
+записи из любого процесса, поэтому другие процессы не отдадут устаревшую
+страницу, даже если updated_at комплекса не изменился (две записи за одну
+секунду, готовые копии изображений). Размер кеша ограничен:
+при переполнении вытесняются давно не использованные записи.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+# Сколько страниц тренировки хранить по умолчанию
+DEFAULT_MAXSIZE = 64
+
+# Таблицы, чьи версии из data_versions входят в ключ страницы тренировки
+WORKOUT_PAGE_TABLES = ('workout_sets', 'exercises', 'exercise_images', 'image_variants')
+
+
+class LRUCache:
+    """Потокобезопасный словарь ограниченного размера с вытеснением LRU."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Номер сброса: значение, прочитанное до сброса, не попадает в кеш после него
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение по ключу (None, если его нет) и отмечает его использование."""
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._items[key]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        Сохраняет значение, вытесняя самые старые записи при переполнении.
+
+        Args:
+            generation: Значение self.generation на момент чтения данных для
+                value; если с тех пор кеш сбрасывался, значение не сохраняется
+        """
+        with self._lock:
+            if self.maxsize <= 0 or (generation is not None and generation != self.generation):
+                return
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Удаляет записи, ключи которых удовлетворяют predicate. Возвращает их количество."""
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+            return len(keys)
+
+    def clear(self):
+        """Удаляет все записи."""
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
+
+    def resize(self, maxsize: int):
+        """Изменяет размер кеша, вытесняя лишние записи."""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._items) > max(maxsize, 0):
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает размер кеша и количество попаданий и промахов."""
+        with self._lock:
+            return {'size': len(self._items), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# Страницы тренировки: (код комплекса, updated_at, отдых после разминки, *версии таблиц) -> фрагмент
+workout_pages = LRUCache()
+
+
+def invalidate_workout_set(workoutset_code: str) -> int:
+    """Сбрасывает закешированные страницы тренировки комплекса."""
+    return workout_pages.invalidate(lambda key: key[0] == workoutset_code)
+
+
+def invalidate_all():
+    """Сбрасывает все закешированные страницы (изменились общие настройки или вся БД)."""
+    workout_pages.clear()
+
+
+def init_app(app):
+    """Настраивает размер кеша по конфигурации приложения."""
+    workout_pages.resize(app.config.get('WORKOUT_PAGE_CACHE_SIZE', DEFAULT_MAXSIZE))
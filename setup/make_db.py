@@ -10,6 +10,10 @@ import sys
 from datetime import datetime
 from uuid import uuid4
 
+# Сводные таблицы журнала пересчитываются тем же кодом, что и в приложении
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import workout_rollups
+
 
 def get_db_path():
     """Возвращает путь к файлу базы данных."""
@@ -25,11 +29,60 @@ def create_workout_set_table(cursor):
             name TEXT NOT NULL,
             description TEXT,
             created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            -- Сводка по упражнениям, поддерживается триггерами exercise_counters_*
+            exercise_count INTEGER NOT NULL DEFAULT 0,
+            total_rounds INTEGER NOT NULL DEFAULT 0,
+            total_rest_seconds INTEGER NOT NULL DEFAULT 0  -- отдых между подходами
         )
     ''')
 
 
+# Счетчики упражнений комплекса: колонка workout_sets -> вклад одного упражнения
+WORKOUT_SET_COUNTERS = (
+    ('exercise_count', '1'),
+    ('total_rounds', '{row}.round_count'),
+    ('total_rest_seconds', '{row}.rest_seconds * ({row}.round_count - 1)'),
+)
+
+
+def workout_set_counters_sql(sign, row):
+    """SET-часть запроса, прибавляющая (sign='+') или вычитающая вклад упражнения row."""
+    return ', '.join(f"{column} = {column} {sign} {value.format(row=row)}"
+                     for column, value in WORKOUT_SET_COUNTERS)
+
+
+def recalculate_workout_set_counters(cursor):
+    """
+    Пересчитывает счетчики упражнений комплексов по таблице exercises.
+
+    Счетчики не меняют сам комплекс, поэтому вызывать нужно, пока триггер
+    update_workout_sets_timestamp не установлен (иначе updated_at всех
+    пересчитанных комплексов станет текущим временем). Обновляются только
+    комплексы с расхождениями.
+    """
+    expected = {column: f"(SELECT COALESCE(SUM({value.format(row='e')}), 0) FROM exercises e "
+                        f"WHERE e.workoutset_code = workout_sets.code)"
+                for column, value in WORKOUT_SET_COUNTERS}
+    cursor.execute(f'''
+        UPDATE workout_sets
+        SET {', '.join(f'{column} = {sql}' for column, sql in expected.items())}
+        WHERE {' OR '.join(f'{column} != {sql}' for column, sql in expected.items())}
+    ''')
+    if cursor.rowcount:
+        print(f"✓ Пересчитаны счетчики упражнений комплексов: {cursor.rowcount}")
+
+
+def migrate_workout_set_counters(cursor):
+    """Добавляет в workout_sets колонки счетчиков упражнений."""
+    cursor.execute("PRAGMA table_info(workout_sets)")
+    columns = [column[1] for column in cursor.fetchall()]
+    for column, _ in WORKOUT_SET_COUNTERS:
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE workout_sets ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+            print(f"✓ Поле workout_sets.{column} добавлено")
+
+
 def create_exercise_table(cursor):
     """Создает таблицу упражнений."""
     cursor.execute('''
@@ -37,7 +90,6 @@ def create_exercise_table(cursor):
             code TEXT PRIMARY KEY,
             name TEXT NOT NULL,
             description TEXT,
-            images TEXT,  -- JSON массив путей к изображениям
             video_url TEXT,
             repeat_count INTEGER NOT NULL,
             round_count INTEGER NOT NULL,
@@ -50,6 +102,152 @@ def create_exercise_table(cursor):
     ''')
 
 
+def create_exercise_images_table(cursor):
+    """Создает таблицу изображений упражнений."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS exercise_images (
+            exercise_code TEXT NOT NULL,
+            position INTEGER NOT NULL,  -- порядок изображения в упражнении, с 0
+            path TEXT NOT NULL,  -- путь относительно static/
+            PRIMARY KEY (exercise_code, position),
+            FOREIGN KEY (exercise_code) REFERENCES exercises (code) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+
+
+def create_image_files_table(cursor):
+    """
+    Создает таблицу файлов изображений и триггеры подсчета ссылок на них.
+
+    Загруженные файлы называются по хешу содержимого, поэтому одинаковые
+    изображения разных упражнений хранятся один раз. ref_count - число
+    строк exercise_images с этим путем; файл без ссылок удаляется фоновой
+    задачей после паузы (unreferenced_since).
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_files (
+            path TEXT PRIMARY KEY,  -- путь относительно static/
+            content_hash TEXT UNIQUE,  -- blake2b содержимого; NULL у файлов, загруженных до хеширования
+            size INTEGER,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            unreferenced_since TIMESTAMP,  -- когда пропала последняя ссылка
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS image_files_ref_insert
+        AFTER INSERT ON exercise_images
+        BEGIN
+            INSERT OR IGNORE INTO image_files (path) VALUES (NEW.path);
+            UPDATE image_files SET ref_count = ref_count + 1, unreferenced_since = NULL
+            WHERE path = NEW.path;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS image_files_ref_delete
+        AFTER DELETE ON exercise_images
+        BEGIN
+            UPDATE image_files
+            SET ref_count = ref_count - 1,
+                unreferenced_since = CASE WHEN ref_count = 1 THEN CURRENT_TIMESTAMP
+                                          ELSE unreferenced_since END
+            WHERE path = OLD.path;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS image_files_ref_update
+        AFTER UPDATE OF path ON exercise_images
+        WHEN OLD.path <> NEW.path
+        BEGIN
+            UPDATE image_files
+            SET ref_count = ref_count - 1,
+                unreferenced_since = CASE WHEN ref_count = 1 THEN CURRENT_TIMESTAMP
+                                          ELSE unreferenced_since END
+            WHERE path = OLD.path;
+            INSERT OR IGNORE INTO image_files (path) VALUES (NEW.path);
+            UPDATE image_files SET ref_count = ref_count + 1, unreferenced_since = NULL
+            WHERE path = NEW.path;
+        END
+    ''')
+
+    # Начальные значения пересчитываются полностью (триггеры уже созданы)
+    cursor.execute('''
+        INSERT OR IGNORE INTO image_files (path)
+        SELECT DISTINCT path FROM exercise_images
+    ''')
+    cursor.execute('''
+        UPDATE image_files
+        SET ref_count = (SELECT COUNT(*) FROM exercise_images ei WHERE ei.path = image_files.path)
+    ''')
+    cursor.execute('''
+        UPDATE image_files SET unreferenced_since = CURRENT_TIMESTAMP
+        WHERE ref_count = 0 AND unreferenced_since IS NULL
+    ''')
+
+
+def create_image_variants_table(cursor):
+    """Создает таблицу уменьшенных копий изображений (WebP/AVIF разной ширины)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            source_path TEXT NOT NULL,  -- путь к оригиналу относительно static/
+            format TEXT NOT NULL,  -- webp, avif
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            path TEXT NOT NULL,  -- путь к копии относительно static/
+            PRIMARY KEY (source_path, format, width)
+        ) WITHOUT ROWID
+    ''')
+
+
+def create_jobs_table(cursor):
+    """Создает таблицу фоновых задач (обработка изображений, удаление файлов)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            code TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,  -- тип задачи, см. jobs.py
+            payload TEXT NOT NULL DEFAULT '{}',  -- JSON с параметрами задачи
+            status TEXT NOT NULL DEFAULT 'pending',  -- pending, running, done, failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            run_after REAL NOT NULL,  -- unix-время, раньше которого задачу не брать
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+# Таблицы, при изменении которых увеличивается номер версии в data_versions
+VERSIONED_TABLES = ['user_prefs', 'workout_sets', 'exercises', 'exercise_images', 'image_variants', 'workout_logs']
+
+
+def create_data_versions_table(cursor):
+    """
+    Создает таблицу номеров версий данных и триггеры, которые их увеличивают.
+
+    Процессы приложения кешируют редко меняющиеся данные (настройки,
+    страницы тренировки) и сравнивают номер версии с закешированным, чтобы
+    увидеть изменения, сделанные другим процессом; JSON API строит из версий ETag.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    for table in VERSIONED_TABLES:
+        cursor.execute(f"INSERT OR IGNORE INTO data_versions (name, version) VALUES ('{table}', 0)")
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS version_{table}_{event}
+                AFTER {event.upper()} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+
+
 def create_user_prefs_table(cursor):
     """Создает таблицу настроек пользователя."""
     cursor.execute('''
@@ -65,31 +263,125 @@ def create_user_prefs_table(cursor):
     ''')
 
 
-def create_workout_log_table(cursor):
+def create_workout_log_table(cursor, table='workout_logs'):
     """Создает таблицу журнала тренировок."""
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS workout_logs (
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
             code TEXT PRIMARY KEY,
             date TIMESTAMP NOT NULL,
             workoutset_code TEXT NOT NULL,
             duration_seconds INTEGER NOT NULL,
             completed_exercises TEXT,  -- JSON массив завершенных упражнений
+            -- Пагинация журнала идет по (date_epoch, code): запись без даты была бы недостижима
+            date_epoch INTEGER NOT NULL,  -- время тренировки, секунды UTC с 1970 года
+            local_date TEXT NOT NULL,  -- день тренировки по местному времени, YYYY-MM-DD
             FOREIGN KEY (workoutset_code) REFERENCES workout_sets (code)
         )
     ''')
 
 
+def create_workout_rollup_tables(cursor):
+    """
+    Создает сводные таблицы журнала по дням, неделям (с понедельника) и
+    комплексам и заполняет их по текущему журналу. Приложение обновляет
+    их вместе с журналом, см. workout_rollups.py.
+    """
+    for table, key_column, *_ in workout_rollups.ROLLUPS:
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key_column} TEXT PRIMARY KEY,
+                log_count INTEGER NOT NULL,
+                total_duration_seconds INTEGER NOT NULL,
+                completion_sum INTEGER NOT NULL,  -- сумма процентов завершения
+                completion_count INTEGER NOT NULL  -- записей, для которых процент известен
+            ) WITHOUT ROWID
+        ''')
+    workout_rollups.rebuild(cursor.connection)
+
+
+def parse_log_date(value):
+    """
+    Переводит дату журнала (ISO-строка, с суффиксом Z или без зоны) в
+    (секунды UTC, YYYY-MM-DD по местному времени). Дата без зоны
+    считается местным временем. None для нераспознаваемых значений.
+    """
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone()
+    return int(moment.timestamp()), moment.date().isoformat()
+
+
+def migrate_workout_log_dates(cursor):
+    """
+    Добавляет в workout_logs колонки date_epoch и local_date, заполняет их
+    и делает обязательными (NOT NULL), пересоздавая таблицу.
+
+    Raises:
+        ValueError: Если у записей журнала нераспознаваемые даты - миграция
+            не выполняется, пока их не исправят
+    """
+    cursor.execute("PRAGMA table_info(workout_logs)")
+    columns = [column[1] for column in cursor.fetchall()]
+    for column, column_type in (('date_epoch', 'INTEGER'), ('local_date', 'TEXT')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE workout_logs ADD COLUMN {column} {column_type}')
+            print(f"✓ Поле workout_logs.{column} добавлено")
+
+    cursor.execute('SELECT code, date FROM workout_logs WHERE date_epoch IS NULL OR local_date IS NULL')
+    rows = cursor.fetchall()
+    updates = []
+    invalid = []
+    for code, value in rows:
+        parsed = parse_log_date(value)
+        if parsed is None:
+            invalid.append(f"{code}: {value}")
+            continue
+        updates.append((*parsed, code))
+    if invalid:
+        raise ValueError("Нераспознанные даты в журнале тренировок (исправьте workout_logs.date "
+                         "и повторите миграцию): " + '; '.join(invalid))
+    cursor.executemany('UPDATE workout_logs SET date_epoch = ?, local_date = ? WHERE code = ?', updates)
+    if updates:
+        print(f"✓ Даты журнала переведены в date_epoch/local_date: {len(updates)}")
+
+    # ALTER TABLE не добавляет NOT NULL к существующей колонке - пересоздаем таблицу.
+    # Ее индексы и триггеры удаляются вместе с ней и создаются миграцией заново
+    cursor.execute("PRAGMA table_info(workout_logs)")
+    not_null = {column[1]: column[3] for column in cursor.fetchall()}
+    if not (not_null['date_epoch'] and not_null['local_date']):
+        columns = 'code, date, workoutset_code, duration_seconds, completed_exercises, date_epoch, local_date'
+        create_workout_log_table(cursor, 'workout_logs_new')
+        cursor.execute(f'INSERT INTO workout_logs_new ({columns}) SELECT {columns} FROM workout_logs')
+        cursor.execute('DROP TABLE workout_logs')
+        cursor.execute('ALTER TABLE workout_logs_new RENAME TO workout_logs')
+        print("✓ Поля workout_logs.date_epoch и local_date сделаны обязательными")
+
+
 def create_indexes(cursor):
     """Создает индексы для оптимизации запросов."""
     indexes = [
         'CREATE INDEX IF NOT EXISTS idx_exercises_workoutset ON exercises(workoutset_code)',
-        'CREATE INDEX IF NOT EXISTS idx_workout_logs_date ON workout_logs(date DESC)',
-        'CREATE INDEX IF NOT EXISTS idx_workout_logs_workoutset ON workout_logs(workoutset_code)'
+        # Выборки за период и пагинация журнала по (date_epoch, code)
+        'CREATE INDEX IF NOT EXISTS idx_workout_logs_epoch_code ON workout_logs(date_epoch DESC, code DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_workout_logs_local_date ON workout_logs(local_date)',
+        # Последняя тренировка каждого комплекса
+        'CREATE INDEX IF NOT EXISTS idx_workout_logs_workoutset_epoch ON workout_logs(workoutset_code, date_epoch)',
+        # Подсчет ссылок на файлы изображений
+        'CREATE INDEX IF NOT EXISTS idx_exercise_images_path ON exercise_images(path)',
+        # Выбор следующей фоновой задачи
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after)'
     ]
 
     for index_sql in indexes:
         cursor.execute(index_sql)
 
+    # Индексы по текстовой дате журнала заменены индексами по date_epoch
+    for index_name in ('idx_workout_logs_date', 'idx_workout_logs_date_code', 'idx_workout_logs_workoutset'):
+        cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
 
 def init_default_user_prefs(cursor):
     """Инициализирует настройки пользователя по умолчанию."""
@@ -106,7 +398,7 @@ def init_default_user_prefs(cursor):
 
 
 def create_triggers(cursor):
-    """Создает триггеры для автоматического обновления updated_at."""
+    """Создает триггеры для обновления updated_at и счетчиков упражнений комплекса."""
     triggers = [
         '''
         CREATE TRIGGER IF NOT EXISTS update_workout_sets_timestamp
@@ -121,6 +413,32 @@ def create_triggers(cursor):
         BEGIN
             UPDATE exercises SET updated_at = CURRENT_TIMESTAMP WHERE code = NEW.code;
         END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS exercise_counters_insert
+        AFTER INSERT ON exercises
+        BEGIN
+            UPDATE workout_sets SET {workout_set_counters_sql('+', 'NEW')}
+            WHERE code = NEW.workoutset_code;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS exercise_counters_delete
+        AFTER DELETE ON exercises
+        BEGIN
+            UPDATE workout_sets SET {workout_set_counters_sql('-', 'OLD')}
+            WHERE code = OLD.workoutset_code;
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS exercise_counters_update
+        AFTER UPDATE OF workoutset_code, round_count, rest_seconds ON exercises
+        BEGIN
+            UPDATE workout_sets SET {workout_set_counters_sql('-', 'OLD')}
+            WHERE code = OLD.workoutset_code;
+            UPDATE workout_sets SET {workout_set_counters_sql('+', 'NEW')}
+            WHERE code = NEW.workoutset_code;
+        END
         '''
     ]
 
@@ -128,6 +446,50 @@ def create_triggers(cursor):
         cursor.execute(trigger_sql)
 
 
+# Таблицы, для которых счетчик строк поддерживается триггерами
+COUNTED_TABLES = ['workout_sets', 'exercises', 'exercise_images', 'user_prefs', 'workout_logs',
+                  'image_files', 'image_variants', 'jobs', 'data_versions',
+                  *(table for table, *_ in workout_rollups.ROLLUPS)]
+
+
+def create_row_counts_table(cursor):
+    """
+    Создает таблицу счетчиков строк и триггеры, которые ее поддерживают.
+
+    Страница настроек читает количество записей отсюда вместо COUNT(*)
+    по каждой таблице.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_row_counts (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    for table in COUNTED_TABLES:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS count_{table}_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                UPDATE table_row_counts SET row_count = row_count + 1 WHERE table_name = '{table}';
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS count_{table}_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                UPDATE table_row_counts SET row_count = row_count - 1 WHERE table_name = '{table}';
+            END
+        ''')
+
+    # Начальные значения пересчитываются полностью (триггеры уже созданы)
+    for table in COUNTED_TABLES:
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO table_row_counts (table_name, row_count)
+            VALUES ('{table}', (SELECT COUNT(*) FROM {table}))
+        ''')
+
+
 def create_database(force_recreate=False):
     """
     Создает базу данных и все необходимые таблицы.
@@ -156,12 +518,30 @@ def create_database(force_recreate=False):
             create_exercise_table(cursor)
             print("✓ Таблица exercises создана")
 
+            create_exercise_images_table(cursor)
+            print("✓ Таблица exercise_images создана")
+
+            create_image_files_table(cursor)
+            print("✓ Таблица image_files создана")
+
+            create_image_variants_table(cursor)
+            print("✓ Таблица image_variants создана")
+
             create_user_prefs_table(cursor)
             print("✓ Таблица user_prefs создана")
 
             create_workout_log_table(cursor)
             print("✓ Таблица workout_logs создана")
 
+            create_jobs_table(cursor)
+            print("✓ Таблица jobs создана")
+
+            create_data_versions_table(cursor)
+            print("✓ Таблица data_versions создана")
+
+            create_workout_rollup_tables(cursor)
+            print("✓ Сводные таблицы журнала созданы")
+
             # Создаем индексы
             create_indexes(cursor)
             print("✓ Индексы созданы")
@@ -170,6 +550,10 @@ def create_database(force_recreate=False):
             create_triggers(cursor)
             print("✓ Триггеры созданы")
 
+            # Создаем счетчики строк
+            create_row_counts_table(cursor)
+            print("✓ Счетчики строк созданы")
+
             # Инициализируем настройки по умолчанию
             init_default_user_prefs(cursor)
 
@@ -258,6 +642,54 @@ def migrate_database():
                 conn.commit()
                 print("✓ Поле default_warmup_rest_seconds добавлено")
 
+            # Даты журнала в виде секунд UTC и местного дня
+            migrate_workout_log_dates(cursor)
+            conn.commit()
+
+            # Счетчики упражнений комплексов: колонки, пересчет и триггеры.
+            # Пересчет - без триггера updated_at, чтобы не затереть время
+            # изменения комплексов; create_triggers устанавливает его заново
+            migrate_workout_set_counters(cursor)
+            cursor.execute('DROP TRIGGER IF EXISTS update_workout_sets_timestamp')
+            recalculate_workout_set_counters(cursor)
+            create_triggers(cursor)
+            conn.commit()
+
+            # Переносим изображения из JSON-колонки exercises.images в exercise_images
+            migrate_exercise_images(cursor)
+            conn.commit()
+
+            # Файлы изображений со счетчиками ссылок
+            create_image_files_table(cursor)
+            conn.commit()
+
+            # Таблица уменьшенных копий изображений (заполняется python image_pipeline.py)
+            create_image_variants_table(cursor)
+            conn.commit()
+
+            # Таблица фоновых задач
+            create_jobs_table(cursor)
+            conn.commit()
+
+            # Номера версий для кешей настроек
+            create_data_versions_table(cursor)
+            conn.commit()
+
+            # Создаем недостающие индексы
+            create_indexes(cursor)
+            conn.commit()
+            print("✓ Индексы обновлены")
+
+            # Создаем (или пересчитываем) сводные таблицы журнала
+            create_workout_rollup_tables(cursor)
+            conn.commit()
+            print("✓ Сводные таблицы журнала обновлены")
+
+            # Создаем (или пересчитываем) счетчики строк
+            create_row_counts_table(cursor)
+            conn.commit()
+            print("✓ Счетчики строк обновлены")
+
             print("🎉 Миграция базы данных завершена успешно")
 
     except sqlite3.Error as e:
@@ -265,5 +697,32 @@ def migrate_database():
         raise
 
 
+def migrate_exercise_images(cursor):
+    """Переносит JSON-список изображений упражнений в таблицу exercise_images."""
+    cursor.execute("PRAGMA table_info(exercises)")
+    exercise_columns = [column[1] for column in cursor.fetchall()]
+
+    create_exercise_images_table(cursor)
+
+    if 'images' not in exercise_columns:
+        return
+
+    print("Переносим изображения упражнений в таблицу exercise_images...")
+    cursor.execute('''
+        INSERT OR IGNORE INTO exercise_images (exercise_code, position, path)
+        SELECT e.code, CAST(j.key AS INTEGER), j.value
+        FROM exercises e, json_each(e.images) j
+        WHERE e.images IS NOT NULL AND json_valid(e.images) AND j.type = 'text'
+    ''')
+    print(f"✓ Перенесено изображений: {cursor.rowcount}")
+
+    try:
+        cursor.execute('ALTER TABLE exercises DROP COLUMN images')
+        print("✓ Колонка exercises.images удалена")
+    except sqlite3.OperationalError as e:
+        # SQLite старше 3.35 не умеет удалять колонки - колонка просто не используется
+        print(f"⚠️  Колонка exercises.images оставлена: {e}")
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,895 @@
+/**
+ * Выполнение тренировки: разминка, подходы, таймеры отдыха и сохранение результата.
+ *
+ * Данные тренировки страница передает JSON-блоком <script id="workoutData">,
+ * поэтому сам модуль одинаков для всех комплексов и кешируется браузером.
+ * Состояние между перезагрузками страницы хранится через WorkoutState.
+ */
+class WorkoutSession {
+    /**
+     * @param {Object} data - Данные тренировки со страницы: workoutSetCode,
+     *   workoutSetName, warmupRestSeconds, completeUrl, exercises
+     */
+    constructor(data) {
+        console.log('🔥 Конструктор WorkoutSession вызван с упражнениями:', data.exercises);
+
+        this.exercises = data.exercises;
+        this.workoutSetCode = data.workoutSetCode;
+        this.workoutSetName = data.workoutSetName;
+        this.warmupRestSeconds = data.warmupRestSeconds;
+        this.completeUrl = data.completeUrl;
+        this.currentExerciseIndex = 0;
+        this.currentRound = 0;
+        this.isResting = false;
+        this.isWarmingUp = true; // Новый флаг для этапа разминки
+        this.startTime = null; // Время начала - устанавливается после разминки
+        this.timerInterval = null;
+        this.restEndTime = null;
+        this.completedRounds = {}; // Сохраняем выполненные подходы для каждого упражнения
+        this.isWorkoutFinished = false; // Флаг завершения тренировки
+
+        console.log('🔥 Инициализируем звуковые уведомления...');
+        // Инициализируем звуковые уведомления
+        this.notificationSound = new NotificationSound();
+        this.notificationSound.requestNotificationPermission();
+
+        console.log('🔥 Вызываем initializeUI...');
+        this.initializeUI();
+        console.log('🔥 Вызываем loadWorkoutState...');
+        this.loadWorkoutState(); // Загружаем сохраненное состояние
+
+        console.log('🔥 WorkoutSession полностью инициализирован');
+    }
+
+    saveWorkoutState() {
+        // Не сохраняем состояние если тренировка завершена или идет разминка
+        if (this.isWorkoutFinished || this.isWarmingUp) {
+            console.log('🔥 Тренировка завершена или идет разминка, НЕ сохраняем состояние');
+            return;
+        }
+
+        const state = {
+            workoutSetCode: this.workoutSetCode,
+            workoutSetName: this.workoutSetName,
+            currentExerciseIndex: this.currentExerciseIndex,
+            currentRound: this.currentRound,
+            isResting: this.isResting,
+            isWarmingUp: this.isWarmingUp,
+            startTime: this.startTime,
+            completedRounds: this.completedRounds,
+            restEndTime: this.restEndTime
+        };
+        WorkoutState.save(state);
+    }
+
+    loadWorkoutState() {
+        const savedState = WorkoutState.getActive();
+        if (savedState) {
+            // Проверяем, что это тренировка для того же комплекса
+            if (savedState.workoutSetCode === this.workoutSetCode) {
+                this.currentExerciseIndex = savedState.currentExerciseIndex || 0;
+                this.currentRound = savedState.currentRound || 0;
+                this.isResting = savedState.isResting || false;
+                this.isWarmingUp = savedState.isWarmingUp !== undefined ? savedState.isWarmingUp : true;
+                this.startTime = savedState.startTime || null;
+                this.completedRounds = savedState.completedRounds || {};
+                this.restEndTime = savedState.restEndTime;
+
+                // Восстанавливаем состояние упражнений только если разминка завершена
+                if (!this.isWarmingUp) {
+                    this.restoreExercisesState();
+                }
+
+                // Если был активен таймер, проверяем не истек ли он
+                if (this.isResting && this.restEndTime) {
+                    const remaining = this.restEndTime - Date.now();
+                    if (remaining > 0) {
+                        // Продолжаем таймер
+                        const currentCard = document.querySelector(`[data-exercise-index="${this.currentExerciseIndex}"]`);
+                        const exerciseName = currentCard.querySelector('.card-title').textContent.trim();
+                        this.showTimer(Math.ceil(remaining / 1000), exerciseName);
+                        this.timerInterval = setInterval(() => {
+                            this.updateTimer();
+                        }, 100);
+                    } else {
+                        // Таймер истек, завершаем отдых
+                        this.isResting = false;
+                        this.restEndTime = null;
+                    }
+                }
+            }
+        }
+
+        // Устанавливаем начальное состояние в зависимости от этапа
+        if (this.isWarmingUp) {
+            this.showWarmupPanel();
+        } else {
+            this.setCurrentExercise(this.currentExerciseIndex);
+            // Обновляем время только для продолжающихся тренировок
+            if (this.startTime) {
+                this.updateTotalTime();
+            }
+        }
+    }
+
+    restoreExercisesState() {
+        // Восстанавливаем прогресс для каждого упражнения
+        Object.keys(this.completedRounds).forEach(exerciseIndex => {
+            const rounds = this.completedRounds[exerciseIndex];
+            const card = document.querySelector(`[data-exercise-index="${exerciseIndex}"]`);
+            if (card && rounds > 0) {
+                // Обновляем прогресс-бар
+                const progressBar = card.querySelector('.progress-rounds');
+                const roundCount = parseInt(card.dataset.roundCount);
+                const progress = (rounds / roundCount) * 100;
+                progressBar.style.width = `${progress}%`;
+
+                // Обновляем текст прогресса
+                card.querySelector('.current-round').textContent = rounds;
+
+                // Отмечаем выполненные подходы
+                const checkmarks = card.querySelectorAll('.round-check');
+                for (let i = 0; i < rounds; i++) {
+                    if (checkmarks[i]) {
+                        checkmarks[i].className = 'bi bi-check-circle-fill text-success round-check';
+                    }
+                }
+            }
+        });
+    }
+
+    clearWorkoutState() {
+        console.log('🔥 Очищаем состояние тренировки...');
+
+        // Устанавливаем флаг завершения ПЕРЕД очисткой
+        this.isWorkoutFinished = true;
+        console.log('🔥 Установлен флаг завершения тренировки');
+
+        WorkoutState.clear();
+        WorkoutState.updateIndicators();
+    }
+
+    initializeUI() {
+        console.log('🔥 Инициализация UI...');
+
+        // Привязываем обработчики событий
+        document.querySelectorAll('.rest-button').forEach(button => {
+            button.addEventListener('click', (e) => {
+                const exerciseCode = e.target.dataset.exerciseCode;
+                this.startRest(exerciseCode);
+            });
+        });
+
+        // Обработчики кликов на изображения упражнений
+        document.querySelectorAll('.exercise-images img').forEach(img => {
+            console.log('🔥 Добавляем обработчик клика для изображения:', img.src);
+            img.style.cursor = 'pointer';
+            img.addEventListener('click', (e) => {
+                console.log('🔥 Клик по изображению в карточке:', e.target.src);
+                const exerciseCard = e.target.closest('.card');
+                const exerciseName = exerciseCard.querySelector('.card-title').textContent.trim();
+
+                // Получаем все изображения упражнения
+                let allImages = [];
+                try {
+                    const imagesData = exerciseCard.dataset.exerciseImages;
+                    allImages = JSON.parse(imagesData).map(imagePath => `/static/${imagePath}`);
+                } catch (e) {
+                    allImages = [e.target.src];
+                }
+
+                // Находим индекс кликнутого изображения (в src может быть отпечаток содержимого)
+                const clickedImageIndex = allImages.indexOf(`/static/${e.target.dataset.path}`);
+                const currentIndex = clickedImageIndex >= 0 ? clickedImageIndex : 0;
+
+                console.log('🔥 Название упражнения:', exerciseName);
+                console.log('🔥 Все изображения:', allImages);
+                console.log('🔥 Текущий индекс:', currentIndex);
+
+                this.showImageModal(e.target.src, exerciseName, allImages, currentIndex);
+            });
+        });
+
+        // Обработчик кнопки завершения разминки
+        const warmupBtn = document.getElementById('warmupCompleteBtn');
+        if (warmupBtn) {
+            warmupBtn.addEventListener('click', (e) => {
+                console.log('🔥 Клик по кнопке завершения разминки');
+                e.preventDefault();
+                e.stopPropagation();
+                this.completeWarmup();
+            });
+        }
+
+        // Обработчик кнопки завершения тренировки
+        const finishBtn = document.getElementById('finishWorkoutBtn');
+        console.log('🔥 Кнопка завершения найдена:', !!finishBtn);
+
+        if (finishBtn) {
+            console.log('🔥 Подключаем ЕДИНСТВЕННЫЙ обработчик к кнопке завершения');
+
+            // Полностью очищаем все обработчики
+            const newFinishBtn = finishBtn.cloneNode(true);
+            finishBtn.parentNode.replaceChild(newFinishBtn, finishBtn);
+
+            // Добавляем только один обработчик к новой кнопке
+            newFinishBtn.addEventListener('click', (e) => {
+                console.log('🔥 Клик по кнопке завершения тренировки!', e);
+                e.preventDefault();
+                e.stopPropagation();
+                this.finishWorkout();
+            });
+        } else {
+            console.error('🔥 КНОПКА ЗАВЕРШЕНИЯ НЕ НАЙДЕНА!');
+        }
+
+        // Запускаем обновление общего времени
+        setInterval(() => this.updateTotalTime(), 1000);
+
+        // Сохраняем состояние при уходе со страницы
+        window.addEventListener('beforeunload', () => {
+            this.saveWorkoutState();
+        });
+
+        // Периодически сохраняем состояние
+        setInterval(() => {
+            this.saveWorkoutState();
+        }, 5000); // каждые 5 секунд
+
+        // Слушаем изменения состояния из других вкладок
+        window.addEventListener('storage', (e) => {
+            if (e.key === 'activeWorkout' && !e.newValue) {
+                // Состояние было очищено в другой вкладке
+                console.log('Тренировка завершена в другой вкладке');
+                // Можно добавить уведомление пользователю
+            }
+        });
+    }
+
+    setCurrentExercise(index) {
+        // Убираем выделение с предыдущего упражнения
+        document.querySelectorAll('.exercise-card').forEach(card => {
+            card.classList.remove('border-primary');
+            card.querySelector('.exercise-header').style.display = 'none';
+            card.querySelector('.rest-button').style.display = 'none';
+        });
+
+        // Выделяем текущее упражнение
+        const currentCard = document.querySelector(`[data-exercise-index="${index}"]`);
+
+        if (currentCard) {
+            currentCard.classList.add('border-primary');
+            currentCard.querySelector('.exercise-header').style.display = 'block';
+            currentCard.querySelector('.rest-button').style.display = 'block';
+            currentCard.querySelector('.rest-button').disabled = false;
+
+            // Обновляем информационную панель только если не отдыхаем
+            if (!this.isResting) {
+                this.updateCurrentExercisePanel(currentCard);
+            }
+
+            // Прокручиваем к текущему упражнению
+            currentCard.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        }
+
+        this.currentExerciseIndex = index;
+        // Восстанавливаем количество подходов для текущего упражнения
+        this.currentRound = this.completedRounds[index] || 0;
+    }
+
+    updateCurrentExercisePanel(exerciseCard) {
+        const panel = document.getElementById('currentExercisePanel');
+        const exerciseName = exerciseCard.dataset.exerciseName;
+        const repeatCount = exerciseCard.dataset.repeatCount;
+
+        let exerciseImages = [];
+        try {
+            const imagesData = exerciseCard.dataset.exerciseImages;
+            exerciseImages = JSON.parse(imagesData);
+        } catch (e) {
+            exerciseImages = [];
+        }
+
+        // Уменьшенные копии изображений: {путь: {формат: [{width, path}]}}
+        let imageVariants = {};
+        try {
+            imageVariants = JSON.parse(exerciseCard.dataset.exerciseImageVariants || '{}');
+        } catch (e) {
+            imageVariants = {};
+        }
+
+        // Обновляем текст
+        document.getElementById('currentExerciseInstruction').textContent = 'Выполните';
+        document.getElementById('currentExerciseName').textContent = exerciseName;
+        document.getElementById('currentExerciseReps').textContent = repeatCount;
+
+        // Обновляем изображения
+        const imagesContainer = document.getElementById('currentExerciseImages');
+        imagesContainer.innerHTML = '';
+
+        exerciseImages.forEach((imagePath, index) => {
+            if (index < 4) { // Показываем максимум 4 изображения
+                const img = document.createElement('img');
+                img.src = `/static/${imagePath}`;
+                const webpVariants = (imageVariants[imagePath] || {}).webp;
+                if (webpVariants && webpVariants.length > 0) {
+                    img.srcset = webpVariants.map(variant => `/static/${variant.path} ${variant.width}w`).join(', ');
+                    img.sizes = '160px';
+                }
+                img.className = 'img-thumbnail me-2';
+                img.style.cssText = 'width: 160px; height: 160px; object-fit: cover; cursor: pointer; transition: transform 0.2s ease, box-shadow 0.2s ease;';
+                img.alt = 'Упражнение';
+
+                // Добавляем обработчик клика для показа в модальном окне
+                img.addEventListener('click', () => {
+                    console.log('🔥 Клик по изображению в панели:', img.src, 'упражнение:', exerciseName);
+
+                    // Формируем массив всех изображений для модального окна
+                    const allImages = exerciseImages.map(imagePath => `/static/${imagePath}`);
+
+                    console.log('🔥 Все изображения панели:', allImages);
+                    console.log('🔥 Текущий индекс в панели:', index);
+
+                    this.showImageModal(img.src, exerciseName, allImages, index);
+                });
+
+                // Добавляем эффект при наведении
+                img.addEventListener('mouseenter', () => {
+                    img.style.transform = 'scale(1.05)';
+                    img.style.boxShadow = '0 4px 8px rgba(0, 0, 0, 0.2)';
+                });
+
+                img.addEventListener('mouseleave', () => {
+                    img.style.transform = 'scale(1)';
+                    img.style.boxShadow = 'none';
+                });
+
+                imagesContainer.appendChild(img);
+            }
+        });
+
+        if (exerciseImages.length > 4) {
+            const moreText = document.createElement('span');
+            moreText.className = 'text-muted align-self-center';
+            moreText.textContent = `+${exerciseImages.length - 4}`;
+            imagesContainer.appendChild(moreText);
+        }
+
+        // Показываем панель
+        panel.style.display = 'block';
+
+        // Прокручиваем к панели
+        setTimeout(() => {
+            panel.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        }, 100);
+    }
+
+    hideCurrentExercisePanel() {
+        document.getElementById('currentExercisePanel').style.display = 'none';
+    }
+
+    showWarmupPanel() {
+        console.log('🔥 Показываем панель разминки');
+        const panel = document.getElementById('warmupPanel');
+        panel.style.display = 'block';
+
+        // Прокручиваем к панели
+        setTimeout(() => {
+            panel.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        }, 100);
+    }
+
+    hideWarmupPanel() {
+        document.getElementById('warmupPanel').style.display = 'none';
+    }
+
+    completeWarmup() {
+        console.log('🔥 Завершаем разминку, начинаем тренировку');
+
+        // Завершаем этап разминки
+        this.isWarmingUp = false;
+        this.startTime = Date.now(); // Начинаем отсчет времени тренировки
+
+        // Создаем состояние тренировки
+        WorkoutState.create(this.workoutSetCode, this.workoutSetName);
+
+        // Скрываем панель разминки
+        this.hideWarmupPanel();
+
+        // Время отдыха после разминки из настроек
+        const warmupRestSeconds = this.warmupRestSeconds;
+
+        // Запускаем таймер отдыха после разминки
+        this.showTimer(warmupRestSeconds, 'Разминка завершена');
+        this.isResting = true;
+        this.restEndTime = Date.now() + (warmupRestSeconds * 1000);
+
+        // Сохраняем состояние
+        this.saveWorkoutState();
+
+        // Запускаем таймер
+        this.timerInterval = setInterval(() => {
+            this.updateTimer();
+        }, 100);
+    }
+
+    startRest(exerciseCode) {
+        const currentCard = document.querySelector(`[data-exercise-code="${exerciseCode}"]`);
+        const restSeconds = parseInt(currentCard.dataset.restSeconds);
+        const exerciseName = currentCard.querySelector('.card-title').textContent.trim();
+
+        // Отмечаем выполненный подход
+        this.markRoundCompleted(currentCard);
+
+        // Отключаем кнопку отдыха
+        currentCard.querySelector('.rest-button').disabled = true;
+
+        // Скрываем информационную панель и показываем таймер
+        this.hideCurrentExercisePanel();
+        this.showTimer(restSeconds, exerciseName);
+
+        this.isResting = true;
+        this.restEndTime = Date.now() + (restSeconds * 1000);
+
+        // Сохраняем состояние
+        this.saveWorkoutState();
+
+        // Запускаем обратный отсчет
+        this.timerInterval = setInterval(() => {
+            this.updateTimer();
+        }, 100);
+    }
+
+    markRoundCompleted(card) {
+        this.currentRound++;
+
+        // Сохраняем в общем состоянии
+        this.completedRounds[this.currentExerciseIndex] = this.currentRound;
+
+        // Обновляем прогресс-бар
+        const progressBar = card.querySelector('.progress-rounds');
+        const roundCount = parseInt(card.dataset.roundCount);
+        const progress = (this.currentRound / roundCount) * 100;
+        progressBar.style.width = `${progress}%`;
+
+        // Обновляем текст прогресса
+        card.querySelector('.current-round').textContent = this.currentRound;
+
+        // Отмечаем галочкой выполненный подход
+        const checkmarks = card.querySelectorAll('.round-check');
+        if (checkmarks[this.currentRound - 1]) {
+            checkmarks[this.currentRound - 1].className = 'bi bi-check-circle-fill text-success round-check';
+        }
+    }
+
+    showTimer(seconds, exerciseName) {
+        const timerCard = document.getElementById('timerCard');
+        const timerDisplay = document.getElementById('timerDisplay');
+        const timerExerciseNameEl = document.getElementById('timerExerciseName');
+        const timerTotalTimeEl = document.getElementById('timerTotalTime');
+
+        timerCard.style.display = 'block';
+        timerExerciseNameEl.textContent = exerciseName;
+
+        // Сохраняем общее время отдыха для отображения в скобках
+        this.totalRestSeconds = seconds;
+
+        this.updateTimerDisplay(seconds);
+
+        // Прокручиваем к таймеру
+        timerCard.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    }
+
+    hideTimer() {
+        document.getElementById('timerCard').style.display = 'none';
+    }
+
+    updateTimer() {
+        const remaining = Math.max(0, this.restEndTime - Date.now());
+        const seconds = Math.ceil(remaining / 1000);
+
+        this.updateTimerDisplay(seconds);
+
+        if (remaining <= 0) {
+            this.endRest();
+        }
+    }
+
+    updateTimerDisplay(seconds) {
+        document.getElementById('timerDisplay').textContent = WorkoutState.formatTime(seconds);
+
+        // Показываем общее время отдыха в скобках (статическое)
+        const totalTimeString = WorkoutState.formatTime(this.totalRestSeconds);
+
+        const timerTotalTimeEl = document.getElementById('timerTotalTime');
+        if (timerTotalTimeEl) {
+            timerTotalTimeEl.textContent = ` (${totalTimeString})`;
+        }
+    }
+
+    endRest() {
+        clearInterval(this.timerInterval);
+        this.hideTimer();
+        this.isResting = false;
+        this.restEndTime = null;
+
+        // Звуковое уведомление
+        this.notificationSound.createDoubleBeep();
+
+        // Проверяем, было ли это окончание таймера после разминки
+        if (this.currentExerciseIndex === 0 && this.currentRound === 0 && Object.keys(this.completedRounds).length === 0) {
+            // Это первый раз после разминки - показываем первое упражнение
+            console.log('🔥 Таймер после разминки завершен, начинаем первое упражнение');
+            this.setCurrentExercise(0);
+            this.saveWorkoutState();
+            return;
+        }
+
+        // Проверяем, закончены ли все подходы текущего упражнения
+        const currentCard = document.querySelector(`[data-exercise-index="${this.currentExerciseIndex}"]`);
+        const roundCount = parseInt(currentCard.dataset.roundCount);
+
+        if (this.currentRound >= roundCount) {
+            // Упражнение завершено, переходим к следующему
+            setTimeout(() => {
+                this.moveToNextExercise();
+            }, 1000); // Небольшая пауза для визуального восприятия
+        } else {
+            // Включаем кнопку отдыха для следующего подхода и показываем панель упражнения
+            currentCard.querySelector('.rest-button').disabled = false;
+            this.updateCurrentExercisePanel(currentCard);
+        }
+
+        // Сохраняем состояние
+        this.saveWorkoutState();
+    }
+
+    moveToNextExercise() {
+        if (this.currentExerciseIndex + 1 >= this.exercises.length) {
+            // Тренировка завершена автоматически
+            this.completeWorkout();
+        } else {
+            // Переходим к следующему упражнению
+            this.setCurrentExercise(this.currentExerciseIndex + 1);
+            this.saveWorkoutState();
+        }
+    }
+
+    updateTotalTime() {
+        // Показываем время только если тренировка началась
+        if (this.startTime) {
+            const elapsed = Date.now() - this.startTime;
+            const timeString = WorkoutState.formatTime(Math.floor(elapsed / 1000));
+            document.getElementById('totalTime').textContent = `Общее время: ${timeString}`;
+        } else {
+            document.getElementById('totalTime').textContent = 'Общее время: 00:00';
+        }
+    }
+
+    getCompletedExercises() {
+        /**
+         * Собирает информацию о завершенных упражнениях для статистики
+         * Возвращает массив кодов упражнений, которые были полностью завершены
+         */
+        const completedExercises = [];
+
+        // Проходим по всем упражнениям и проверяем, завершены ли они полностью
+        this.exercises.forEach((exercise, index) => {
+            const completedRounds = this.completedRounds[index] || 0;
+            const totalRounds = exercise.round_count;
+
+            // Считаем упражнение завершенным, если выполнены все подходы
+            if (completedRounds >= totalRounds) {
+                completedExercises.push(exercise.code);
+            }
+        });
+
+        console.log('🔥 Завершенные упражнения:', completedExercises);
+        return completedExercises;
+    }
+
+    finishWorkout() {
+        console.log('🔥 finishWorkout() вызван');
+        // Принудительное завершение тренировки
+        if (confirm('Вы уверены, что хотите завершить тренировку?')) {
+            console.log('🔥 Пользователь подтвердил завершение тренировки');
+
+            // Сразу очищаем состояние
+            this.clearWorkoutState();
+
+            // Скрываем информационную панель и таймер
+            this.hideCurrentExercisePanel();
+            if (this.timerInterval) {
+                clearInterval(this.timerInterval);
+                this.hideTimer();
+            }
+
+            const totalDuration = Math.floor((Date.now() - this.startTime) / 1000);
+
+            this.showWorkoutResult(totalDuration);
+        } else {
+            console.log('🔥 Пользователь отменил завершение тренировки');
+        }
+    }
+
+    completeWorkout() {
+        console.log('🔥 completeWorkout() - автоматическое завершение тренировки');
+
+        // Устанавливаем флаг завершения
+        this.isWorkoutFinished = true;
+        console.log('🔥 Установлен флаг завершения тренировки (автоматически)');
+
+        // Скрываем информационную панель
+        this.hideCurrentExercisePanel();
+
+        // Останавливаем таймер если он активен
+        if (this.timerInterval) {
+            clearInterval(this.timerInterval);
+            this.hideTimer();
+        }
+
+        // Очищаем состояние тренировки сразу
+        this.clearWorkoutState();
+
+        const totalDuration = Math.floor((Date.now() - this.startTime) / 1000);
+
+        this.showWorkoutResult(totalDuration);
+    }
+
+    showWorkoutResult(totalDuration) {
+        // Отображаем финальное время
+        document.getElementById('finalTime').textContent = WorkoutState.formatTime(totalDuration);
+
+        // Сохраняем результат тренировки в фоновом режиме
+        fetch(this.completeUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                duration_seconds: totalDuration,
+                completed_exercises: this.getCompletedExercises()
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                console.log('Тренировка сохранена:', data.message);
+            } else {
+                console.error('Ошибка сохранения:', data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при сохранении тренировки:', error);
+        });
+
+        // Показываем модальное окно завершения
+        const completeModal = new bootstrap.Modal(document.getElementById('completeModal'));
+        completeModal.show();
+    }
+
+    showImageModal(imageSrc, exerciseName, allImages = null, currentIndex = 0) {
+        console.log('🔥 showImageModal вызвана с:', imageSrc, exerciseName, 'все изображения:', allImages);
+
+        // Устанавливаем источник изображения и название
+        const modalImage = document.getElementById('modalImage');
+        const modalTitle = document.getElementById('imageModalTitle');
+        const modalElement = document.getElementById('imageModal');
+
+        console.log('🔥 Элементы модального окна найдены:', {
+            modalImage: !!modalImage,
+            modalTitle: !!modalTitle,
+            modalElement: !!modalElement
+        });
+
+        if (!modalImage || !modalTitle || !modalElement) {
+            console.error('🔥 Не найдены элементы модального окна!');
+            return;
+        }
+
+        // Если передан только один src, создаем массив из него
+        if (!allImages) {
+            allImages = [imageSrc];
+            currentIndex = 0;
+        }
+
+        // Сохраняем данные изображений в модальном окне
+        modalElement.currentImages = allImages;
+        modalElement.currentImageIndex = currentIndex;
+        modalElement.exerciseName = exerciseName;
+
+        // Устанавливаем текущее изображение
+        this.updateModalImage(modalImage, modalTitle, allImages, currentIndex, exerciseName);
+
+        // Удаляем предыдущие обработчики клика на изображение
+        modalImage.removeEventListener('click', modalImage.clickHandler);
+
+        // Добавляем новый обработчик клика для переключения изображений
+        modalImage.clickHandler = () => {
+            this.nextModalImage(modalImage, modalTitle, modalElement);
+        };
+        modalImage.addEventListener('click', modalImage.clickHandler);
+        modalImage.style.cursor = 'pointer';
+
+        console.log('🔥 Устанавливаем изображение:', imageSrc);
+        console.log('🔥 Устанавливаем заголовок:', modalTitle.textContent);
+
+        // Проверяем наличие Bootstrap
+        if (typeof bootstrap !== 'undefined') {
+            console.log('🔥 Bootstrap найден, используем Bootstrap модальное окно');
+            try {
+                const imageModal = new bootstrap.Modal(modalElement);
+                console.log('🔥 Модальное окно создано, показываем...');
+                imageModal.show();
+            } catch (error) {
+                console.error('🔥 Ошибка при показе Bootstrap модального окна:', error);
+                this.showSimpleModal(modalElement);
+            }
+        } else {
+            console.log('🔥 Bootstrap не найден, используем простое модальное окно');
+            this.showSimpleModal(modalElement);
+        }
+    }
+
+    updateModalImage(modalImage, modalTitle, allImages, currentIndex, exerciseName) {
+        const currentImageSrc = allImages[currentIndex];
+        modalImage.src = currentImageSrc;
+
+        // Обновляем заголовок с индикатором текущего изображения
+        if (allImages.length > 1) {
+            modalTitle.textContent = `${exerciseName} - Изображение ${currentIndex + 1} из ${allImages.length}`;
+
+            // Показываем подсказку о возможности переключения
+            const imageHint = document.getElementById('imageHint');
+            if (imageHint) {
+                imageHint.style.display = 'block';
+            }
+        } else {
+            modalTitle.textContent = `${exerciseName} - Изображение упражнения`;
+
+            // Скрываем подсказку если изображение одно
+            const imageHint = document.getElementById('imageHint');
+            if (imageHint) {
+                imageHint.style.display = 'none';
+            }
+        }
+    }
+
+    nextModalImage(modalImage, modalTitle, modalElement) {
+        const allImages = modalElement.currentImages;
+        const currentIndex = modalElement.currentImageIndex;
+        const exerciseName = modalElement.exerciseName;
+
+        if (!allImages || allImages.length <= 1) {
+            return; // Нет смысла переключать, если изображение одно или их нет
+        }
+
+        // Переходим к следующему изображению (циклично)
+        const nextIndex = (currentIndex + 1) % allImages.length;
+        modalElement.currentImageIndex = nextIndex;
+
+        console.log('🔥 Переключаем на изображение:', nextIndex + 1, 'из', allImages.length);
+
+        // Обновляем изображение и заголовок
+        this.updateModalImage(modalImage, modalTitle, allImages, nextIndex, exerciseName);
+    }
+
+    showSimpleModal(modalElement) {
+        // Простая реализация без Bootstrap
+        modalElement.style.display = 'block';
+        modalElement.classList.add('show');
+        modalElement.setAttribute('aria-hidden', 'false');
+        document.body.classList.add('modal-open');
+
+        // Создаем backdrop
+        const backdrop = document.createElement('div');
+        backdrop.className = 'modal-backdrop fade show';
+        document.body.appendChild(backdrop);
+
+        // Обработчик закрытия
+        const closeModal = () => {
+            modalElement.style.display = 'none';
+            modalElement.classList.remove('show');
+            modalElement.setAttribute('aria-hidden', 'true');
+            document.body.classList.remove('modal-open');
+            if (backdrop) {
+                backdrop.remove();
+            }
+        };
+
+        // Закрытие по клику на backdrop
+        backdrop.addEventListener('click', closeModal);
+
+        // Закрытие по кнопке
+        const closeBtn = modalElement.querySelector('.btn-close');
+        if (closeBtn) {
+            closeBtn.addEventListener('click', closeModal);
+        }
+
+        // Закрытие по Escape
+        const escHandler = (e) => {
+            if (e.key === 'Escape') {
+                closeModal();
+                document.removeEventListener('keydown', escHandler);
+            }
+        };
+        document.addEventListener('keydown', escHandler);
+    }
+}
+
+// Инициализация тренировки
+document.addEventListener('DOMContentLoaded', function() {
+    console.log('🔥 DOM загружен, начинаем инициализацию тренировки...');
+
+    const dataElement = document.getElementById('workoutData');
+    if (!dataElement) {
+        return;
+    }
+    const workoutData = JSON.parse(dataElement.textContent);
+    console.log('🔥 Упражнения:', workoutData.exercises);
+
+    try {
+        console.log('🔥 Создаем WorkoutSession...');
+        window.workoutSession = new WorkoutSession(workoutData);
+        console.log('🔥 WorkoutSession создан:', !!window.workoutSession);
+    } catch (error) {
+        console.error('🔥 Ошибка создания WorkoutSession:', error);
+    }
+
+    // Глобальная функция для отладки - принудительная очистка состояния
+    window.forceResetWorkout = function() {
+        console.log('🔥 Принудительный сброс тренировки');
+
+        // Очищаем весь localStorage на случай поврежденных данных
+        localStorage.clear();
+        WorkoutState.updateIndicators();
+
+        // Перезагружаем страницу для полного сброса
+        setTimeout(() => {
+            window.location.reload();
+        }, 500);
+
+        console.log('🔥 Состояние очищено, страница будет перезагружена');
+        alert('Состояние тренировки принудительно очищено! Страница будет перезагружена.');
+    };
+
+    // Глобальная функция для тестирования кнопки завершения
+    window.testFinishButton = function() {
+        console.log('🔥 Тестируем кнопку завершения...');
+        const btn = document.getElementById('finishWorkoutBtn');
+        console.log('🔥 Кнопка найдена:', !!btn);
+        if (btn) {
+            console.log('🔥 Имитируем клик...');
+            btn.click();
+        } else {
+            console.error('🔥 Кнопка не найдена!');
+        }
+    };
+
+    // Функция для проверки состояния
+    window.checkWorkoutState = function() {
+        const state = localStorage.getItem(WorkoutState.STORAGE_KEY);
+        console.log('🔥 Текущее состояние:', state);
+        if (state) {
+            try {
+                const parsed = JSON.parse(state);
+                console.log('🔥 Распарсенное состояние:', parsed);
+            } catch (e) {
+                console.error('🔥 Ошибка парсинга:', e);
+            }
+        } else {
+            console.log('🔥 Состояние пустое');
+        }
+    };
+
+    // Функция для тестирования модального окна с изображением
+    window.testImageModal = function() {
+        console.log('🔥 Тестируем модальное окно с изображением...');
+        if (window.workoutSession) {
+            // Используем любое доступное изображение или заглушку
+            window.workoutSession.showImageModal('/static/images/test.jpg', 'Тестовое упражнение');
+        } else {
+            console.error('🔥 WorkoutSession не найден!');
+        }
+    };
+});
@@ -0,0 +1,145 @@
+"""
+Адреса статических файлов с отпечатком содержимого.
+
+url_for('static', filename='js/app.js') возвращает /static/js/app.<хеш>.js.
+Адрес меняется вместе с содержимым файла, поэтому по такому адресу файл
+отдается с Cache-Control: immutable на год, и при повторных визитах браузер
+не обращается к серверу вовсе. Адреса без отпечатка (например, собранные
+в JavaScript) по-прежнему работают и перепроверяются по ETag.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import send_from_directory
+from werkzeug.security import safe_join
+
+import compression
+
+
+# Длина отпечатка в имени файла (шестнадцатеричных символов)
+FINGERPRINT_LENGTH = 12
+
+# Имя с отпечатком: <имя>.<отпечаток>.<расширение>
+FINGERPRINTED_NAME_RE = re.compile(
+    r'^(?P<stem>.+)\.(?P<fingerprint>[0-9a-f]{%d})(?P<extension>\.[^./]+)$' % FINGERPRINT_LENGTH)
+
+# Размер блока при чтении файла для хеширования
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class AssetFingerprints:
+    """Отпечатки содержимого статических файлов с кешем по времени изменения."""
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[int, int, str]] = {}  # имя -> (mtime_ns, размер, хеш)
+
+    def content_hash(self, filename: str) -> Optional[str]:
+        """
+        Возвращает хеш содержимого файла (None, если файла нет).
+
+        Файл перечитывается, только если изменились его время или размер.
+        """
+        path = safe_join(self.static_folder, filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+
+        with self._lock:
+            cached = self._cache.get(filename)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        hasher = hashlib.blake2b(digest_size=16)
+        try:
+            with open(path, 'rb') as asset:
+                for chunk in iter(lambda: asset.read(HASH_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+        except OSError:
+            return None
+        digest = hasher.hexdigest()
+
+        with self._lock:
+            self._cache[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def fingerprinted_name(self, filename: str) -> str:
+        """Возвращает имя файла с отпечатком (или исходное, если файла нет)."""
+        stem, extension = os.path.splitext(filename)
+        digest = self.content_hash(filename)
+        if digest is None or not extension or self._is_content_addressed(filename, digest):
+            return filename
+        return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+    @staticmethod
+    def _is_content_addressed(filename: str, digest: str) -> bool:
+        """Проверяет, что файл уже назван по хешу содержимого (как в image_store)."""
+        return os.path.splitext(os.path.basename(filename))[0] == digest
+
+    def resolve(self, filename: str) -> Tuple[str, bool]:
+        """
+        Находит файл по запрошенному имени.
+
+        Returns:
+            tuple: (имя файла в static/, True если имя содержит актуальный
+            отпечаток и файл можно кешировать навсегда)
+        """
+        path = safe_join(self.static_folder, filename)
+        if path is None:
+            return filename, False
+        if os.path.isfile(path):
+            digest = self.content_hash(filename)
+            return filename, digest is not None and self._is_content_addressed(filename, digest)
+
+        match = FINGERPRINTED_NAME_RE.match(filename)
+        if not match:
+            return filename, False
+
+        original = match.group('stem') + match.group('extension')
+        digest = self.content_hash(original)
+        # Устаревший отпечаток: отдаем текущее содержимое, но без вечного кеша
+        return original, digest is not None and digest.startswith(match.group('fingerprint'))
+
+
+def init_app(app):
+    """Подключает адреса с отпечатками к url_for('static') и раздаче статики."""
+    fingerprints = AssetFingerprints(app.static_folder)
+    immutable_max_age = app.config.get('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600)
+
+    @app.url_defaults
+    def add_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = fingerprints.fingerprinted_name(values['filename'])
+
+    def send_static_file(filename):
+        original, immutable = fingerprints.resolve(filename)
+        digest = fingerprints.content_hash(original)
+
+        # Заранее сжатая копия (.br/.gz), если ее принимает браузер
+        sent, encoding = compression.find_precompressed(app.static_folder, original)
+        response = send_from_directory(
+            app.static_folder, sent,
+            mimetype=mimetypes.guess_type(original)[0] if encoding else None,
+            max_age=immutable_max_age if immutable else None,
+            etag=(f"{digest}-{encoding}" if encoding else digest) if digest else True
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if os.path.splitext(original)[1] in compression.PRECOMPRESSED_EXTENSIONS:
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = send_static_file
+    app.extensions['static_assets'] = fingerprints
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Сводные таблицы журнала тренировок по дням, неделям и комплексам.
+
+В каждой строке хранятся количество тренировок, суммарная длительность и
+сумма процентов завершения (со счетчиком записей, для которых процент
+известен), поэтому средние значения считаются без чтения журнала.
+
+Таблицы поддерживаются инкрементально: модели пересчитывают только
+затронутые строки (день, неделю и комплекс записи) в той же транзакции,
+в которой меняется журнал или число упражнений комплекса. Функции модуля
+принимают открытое соединение и не фиксируют транзакцию.
+
+Полный пересчет (после ручного изменения БД):
+    python workout_rollups.py
+"""
+
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable
+
+
+# Процент завершения: число завершенных упражнений к числу упражнений в комплексе.
+# NULL для записей без информации о завершенных упражнениях.
+COMPLETION_PERCENTAGE_SQL = '''
+    CASE
+        WHEN wl.completed_exercises IS NULL
+             OR NOT json_valid(wl.completed_exercises)
+             OR json_array_length(wl.completed_exercises) = 0 THEN NULL
+        WHEN COALESCE(ex.exercise_count, 0) = 0 THEN 0
+        ELSE MIN(100, CAST(ROUND(json_array_length(wl.completed_exercises) * 100.0
+                                 / ex.exercise_count) AS INTEGER))
+    END
+'''
+
+# Число упражнений комплекса - счетчик workout_sets.exercise_count
+EXERCISE_COUNTS_JOIN_SQL = '''
+    LEFT JOIN workout_sets ex ON ex.code = wl.workoutset_code
+'''
+
+# Понедельник недели, в которую попадает local_date
+WEEK_START_SQL = "date(wl.local_date, '-6 days', 'weekday 1')"
+
+AGGREGATES_SQL = f'''
+    COUNT(*), SUM(wl.duration_seconds),
+    COALESCE(SUM({COMPLETION_PERCENTAGE_SQL}), 0), COUNT({COMPLETION_PERCENTAGE_SQL})
+'''
+
+# Сводные таблицы: (таблица, колонка ключа, ключ в SQL, условие выборки одной строки)
+ROLLUPS = (
+    ('workout_rollups_daily', 'local_date', 'wl.local_date',
+     'wl.local_date = ?1'),
+    ('workout_rollups_weekly', 'week_start', WEEK_START_SQL,
+     "wl.local_date BETWEEN ?1 AND date(?1, '+6 days')"),
+    ('workout_rollups_by_set', 'workoutset_code', 'wl.workoutset_code',
+     'wl.workoutset_code = ?1'),
+)
+
+
+def week_start(local_date: str) -> str:
+    """Возвращает понедельник недели дня local_date (YYYY-MM-DD)."""
+    day = date.fromisoformat(local_date)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _insert_sql(table: str, key_column: str, key_sql: str, where_sql: str) -> str:
+    """Запрос, вставляющий в сводную таблицу агрегаты журнала по условию."""
+    return f'''
+        INSERT INTO {table} (
+            {key_column}, log_count, total_duration_seconds, completion_sum, completion_count
+        )
+        SELECT {key_sql}, {AGGREGATES_SQL}
+        FROM workout_logs wl
+        {EXERCISE_COUNTS_JOIN_SQL}
+        WHERE {where_sql}
+        GROUP BY {key_sql}
+    '''
+
+
+def refresh(conn: sqlite3.Connection, local_dates: Iterable[str] = (),
+            workoutset_codes: Iterable[str] = ()):
+    """
+    Пересчитывает строки сводных таблиц для дней local_dates (и их недель)
+    и комплексов workoutset_codes. Строки без записей в журнале удаляются.
+    """
+    days = {day for day in local_dates if day}
+    keys = {
+        'workout_rollups_daily': days,
+        'workout_rollups_weekly': {week_start(day) for day in days},
+        'workout_rollups_by_set': {code for code in workoutset_codes if code},
+    }
+    for table, key_column, key_sql, where_sql in ROLLUPS:
+        params = [(key,) for key in keys[table]]
+        if not params:
+            continue
+        conn.executemany(f'DELETE FROM {table} WHERE {key_column} = ?', params)
+        conn.executemany(_insert_sql(table, key_column, key_sql, where_sql), params)
+
+
+def refresh_workoutset(conn: sqlite3.Connection, workoutset_code: str):
+    """
+    Пересчитывает все строки, в которые входят тренировки комплекса
+    (нужно при изменении числа его упражнений: меняется процент завершения).
+    """
+    days = [row[0] for row in conn.execute(
+        'SELECT DISTINCT local_date FROM workout_logs WHERE workoutset_code = ?', (workoutset_code,))]
+    refresh(conn, days, [workoutset_code])
+
+
+def clear(conn: sqlite3.Connection):
+    """Очищает сводные таблицы (журнал пуст)."""
+    for table, *_ in ROLLUPS:
+        conn.execute(f'DELETE FROM {table}')
+
+
+def rebuild(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Пересчитывает сводные таблицы по всему журналу.
+
+    Returns:
+        dict: Количество строк в каждой таблице
+    """
+    clear(conn)
+    counts = {}
+    for table, key_column, key_sql, _ in ROLLUPS:
+        conn.execute(_insert_sql(table, key_column, key_sql, f'{key_sql} IS NOT NULL'))
+        counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    return counts
+
+
+def to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    """Строка сводной таблицы со средней длительностью и средним процентом завершения."""
+    rollup = dict(row)
+    rollup['avg_duration_seconds'] = rollup['total_duration_seconds'] // rollup['log_count']
+    rollup['avg_completion'] = (round(rollup['completion_sum'] / rollup['completion_count'])
+                                if rollup['completion_count'] else None)
+    return rollup
+
+
+def main():
+    """Пересчитывает сводные таблицы текущей БД."""
+    # Импорт здесь: models сам использует этот модуль
+    from models import get_db_connection
+
+    with get_db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        counts = rebuild(conn)
+        conn.commit()
+
+    for table, count in counts.items():
+        print(f"✓ {table}: {count}")
+    print("🎉 Сводные таблицы пересчитаны")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Расчет статистики тренировок на стороне SQLite.
+
+Агрегаты за период, процент завершения и форматирование дат считаются
+в SQL, чтобы страница статистики не загружала и не разбирала в Python
+весь журнал тренировок. Сводки за период читаются из сводных таблиц
+(см. workout_rollups.py).
+"""
+
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional
+
+from models import get_db_connection, encode_log_cursor, decode_log_cursor
+from workout_rollups import COMPLETION_PERCENTAGE_SQL, EXERCISE_COUNTS_JOIN_SQL
+import workout_rollups
+
+
+WEEKDAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+
+def format_duration(duration: int) -> str:
+    """Форматирует длительность в секундах как Ч:ММ:СС или М:СС."""
+    hours = duration // 3600
+    minutes = (duration % 3600) // 60
+    seconds = duration % 60
+
+    if hours > 0:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class WorkoutStatistics:
+    """Агрегированная статистика по журналу тренировок."""
+
+    @staticmethod
+    def get_summary(days: int = 30) -> Dict[str, Any]:
+        """
+        Считает сводку за последние days дней (включая сегодняшний).
+
+        Читает сводную таблицу по дням, а не журнал, поэтому время запроса
+        не зависит от числа тренировок.
+
+        Returns:
+            dict: total_count (все записи), recent_count, recent_duration_seconds,
+            recent_avg_duration_seconds, recent_avg_completion (None, если
+            не по чему считать)
+        """
+        since = (date.today() - timedelta(days=days)).isoformat()
+
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT
+                    (SELECT row_count FROM table_row_counts
+                     WHERE table_name = 'workout_logs') AS total_count,
+                    COALESCE(SUM(log_count), 0) AS recent_count,
+                    COALESCE(SUM(total_duration_seconds), 0) AS recent_duration_seconds,
+                    SUM(total_duration_seconds) / SUM(log_count) AS recent_avg_duration_seconds,
+                    SUM(completion_sum) * 1.0 / NULLIF(SUM(completion_count), 0) AS recent_avg_completion
+                FROM workout_rollups_daily
+                WHERE local_date > ?
+            ''', (since,))
+            summary = dict(cursor.fetchone())
+
+        summary['total_count'] = summary['total_count'] or 0
+        if summary['recent_avg_completion'] is not None:
+            summary['recent_avg_completion'] = round(summary['recent_avg_completion'])
+        return summary
+
+    @staticmethod
+    def get_daily(first_day: date, last_day: date) -> List[Dict[str, Any]]:
+        """Сводка по дням с first_day по last_day включительно (дни без тренировок пропускаются)."""
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                SELECT * FROM workout_rollups_daily
+                WHERE local_date BETWEEN ? AND ?
+                ORDER BY local_date
+            ''', (first_day.isoformat(), last_day.isoformat())).fetchall()
+        return [workout_rollups.to_dict(row) for row in rows]
+
+    @staticmethod
+    def get_weekly(weeks: int = 12) -> List[Dict[str, Any]]:
+        """Сводка по неделям (с понедельника) за последние weeks недель, включая текущую."""
+        first_week = workout_rollups.week_start(date.today().isoformat())
+        first_week = (date.fromisoformat(first_week) - timedelta(weeks=weeks - 1)).isoformat()
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                SELECT * FROM workout_rollups_weekly
+                WHERE week_start >= ?
+                ORDER BY week_start
+            ''', (first_week,)).fetchall()
+        return [workout_rollups.to_dict(row) for row in rows]
+
+    @staticmethod
+    def get_by_set() -> List[Dict[str, Any]]:
+        """Сводка по комплексам (только комплексы с тренировками), по числу тренировок."""
+        with get_db_connection() as conn:
+            rows = conn.execute('''
+                SELECT r.*, ws.name AS workoutset_name
+                FROM workout_rollups_by_set r
+                LEFT JOIN workout_sets ws ON ws.code = r.workoutset_code
+                ORDER BY r.log_count DESC
+            ''').fetchall()
+        return [workout_rollups.to_dict(row) for row in rows]
+
+    @staticmethod
+    def get_logs_page(limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Получает страницу журнала, готовую к отображению.
+
+        Дата, время, день недели и процент завершения вычисляются в SQL.
+        Пагинация по ключу (date_epoch, code), как в WorkoutLogModel.get_page.
+
+        Returns:
+            dict: logs - записи страницы, next_cursor - курсор следующей
+            страницы или None
+
+        Raises:
+            ValueError: Если курсор поврежден
+        """
+        where_sql = ''
+        params: List[Any] = []
+        if cursor:
+            where_sql = 'WHERE (wl.date_epoch, wl.code) < (?, ?)'
+            params.extend(decode_log_cursor(cursor))
+
+        with get_db_connection() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.execute(f'''
+                SELECT wl.code, wl.date, wl.date_epoch, wl.workoutset_code, wl.duration_seconds,
+                       ws.name AS workoutset_name,
+                       strftime('%d.%m.%Y', wl.date_epoch, 'unixepoch', 'localtime') AS formatted_date,
+                       strftime('%H:%M', wl.date_epoch, 'unixepoch', 'localtime') AS formatted_time,
+                       CAST(strftime('%w', wl.date_epoch, 'unixepoch', 'localtime') AS INTEGER) AS weekday_index,
+                       {COMPLETION_PERCENTAGE_SQL} AS completion_percentage
+                FROM workout_logs wl
+                LEFT JOIN workout_sets ws ON wl.workoutset_code = ws.code
+                {EXERCISE_COUNTS_JOIN_SQL}
+                {where_sql}
+                ORDER BY wl.date_epoch DESC, wl.code DESC
+                LIMIT ?
+            ''', (*params, limit + 1))
+            rows = db_cursor.fetchall()
+
+        logs = [WorkoutStatistics._format_log(dict(row)) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit and logs:
+            next_cursor = encode_log_cursor(logs[-1]['date_epoch'], logs[-1]['code'])
+        return {'logs': logs, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _format_log(log: Dict[str, Any]) -> Dict[str, Any]:
+        """Дополняет запись журнала полями для отображения."""
+        weekday_index = log.pop('weekday_index')
+        if log['formatted_date'] is None:
+            # Дата в нераспознаваемом формате - показываем как есть
+            log['formatted_date'] = log['date']
+            log['formatted_time'] = ''
+            log['weekday'] = ''
+        else:
+            # strftime('%w'): 0 - воскресенье
+            log['weekday'] = WEEKDAYS[(weekday_index - 1) % 7]
+        log['formatted_duration'] = format_duration(log['duration_seconds'])
+        return log